@@ -0,0 +1,50 @@
+"""shot summary
+
+Revision ID: 43ca52eb2c7f
+Revises: 0bdd1c635e7a
+Create Date: 2026-10-18 12:00:41.318204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision: str = "43ca52eb2c7f"
+down_revision: Union[str, None] = "0bdd1c635e7a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SUMMARY_COLUMNS = (
+    "peak_pressure",
+    "total_time",
+    "final_weight",
+    "average_flow",
+    "ratio",
+)
+
+
+def column_exists(table_name, column_name):
+    """Helper function to check if a column exists"""
+    inspector = inspect(op.get_bind())
+    return column_name in [
+        column["name"] for column in inspector.get_columns(table_name)
+    ]
+
+
+def upgrade() -> None:
+    # ShotDataBase.init() creates new databases with the columns already
+    with op.batch_alter_table("history") as batch_op:
+        for column in SUMMARY_COLUMNS:
+            if not column_exists("history", column):
+                batch_op.add_column(sa.Column(column, sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("history") as batch_op:
+        for column in SUMMARY_COLUMNS:
+            if column_exists("history", column):
+                batch_op.drop_column(column)
@@ -0,0 +1,40 @@
+"""shot preview
+
+Revision ID: 9f1d7c2ab4e6
+Revises: 43ca52eb2c7f
+Create Date: 2026-10-18 12:30:12.504318
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision: str = "9f1d7c2ab4e6"
+down_revision: Union[str, None] = "43ca52eb2c7f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def column_exists(table_name, column_name):
+    """Helper function to check if a column exists"""
+    inspector = inspect(op.get_bind())
+    return column_name in [
+        column["name"] for column in inspector.get_columns(table_name)
+    ]
+
+
+def upgrade() -> None:
+    # ShotDataBase.init() creates new databases with the column already
+    if not column_exists("history", "preview"):
+        with op.batch_alter_table("history") as batch_op:
+            batch_op.add_column(sa.Column("preview", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    if column_exists("history", "preview"):
+        with op.batch_alter_table("history") as batch_op:
+            batch_op.drop_column("preview")
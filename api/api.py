@@ -49,6 +49,7 @@ class API:
         from . import sounds as _sounds  # noqa
         from . import machine as _machine  # noqa
         from . import serial as _serial  # noqa
+        from . import raw_telemetry as _raw_telemetry  # noqa
 
         routes = []
         logger.info("API Routes registered:")
@@ -3,11 +3,11 @@ import os
 
 import tornado
 import tornado.web
-import zstandard as zstd
 from pydantic import ValidationError
 from typing import Optional
 
 from log import MeticulousLogger
+from shot_compression import ShotCompression
 from shot_database import SearchParams, ShotDataBase, SearchOrder, SearchOrderBy
 from shot_debug_manager import DEBUG_HISTORY_PATH
 from shot_manager import ShotManager, SHOT_PATH
@@ -120,16 +120,15 @@ class ZstdHistoryHandler(tornado.web.StaticFileHandler):
 
     async def serve_zstd_file(self, full_path):
         logger.info(f"Serving File: {full_path}")
-        with open(full_path, "rb") as compressed_file:
-            decompressor = zstd.ZstdDecompressor()
-            decompressed_content = decompressor.stream_reader(compressed_file)
-            logger.warning(full_path)
-            if full_path.endswith(".csv.zst"):
-                self.set_header("Content-Type", "text/csv")
-            else:
-                self.set_header("Content-Type", "application/json")
-            self.write(decompressed_content.read())
-            self.finish()
+        # Shot files name the dictionary they were compressed with
+        decompressed_content = ShotCompression.read(full_path)
+        logger.warning(full_path)
+        if full_path.endswith(".csv.zst"):
+            self.set_header("Content-Type", "text/csv")
+        else:
+            self.set_header("Content-Type", "application/json")
+        self.write(decompressed_content)
+        self.finish()
 
     async def list_directory(self, full_path):
 
@@ -158,8 +157,33 @@ class ProfileSearchHandler(BaseHandler):
 
 class CurrentShotHandler(BaseHandler):
     def get(self):
-        current = ShotManager.getCurrentShot()
-        self.write(json.dumps(current))
+        since = self.get_query_argument("since", None)
+        if since is None:
+            current = ShotManager.getCurrentShot()
+            self.write(json.dumps(current))
+            return
+
+        try:
+            since = int(since)
+            if since < 0:
+                raise ValueError(since)
+        except ValueError:
+            self.report_error(400, "Invalid since index", since)
+            return
+
+        cursor = ShotManager.currentShotCursor(since)
+        if cursor is None:
+            self.write(json.dumps(None))
+            return
+
+        # Samples are never changed once delivered, the shot and the range
+        # identify the response without building it
+        (shot_id, since, end) = cursor
+        self.set_header("Etag", f'"{shot_id}-{since}-{end}"')
+        if self.check_etag_header():
+            self.set_status(304)
+            return
+        self.write(json.dumps(ShotManager.getCurrentShotSince(cursor)))
 
 
 class LastShotHandler(BaseHandler):
@@ -196,6 +220,7 @@ class HistoryHandler(BaseHandler):
             sort=self.get_query_argument("sort", SearchOrder.descending),
             max_results=self.get_query_argument("max_results", 20),
             dump_data=self.get_query_argument("dump_data", True),
+            preview=self.get_query_argument("preview", False),
         )
 
         results = ShotDataBase.search_history(params)
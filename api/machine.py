@@ -14,6 +14,9 @@ from ota import UpdateManager
 from backlight_controller import BacklightController
 from datetime import datetime
 from timezone_manager import TimezoneManager
+from telemetry_bus import TelemetryBus
+from live_broadcast import ClientBackpressure
+from history_writer import HistoryWriter
 
 from config import (
     MeticulousConfig,
@@ -245,8 +248,24 @@ class MachineTimeHandler(BaseHandler):
         self.write({"status": "success"})
 
 
+class TelemetryStatsHandler(BaseHandler):
+    def get(self):
+        stats = TelemetryBus.stats()
+        if Machine._writer is not None:
+            stats["serial_writer"] = Machine._writer.stats()
+        stats["profile_upload"] = {
+            "sent": Machine.profileUploadsSent,
+            "skipped": Machine.profileUploadsSkipped,
+            "saved_bytes": Machine.profileUploadSavedBytes,
+        }
+        stats["clients"] = ClientBackpressure.stats()
+        stats["history_writer"] = HistoryWriter.stats()
+        self.write(stats)
+
+
 API.register_handler(APIVersion.V1, r"/machine", MachineInfoHandler)
 API.register_handler(APIVersion.V1, r"/machine/backlight", MachineBacklightController)
 API.register_handler(APIVersion.V1, r"/machine/factory_reset", MachineResetHandler)
 API.register_handler(APIVersion.V1, r"/machine/OS_update_status", UpdateOSStatus)
 API.register_handler(APIVersion.V1, r"/machine/time", MachineTimeHandler)
+API.register_handler(APIVersion.V1, r"/machine/telemetry", TelemetryStatsHandler)
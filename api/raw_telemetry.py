@@ -0,0 +1,232 @@
+import json
+import math
+import struct
+import time
+from array import array
+from operator import attrgetter
+
+import tornado.ioloop
+import tornado.websocket
+
+from esp_serial.data import binaryControlTypes, sensorDataFields
+from esp_serial.dispatcher import MessageType
+from log import MeticulousLogger
+from telemetry_bus import TelemetryBus
+
+from .api import API, APIVersion
+
+logger = MeticulousLogger.getLogger(__name__)
+
+RAW_TELEMETRY_VERSION = 1
+
+# Every batch starts with this header, followed by a float32 column with the
+# sample times (seconds since `base_time`) and a float32 column per field.
+# kind, number of columns, number of samples, base_time
+batchHeaderStruct = struct.Struct("<BBHd")
+
+BATCH_KIND_DATA = 1
+BATCH_KIND_SENSORS = 2
+
+DATA_COLUMNS = (
+    "pressure",
+    "flow",
+    "weight",
+    "temperature",
+    "time",
+    "is_extracting",
+    "gravimetric_flow",
+    "main_controller",
+    "main_setpoint",
+    "aux_controller",
+    "aux_setpoint",
+    "is_aux_controller_active",
+)
+# The controller kinds are sent as their index into binaryControlTypes
+dataColumnGetter = attrgetter(
+    "pressure",
+    "flow",
+    "weight",
+    "temperature",
+    "time",
+    "is_extracting",
+    "gravimetric_flow",
+    "main_controller_kind",
+    "main_setpoint",
+    "aux_controller_kind",
+    "aux_setpoint",
+    "is_aux_controller_active",
+)
+CONTROLLER_COLUMNS = (7, 9)
+controllerIndices = {kind: index for index, kind in enumerate(binaryControlTypes)}
+
+
+def float_or_nan(value) -> float:
+    """A float32 column value, None and the "NaN" strings are NaN"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def data_row(data):
+    row = list(dataColumnGetter(data))
+    for column in CONTROLLER_COLUMNS:
+        row[column] = controllerIndices.get(row[column], 0)
+    return row
+
+
+class ColumnBatch:
+    """float32 columns of the samples received since the last flush"""
+
+    def __init__(self, kind, columns) -> None:
+        self.kind = kind
+        self.columns = columns
+        self.base_time = None
+        self.times = array("f")
+        self.values = [array("f") for _ in columns]
+
+    def append(self, timestamp, row) -> None:
+        # Converted first, a value failing to convert must not leave the
+        # columns of the batch with different lengths
+        values = [float_or_nan(value) for value in row]
+        if self.base_time is None:
+            self.base_time = timestamp
+        self.times.append(timestamp - self.base_time)
+        for column, value in zip(self.values, values):
+            column.append(value)
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def pack(self) -> bytes:
+        header = batchHeaderStruct.pack(
+            self.kind, len(self.columns), len(self.times), self.base_time
+        )
+        return b"".join(
+            [header, self.times.tobytes()]
+            + [column.tobytes() for column in self.values]
+        )
+
+
+class RawTelemetryStream:
+    """Batches every Data and Sensors message for the raw telemetry websockets.
+
+    Only subscribed to the TelemetryBus while somebody is connected.
+    """
+
+    BATCH_INTERVAL_MS = 50
+    # A websocket with more unsent data than this misses batches
+    MAX_PENDING_BYTES = 256 * 1024
+    # uint16 sample count
+    MAX_BATCH_SAMPLES = 0xFFFF
+
+    _clients = set()
+    _batches = {}
+    _flusher = None
+
+    def description():
+        return {
+            "version": RAW_TELEMETRY_VERSION,
+            "batch_interval_ms": RawTelemetryStream.BATCH_INTERVAL_MS,
+            "kinds": {
+                BATCH_KIND_DATA: {"name": "data", "columns": DATA_COLUMNS},
+                BATCH_KIND_SENSORS: {
+                    "name": "sensors",
+                    "columns": sensorDataFields,
+                },
+            },
+            "controllers": binaryControlTypes,
+        }
+
+    def add_client(client) -> None:
+        if not RawTelemetryStream._clients:
+            RawTelemetryStream._new_batches()
+            TelemetryBus.subscribe(
+                "raw_telemetry",
+                RawTelemetryStream.on_telemetry,
+                kinds=(MessageType.DATA, MessageType.SENSORS),
+                timestamps=True,
+            )
+            RawTelemetryStream._flusher = tornado.ioloop.PeriodicCallback(
+                RawTelemetryStream.flush, RawTelemetryStream.BATCH_INTERVAL_MS
+            )
+            RawTelemetryStream._flusher.start()
+        RawTelemetryStream._clients.add(client)
+
+    def remove_client(client) -> None:
+        RawTelemetryStream._clients.discard(client)
+        if not RawTelemetryStream._clients and RawTelemetryStream._flusher:
+            TelemetryBus.unsubscribe("raw_telemetry")
+            RawTelemetryStream._flusher.stop()
+            RawTelemetryStream._flusher = None
+
+    def _new_batches():
+        RawTelemetryStream._batches = {
+            MessageType.DATA: ColumnBatch(BATCH_KIND_DATA, DATA_COLUMNS),
+            MessageType.SENSORS: ColumnBatch(BATCH_KIND_SENSORS, sensorDataFields),
+        }
+
+    def on_telemetry(kind, message, timestamp=None) -> None:
+        batch = RawTelemetryStream._batches[kind]
+        if len(batch) >= RawTelemetryStream.MAX_BATCH_SAMPLES:
+            return
+        # The bus is drained in bursts, the samples are stamped with the time
+        # Machine read them at instead
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if kind is MessageType.DATA:
+            batch.append(timestamp, data_row(message))
+        else:
+            batch.append(timestamp, message.as_tuple())
+
+    def flush() -> None:
+        batches = RawTelemetryStream._batches
+        RawTelemetryStream._new_batches()
+        for batch in batches.values():
+            if len(batch) == 0:
+                continue
+            packed = batch.pack()
+            for client in list(RawTelemetryStream._clients):
+                client.send_batch(packed)
+
+
+class RawTelemetryHandler(tornado.websocket.WebSocketHandler):
+    """Streams every parsed Data and Sensors message as binary batches.
+
+    The first message is a JSON description of the batch kinds and their
+    columns, every following message is a binary batch as packed by
+    ColumnBatch.pack().
+    """
+
+    def check_origin(self, origin):
+        return True
+
+    def open(self):
+        self.pending_bytes = 0
+        self.dropped_batches = 0
+        self.write_message(json.dumps(RawTelemetryStream.description()))
+        RawTelemetryStream.add_client(self)
+
+    def on_close(self):
+        RawTelemetryStream.remove_client(self)
+        if self.dropped_batches > 0:
+            logger.info(f"Raw telemetry client dropped {self.dropped_batches} batches")
+
+    def send_batch(self, packed) -> None:
+        if self.pending_bytes > RawTelemetryStream.MAX_PENDING_BYTES:
+            self.dropped_batches += 1
+            return
+        try:
+            future = self.write_message(packed, binary=True)
+        except tornado.websocket.WebSocketClosedError:
+            RawTelemetryStream.remove_client(self)
+            return
+        size = len(packed)
+        self.pending_bytes += size
+        future.add_done_callback(lambda _future: self._flushed(size))
+
+    def _flushed(self, size) -> None:
+        self.pending_bytes -= size
+
+
+API.register_handler(APIVersion.V1, r"/machine/raw_telemetry", RawTelemetryHandler)
@@ -9,6 +9,81 @@ document.addEventListener('DOMContentLoaded', function () {
         toggleButton.innerText = (isGraphing ? "Stop" : "Start") + " Plotting"
     });
 
+    // While connected, the graphs are fed with every sample from the raw
+    // telemetry websocket instead of the sampled socket.io events
+    let rawTelemetry = null;
+    let rawTimeOffset = null;
+    const fullRateButton = document.getElementById('toggleFullRate');
+    fullRateButton.addEventListener('click', () => {
+        if (rawTelemetry) {
+            rawTelemetry.close();
+            rawTelemetry = null;
+        } else {
+            rawTimeOffset = null;
+            rawTelemetry = connectRawTelemetry(onRawBatch);
+        }
+        fullRateButton.innerText = (rawTelemetry ? "Sampled" : "Full Rate") + " Data";
+    });
+
+    function onRawBatch(kind, baseTime, times, columns, samples, controllers) {
+        if (rawTimeOffset === null) {
+            rawTimeOffset = (Date.now() - startTime) / 1000 - baseTime;
+        }
+        for (let i = 0; i < samples; i++) {
+            const currentTime = baseTime + times[i] + rawTimeOffset;
+            if (kind === 'data') {
+                const setpoints = {};
+                setpoints[controllers[columns.main_controller[i]]] = columns.main_setpoint[i];
+                setpoints[controllers[columns.aux_controller[i]]] = columns.aux_setpoint[i];
+                updateGraphData(window.miscData, currentTime, {
+                    pressureSensor_pressure: columns.pressure[i],
+                    flowSensor_flow: columns.flow[i],
+                    loadcell_weight: columns.weight[i],
+                    display_temp: columns.temperature[i],
+                    set_pressure: setpoints.Pressure,
+                    set_flow: setpoints.Flow,
+                    set_power: setpoints.Power,
+                    set_position: setpoints.Piston,
+                });
+            } else {
+                updateGraphData(window.thermistorData, currentTime, {
+                    barUp: columns.bar_up[i],
+                    barMiddleUp: columns.bar_mid_up[i],
+                    barMiddleDown: columns.bar_mid_down[i],
+                    barDown: columns.bar_down[i],
+                    external1: columns.external_1[i],
+                    external2: columns.external_2[i],
+                    tube: columns.tube[i],
+                    motorTemp: columns.motor_temp[i]
+                });
+                updateGraphData(window.actuatorData, currentTime, {
+                    position: columns.motor_position[i],
+                    speed: columns.motor_speed[i],
+                    power: columns.motor_power[i],
+                    current: columns.motor_current[i],
+                    bandHeater_power: columns.bandheater_power[i],
+                    bandHeater_current: columns.bandheater_current[i],
+                });
+                updateGraphData(window.adcData, currentTime, {
+                    adc0_rate: columns.adc_0[i],
+                    adc1_rate: columns.adc_1[i],
+                    adc2_rate: columns.adc_2[i],
+                    adc3_rate: columns.adc_3[i],
+                    pressureSensor_rate: columns.pressure_sensor[i],
+                });
+            }
+        }
+        if (isGraphing) {
+            if (kind === 'data') {
+                updateGraph('miscGraph', window.miscData);
+            } else {
+                updateGraph('thermistorGraph', window.thermistorData);
+                updateGraph('actuatorGraph', window.actuatorData);
+                updateGraph('adcGraph', window.adcData);
+            }
+        }
+    }
+
     document.getElementById('resetZoom').addEventListener('click', function () {
         window.thermistorGraph.resetZoom();
         window.actuatorGraph.resetZoom();
@@ -119,7 +194,7 @@ document.addEventListener('DOMContentLoaded', function () {
         // - data.name (status)
         // - data.time (shot time)
         // - data.profile (profile name)
-        updateGraphData(window.miscData, currentTime, {
+        if (!rawTelemetry) updateGraphData(window.miscData, currentTime, {
             pressureSensor_pressure: data.sensors.p,
             flowSensor_flow: data.sensors.f,
             loadcell_weight: data.sensors.w,
@@ -180,7 +255,7 @@ document.addEventListener('DOMContentLoaded', function () {
 
     socket.on("sensors", function (data) {
         const currentTime = (Date.now() - startTime) / 1000;
-        updateGraphData(window.thermistorData, currentTime, {
+        if (!rawTelemetry) updateGraphData(window.thermistorData, currentTime, {
             barUp: data.t_bar_up,
             barMiddleUp: data.t_bar_mu,
             barMiddleDown: data.t_bar_md,
@@ -224,7 +299,7 @@ document.addEventListener('DOMContentLoaded', function () {
         adc3_rate.innerText = data.a_3;
         pressureSensor_rate.innerText = data.p;
 
-        updateGraphData(window.adcData, currentTime, extractAdcRates(new_data));
+        if (!rawTelemetry) updateGraphData(window.adcData, currentTime, extractAdcRates(new_data));
         if (isGraphing) {
             updateGraph('adcGraph', window.adcData);
         }
@@ -233,7 +308,7 @@ document.addEventListener('DOMContentLoaded', function () {
     socket.on("actuators", function (data) {
         const currentTime = (Date.now() - startTime) / 1000;
 
-        updateGraphData(window.actuatorData, currentTime, {
+        if (!rawTelemetry) updateGraphData(window.actuatorData, currentTime, {
             position: data.m_pos,
             speed: data.m_spd,
             power: data.m_pwr,
@@ -278,6 +353,35 @@ document.addEventListener('DOMContentLoaded', function () {
 
 });
 
+// Opens the raw telemetry websocket, onBatch is called with the float32 columns
+// of every batch (see api/raw_telemetry.py for the layout)
+function connectRawTelemetry(onBatch) {
+    const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const ws = new WebSocket(`${protocol}://${window.location.host}/api/v1/machine/raw_telemetry`);
+    ws.binaryType = 'arraybuffer';
+    let description = null;
+
+    ws.onmessage = function (event) {
+        if (typeof event.data === 'string') {
+            description = JSON.parse(event.data);
+            return;
+        }
+        const view = new DataView(event.data);
+        const kind = description.kinds[view.getUint8(0)];
+        const columnCount = view.getUint8(1);
+        const samples = view.getUint16(2, true);
+        const baseTime = view.getFloat64(4, true);
+        const values = new Float32Array(event.data, 12, samples * (columnCount + 1));
+
+        const columns = {};
+        kind.columns.forEach((name, index) => {
+            columns[name] = values.subarray((index + 1) * samples, (index + 2) * samples);
+        });
+        onBatch(kind.name, baseTime, values.subarray(0, samples), columns, samples, description.controllers);
+    };
+    return ws;
+}
+
 function extractAdcRates(adcDevices) {
     let rates = {};
     adcDevices.adc_devices.forEach((device, index) => {
@@ -88,6 +88,11 @@ def run():
         except Exception as e:
             logger.error("Failed to run database migrations", exc_info=e)
 
+        try:
+            ShotManager.maintainHistory()
+        except Exception as e:
+            logger.error("Failed to start the history maintenance", exc_info=e)
+
         backend_main()
     except Exception as e:
         logger.exception("main() failed", exc_info=e, stack_info=True)
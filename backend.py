@@ -13,6 +13,7 @@ import asyncio
 import sentry_sdk
 
 from esp_serial.data import ButtonEventData
+from esp_serial.dispatcher import MessageType
 
 from ble_gatt import GATTServer
 from wifi import WifiManager
@@ -48,6 +49,9 @@ from api.machine import UpdateOSStatus
 
 from timezone_manager import TimezoneManager
 from telemetry_service import TelemetryService
+from telemetry_bus import TelemetryBus
+from live_telemetry import LiveRateLimiter, LiveRooms
+from live_broadcast import ClientBackpressure, OrjsonSerializer, get_tornado_handler
 
 logger = MeticulousLogger.getLogger(__name__)
 
@@ -57,21 +61,43 @@ tornado.log.gen_log = MeticulousLogger.getLogger("tornado.general")
 
 PORT = int(os.getenv("PORT", "8080"))
 DEBUG = os.getenv("DEBUG", "False").lower() in ("true", "1", "y")
+# live() emits at most STATUS_MAX_RATE times per second, and at least every
+# STATUS_IDLE_HEARTBEAT seconds even if nothing changed
+STATUS_MAX_RATE = float(os.getenv("STATUS_MAX_RATE", "20"))
+STATUS_IDLE_HEARTBEAT = float(os.getenv("STATUS_IDLE_HEARTBEAT", "1.0"))
 
 
-sio = socketio.AsyncServer(cors_allowed_origins="*", async_mode="tornado")
+sio = socketio.AsyncServer(
+    cors_allowed_origins="*", async_mode="tornado", json=OrjsonSerializer
+)
 
 UpdateOSStatus.setSio(sio)
 
+live_rooms = LiveRooms(sio)
+
 
 @sio.event
-def connect(sid, environ):
+async def connect(sid, environ, auth=None):
     logger.info("connect %s", sid)
+    ClientBackpressure.on_connect(sid, environ)
+    await live_rooms.connect(sid, environ, auth)
 
 
 @sio.event
 def disconnect(sid):
     logger.info("disconnect %s", sid)
+    live_rooms.disconnect(sid)
+    ClientBackpressure.on_disconnect(sid)
+
+
+@sio.on("subscribe")
+async def subscribe(sid, data):
+    await live_rooms.subscribe(sid, data)
+
+
+@sio.on("unsubscribe")
+async def unsubscribe(sid, data):
+    await live_rooms.unsubscribe(sid, data)
 
 
 @sio.on("action")
@@ -110,23 +136,46 @@ send_data_thread = None
 
 
 async def live():
-    SAMPLE_TIME = 0.1
-    elapsed_time = 0
-    i = 0
     _time = time.time()
     logger.info("Starting to emit machine data")
 
+    latency = TelemetryBus.latency("serial_to_socket")
+    limiter = LiveRateLimiter(STATUS_MAX_RATE, STATUS_IDLE_HEARTBEAT)
+    data_sensors = Machine.data_sensors
+    sensor_sensors = Machine.sensor_sensors
+    sensors_changed = sensor_sensors is not None
+    # Machine.lastReadTime of the oldest sample which was not emitted yet
+    pending_since = None
+
+    def on_telemetry(kind, message):
+        nonlocal data_sensors, sensor_sensors, sensors_changed, pending_since
+        # Only the latest sample of each kind is sent out
+        if kind is MessageType.DATA:
+            data_sensors = message
+        else:
+            sensor_sensors = message
+            sensors_changed = True
+        if pending_since is None:
+            pending_since = Machine.lastReadTime
+        limiter.notify()
+
+    TelemetryBus.subscribe(
+        "live", on_telemetry, kinds=(MessageType.DATA, MessageType.SENSORS)
+    )
+    last_status = None
+
     # Store previous value of 'auto_preheat' to detect changes
     # previous_auto_preheat = MeticulousConfig[CONFIG_USER].get('auto_preheat', None)
 
     while True:
+        heartbeat = await limiter.wait()
 
         elapsed_time = time.time() - _time
         if elapsed_time > 2 and not Machine.infoReady:
             _time = time.time()
             Machine.action("info")
 
-        machine_status = {**Machine.data_sensors.to_sio()}
+        machine_status = {**data_sensors.to_sio()}
         # We can enrich the machines functionality from within the backend
         # as we know which profile was last loaded
         last_profile_entry = ProfileManager.get_last_profile()
@@ -149,33 +198,36 @@ async def live():
             machine_status["loaded_profile"] = None
             machine_status["id"] = None
 
-        await sio.emit("status", machine_status)
-
-        if Machine.sensor_sensors is not None:
-            water_status_dict = (  # noqa: F841
-                Machine.sensor_sensors.to_sio_water_status()
-            )
+        # An idle machine keeps sending the same values, those only go out as
+        # a heartbeat
+        if machine_status == last_status and not sensors_changed and not heartbeat:
+            pending_since = None
+            continue
+        last_status = machine_status
+
+        legacy_channels = {}
+        packed_channels = {}
+        if sensor_sensors is not None:
+            water_status_dict = sensor_sensors.to_sio_water_status()  # noqa: F841
             # water_status_value = water_status_dict["water_status"]
             # await sio.emit("water_status", water_status_value)
 
-        if Machine.sensor_sensors is not None:
-            await sio.emit("sensors", Machine.sensor_sensors.to_sio_temperatures())
-            await sio.emit(
-                "comunication", Machine.sensor_sensors.to_sio_communication()
-            )
-            await sio.emit("actuators", Machine.sensor_sensors.to_sio_actuators())
-            await sio.emit(
-                "accessories", Machine.sensor_sensors.to_sio_accessory_data()
-            )
+        if sensor_sensors is not None and (sensors_changed or heartbeat):
+            sensors_changed = False
+            legacy_channels, packed_channels = live_rooms.build_channels(sensor_sensors)
+
+        await live_rooms.emit(machine_status, legacy_channels, packed_channels)
+
+        limiter.emitted()
+        if pending_since is not None:
+            latency.record(limiter.last_emit - pending_since)
+            pending_since = None
 
         # current_auto_preheat = MeticulousConfig[CONFIG_USER].get('auto_preheat')
         # if current_auto_preheat != previous_auto_preheat:
         #     Machine.write(str.encode("action,auto_preheat,"+str(current_auto_preheat)+"\x03"))
         #     previous_auto_preheat = current_auto_preheat
 
-        await sio.sleep(SAMPLE_TIME)
-        i = i + 1
-
 
 def send_data_loop():
     loop = asyncio.new_event_loop()
@@ -321,7 +373,7 @@ def main():
     MeticulousConfig.setSIO(sio)
 
     handlers = [
-        (r"/socket.io/", socketio.get_tornado_handler(sio)),
+        (r"/socket.io/", get_tornado_handler(sio)),
     ]
 
     if Machine.emulated and not WifiManager.networking_available():
@@ -0,0 +1,72 @@
+"""Wire size and decoding cost of text lines vs binary telemetry frames.
+
+Converts every Data and Sensors line of EmulationData.ESPRESSO_DATA into the
+binary frame the emulator sends in binary telemetry mode and compares the
+bytes on the wire, the resulting UART time and the CPU time spent framing,
+decoding and parsing each message.
+
+    python -m benchmarks.bench_binary_telemetry
+"""
+
+import time
+
+from esp_serial.connection.emulation_data import EmulationData
+from esp_serial.connection.emulator_serial_connection import EmulatorSerialConnection
+from esp_serial.connection.serial_connection import SerialConnection
+from esp_serial.dispatcher import MessageDispatcher
+from esp_serial.framer import FRAME_START, SerialFramer
+
+REPETITIONS = 20
+# 8N1: a start and a stop bit per byte
+BITS_PER_BYTE = 10
+
+
+def text_stream(lines):
+    return b"".join((line + "\r\n").encode() for line in lines)
+
+
+def binary_stream(lines):
+    return b"".join(EmulatorSerialConnection.to_binary_frame(line) for line in lines)
+
+
+def consume(stream):
+    """Frames and parses `stream` the same way Machine._read_data does"""
+    framer = SerialFramer()
+    view = memoryview(stream)
+    for offset in range(0, len(stream), 1024):
+        framer.feed(view[offset : offset + 1024])
+        for line in framer.lines():
+            if line[0] == FRAME_START:
+                MessageDispatcher.parse_frame(line)
+            else:
+                MessageDispatcher.parse(str(line, "utf-8").strip("\r\n"))
+
+
+def measure(name, stream, count):
+    start = time.process_time()
+    for _ in range(REPETITIONS):
+        consume(stream)
+    elapsed = (time.process_time() - start) / REPETITIONS
+    wire_ms = len(stream) * BITS_PER_BYTE / SerialConnection.BAUDRATE * 1000
+    print(
+        f"{name:>7}: {len(stream) / count:6.1f} bytes/message, "
+        f"{wire_ms / count:5.2f} ms UART time/message, "
+        f"{elapsed * 1e6 / count:5.2f} us CPU/message"
+    )
+    return elapsed
+
+
+def main():
+    lines = [
+        line.strip(" \t\r\n")
+        for line in EmulationData.ESPRESSO_DATA
+        if line.startswith(("Data,", "Sensors,"))
+    ]
+    print(f"{len(lines)} Data/Sensors messages x {REPETITIONS}")
+    text = measure("text", text_stream(lines), len(lines))
+    binary = measure("binary", binary_stream(lines), len(lines))
+    print(f"Saving: {(1 - binary / text) * 100:.1f}% CPU per message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Memory and CPU of the debug CSV of a 60 s shot.
+
+Replays the emulated espresso Data and Sensors lines into the DebugData
+which compresses the CSV while recording, and into the per sample dicts it
+used to keep, which built the whole CSV string and compressed it at stop.
+tracemalloc does not see the memory of the zstd contexts, it is reported
+separately. With neither save_debug_shot_data nor allow_debug_sending set
+nothing is recorded at all.
+
+    python -m benchmarks.bench_debug_capture
+"""
+
+import csv
+import io
+import time
+import tracemalloc
+
+import zstandard as zstd
+
+from benchmarks.bench_shot_buffer import (
+    SAMPLE_RATE,
+    SHOT_SECONDS,
+    best_of,
+    emulated_messages,
+)
+from esp_serial.data import SensorData, ShotData, sensorDataFields, shotDataFields
+from shot_debug_manager import DebugData
+
+
+class LegacyDebugData:
+    """The dict per sample DebugData"""
+
+    def __init__(self) -> None:
+        self.shotData = []
+        self.startTime = time.time()
+
+    def addSensorData(self, sensorData: SensorData):
+        if len(self.shotData) > 0:
+            self.shotData[-1].update(sensorData.as_dict())
+
+    def addShotData(self, shotData: ShotData):
+        self.shotData.append(
+            {
+                "pressure": shotData.pressure,
+                "flow": shotData.flow,
+                "weight": shotData.weight,
+                "temperature": shotData.temperature,
+                "gravimetric_flow": shotData.gravimetric_flow,
+                "time": shotData.time,
+                "profile_time": time.time() - self.startTime,
+                "status": shotData.status,
+                "profile": shotData.profile,
+                "main_controller_kind": shotData.main_controller_kind,
+                "main_setpoint": shotData.main_setpoint,
+                "aux_controller_kind": shotData.aux_controller_kind,
+                "aux_setpoint": shotData.aux_setpoint,
+                "is_aux_controller_active": shotData.is_aux_controller_active,
+            }
+        )
+
+    def finish(self) -> bytes:
+        fields = list(shotDataFields) + list(sensorDataFields)
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=fields + ["startTime", "profile_ms"])
+        writer.writeheader()
+        for sample in self.shotData:
+            row = {
+                "startTime": self.startTime,
+                "profile_ms": round(sample["profile_time"] * 1000),
+            }
+            for field in fields:
+                row[field] = sample.get(field, "")
+            writer.writerow(row)
+        result = output.getvalue()
+        output.close()
+        compressor = zstd.ZstdCompressor(level=8)
+        compressed = compressor.compress(result.encode("utf-8"))
+        self.context_size = compressor.memory_size()
+        return compressed
+
+
+def record(debug_data, messages):
+    for data, sensors in messages:
+        debug_data.addShotData(data)
+        debug_data.addSensorData(sensors)
+    return debug_data
+
+
+def report(name, factory, messages):
+    tracemalloc.start()
+    debug_data = record(factory(), messages)
+    held, _peak = tracemalloc.get_traced_memory()
+    if isinstance(debug_data, DebugData):
+        context_size = debug_data._compressor.memory_size()
+    tracemalloc.reset_peak()
+    compressed = debug_data.finish()
+    _memory, stop_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if isinstance(debug_data, LegacyDebugData):
+        context_size = debug_data.context_size
+
+    record_cpu = best_of(lambda: record(factory(), messages))
+    shots = [record(factory(), messages) for _ in range(5)]
+    stop_cpu = best_of(lambda: shots.pop().finish())
+
+    print(
+        f"{name:>9}: {held / 1024:7.1f} KiB held, {stop_peak / 1024:7.1f} KiB peak at stop, "
+        f"zstd context {context_size / 1024:7.1f} KiB, "
+        f"recording {record_cpu * 1000:6.1f} ms, stop {stop_cpu * 1000:6.1f} ms "
+        f"({len(compressed) / 1024:.0f} KiB compressed)"
+    )
+
+
+def main():
+    messages = emulated_messages()
+    print(
+        f"{len(messages)} Data + Sensors samples ({SHOT_SECONDS} s at {SAMPLE_RATE} Hz)"
+    )
+    report("dicts", LegacyDebugData, messages)
+    report("streaming", DebugData, messages)
+
+
+if __name__ == "__main__":
+    main()
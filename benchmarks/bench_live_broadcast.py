@@ -0,0 +1,90 @@
+"""CPU per live() tick for 1, 5 and 20 socket.io clients.
+
+Replays emulated Data messages as packed "telemetry" events to simulated
+clients, whose transport only encodes the engine.io packet and counts its
+bytes. Compares:
+
+    per client:  every recipient gets its own encode (python-socketio < 5.9)
+    sio.emit:    the installed python-socketio, json module
+    broadcast:   live_broadcast.broadcast(), encoded once with orjson
+
+    python -m benchmarks.bench_live_broadcast
+"""
+
+import asyncio
+import json
+import os
+import time
+
+import socketio
+from socketio import packet
+
+from benchmarks.bench_status_delta import emulated_statuses
+from live_broadcast import ClientBackpressure, OrjsonSerializer, broadcast
+
+TICKS = int(os.getenv("TICKS", "500"))
+CLIENTS = (1, 5, 20)
+ROOM = "telemetry"
+
+
+async def simulated_server(clients):
+    sio = socketio.AsyncServer(async_mode="tornado")
+    sent = {"bytes": 0}
+
+    async def send_packet(eio_sid, pkt):
+        sent["bytes"] += len(pkt.encode())
+
+    sio.eio.send_packet = send_packet
+    ClientBackpressure.init(sio)
+    for client in range(clients):
+        sid = await sio.manager.connect(f"eio{client}", "/")
+        await sio.manager.enter_room(sid, "/", ROOM)
+    return sio, sent
+
+
+async def per_client(sio, event, data):
+    for _sid, eio_sid in list(sio.manager.get_participants("/", ROOM)):
+        await sio._send_packet(
+            eio_sid, sio.packet_class(packet.EVENT, namespace="/", data=[event, data])
+        )
+
+
+async def installed_emit(sio, event, data):
+    await sio.emit(event, data, room=ROOM)
+
+
+async def encode_once(sio, event, data):
+    await broadcast(sio, event, data, ROOM)
+
+
+async def measure(payloads, clients, emit, serializer):
+    sio, sent = await simulated_server(clients)
+    sio.packet_class.json = serializer
+    start = time.process_time()
+    for payload in payloads:
+        await emit(sio, "telemetry", payload)
+    cpu = time.process_time() - start
+    return cpu / len(payloads), sent["bytes"] / len(payloads)
+
+
+async def main():
+    statuses = emulated_statuses()
+    payloads = [{"status": next(statuses)} for _ in range(TICKS)]
+
+    variants = (
+        ("per client", per_client, json),
+        ("sio.emit", installed_emit, json),
+        ("broadcast", encode_once, OrjsonSerializer),
+    )
+    for clients in CLIENTS:
+        for name, emit, serializer in variants:
+            cpu, size = await measure(payloads, clients, emit, serializer)
+            print(
+                f"{clients:3d} clients {name:>10}: {cpu * 1e6:7.1f} µs CPU/tick, "
+                f"{size:6.0f} B/tick"
+            )
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""Throughput benchmark for parsing ESP32 serial messages.
+
+Feeds EmulationData.ESPRESSO_DATA through the previous split + match based
+parsing and the prefix keyed MessageDispatcher and reports the CPU time
+spent per line for both.
+
+    python -m benchmarks.bench_message_dispatch
+"""
+
+import logging
+import time
+
+from esp_serial.connection.emulation_data import EmulationData
+from esp_serial.data import (
+    ButtonEventData,
+    ESPInfo,
+    HeaterTimeoutInfo,
+    MachineNotify,
+    SensorData,
+    ShotData,
+)
+from esp_serial.dispatcher import MessageDispatcher
+
+REPETITIONS = 10
+
+
+def legacy_parse(data_str):
+    """The message parsing Machine._read_data did before the MessageDispatcher"""
+    data_str_sensors = data_str.strip("\r\n").split(",")
+    match (data_str_sensors):
+        case ["CCW" | "CW" | "push" | "pu_d" | "elng" | "ta_d" | "ta_l" | "strt"] as ev:
+            return ButtonEventData.from_args(ev)
+        case ["Event", *eventData]:
+            return ButtonEventData.from_args(eventData)
+        case ["Data", *dataArgs]:
+            return ShotData.from_args(dataArgs)
+        case ["Sensors", colorCodedString]:
+            return SensorData.from_color_coded_args(colorCodedString)
+        case ["Sensors", *sensorArgs]:
+            return SensorData.from_args(sensorArgs)
+        case ["ESPInfo", *infoArgs]:
+            return ESPInfo.from_args(infoArgs)
+        case ["Notify", *notifyArgs]:
+            return MachineNotify(
+                notifyArgs[0], ",".join(notifyArgs[1:]).replace(";", "\n")
+            )
+        case ["HeaterTimeoutInfo", *timeoutArgs]:
+            return HeaterTimeoutInfo.from_args(timeoutArgs)
+        case [*_]:
+            logging.getLogger(__name__).info(data_str.strip("\r\n"))
+    return None
+
+
+def dispatcher_parse(data_str):
+    return MessageDispatcher.parse(data_str.strip("\r\n"))
+
+
+def measure(name, parse, lines):
+    start = time.process_time()
+    for _ in range(REPETITIONS):
+        for line in lines:
+            parse(line)
+    elapsed = time.process_time() - start
+    count = len(lines) * REPETITIONS
+    print(
+        f"{name:>18}: {elapsed * 1e6 / count:6.2f} us CPU per line, "
+        f"{count / elapsed:>9.0f} lines/s"
+    )
+    return elapsed
+
+
+def main():
+    # Unknown lines are logged on both paths, we only want the parsing cost
+    logging.disable(logging.INFO)
+
+    lines = [line + "\r\n" for line in EmulationData.ESPRESSO_DATA if line.strip()]
+    print(f"Parsing {len(lines)} lines x {REPETITIONS}")
+    legacy = measure("split + match", legacy_parse, lines)
+    dispatched = measure("MessageDispatcher", dispatcher_parse, lines)
+    print(f"Saving: {(1 - dispatched / legacy) * 100:.1f}% CPU per line")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""socket.io packets, bytes and encoding time of one live() tick.
+
+Compares the five legacy events ("status", "sensors", "comunication",
+"actuators" and "accessories") with the single packed "telemetry" event.
+python-socketio encodes every packet once per connected client and every
+packet is its own websocket frame and write.
+
+    python -m benchmarks.bench_packed_telemetry
+"""
+
+import time
+
+from socketio import packet
+
+from esp_serial.data import SensorData, ShotData
+
+TICKS = 10_000
+CLIENTS = (1, 5, 20)
+
+
+def tick_payloads():
+    shot = ShotData(9.0, 2.1, 18.3, 92.5, "infusion", "mimoja", -1, "brewing")
+    sensors = SensorData(*(float(i) + 0.25 for i in range(20)))
+    status = shot.to_sio()
+    status["loaded_profile"] = "Italian limbus"
+    status["id"] = "05051ed3-9996-43e8-9da6-963f2b31d481"
+    groups = {
+        "sensors": sensors.to_sio_temperatures(),
+        "comunication": sensors.to_sio_communication(),
+        "actuators": sensors.to_sio_actuators(),
+        "accessories": sensors.to_sio_accessory_data(),
+    }
+    legacy = [("status", status)] + list(groups.items())
+    packed = [("telemetry", {"status": status, **groups})]
+    return legacy, packed
+
+
+def encode(events):
+    return [
+        packet.Packet(packet.EVENT, data=[event, data]).encode()
+        for event, data in events
+    ]
+
+
+def measure(events):
+    size = sum(len(encoded) for encoded in encode(events))
+    start = time.perf_counter()
+    for _ in range(TICKS):
+        encode(events)
+    per_tick = (time.perf_counter() - start) / TICKS
+    return size, per_tick
+
+
+def main():
+    legacy, packed = tick_payloads()
+    for name, events in (("legacy", legacy), ("telemetry", packed)):
+        size, per_tick = measure(events)
+        print(f"{name:>10}: {len(events)} packets, {size} B per tick and client")
+        for clients in CLIENTS:
+            print(
+                f"{'':>12}{clients:3d} clients: {len(events) * clients:3d} frames, "
+                f"{per_tick * clients * 1e6:7.1f} µs encoding per tick"
+            )
+
+
+if __name__ == "__main__":
+    main()
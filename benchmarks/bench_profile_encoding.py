@@ -0,0 +1,86 @@
+"""Size and UART transfer time of the node-JSON profiles sent to the ESP32.
+
+Converts simplified_json_example.json and every profile in DEFAULT_PROFILES
+(if that folder exists) the same way ProfileManager.send_profile_to_esp32
+does and compares the previous json.dumps() upload with the minified and
+the compact (key/enum dictionary) encodings.
+
+    DEFAULT_PROFILES=/path/to/default_profiles python -m benchmarks.bench_profile_encoding
+"""
+
+import json
+import os
+import time
+
+from esp_serial.connection.serial_connection import SerialConnection
+from profile_converter.compact_encoding import (
+    decode_compact,
+    dumps_minified,
+    encode_compact,
+)
+from profile_converter.profile_converter import ComplexProfileConverter
+from profile_preprocessor import ProfilePreprocessor
+
+DEFAULT_PROFILES_PATH = os.getenv(
+    "DEFAULT_PROFILES", "/opt/meticulous-backend/default_profiles"
+)
+EXAMPLE_PATH = os.path.join("profile_converter", "simplified_json_example.json")
+# 8N1: a start and a stop bit per byte
+BITS_PER_BYTE = 10
+
+
+def profile_paths():
+    paths = [EXAMPLE_PATH]
+    if os.path.isdir(DEFAULT_PROFILES_PATH):
+        paths += sorted(
+            os.path.join(DEFAULT_PROFILES_PATH, name)
+            for name in os.listdir(DEFAULT_PROFILES_PATH)
+            if name.endswith(".json")
+        )
+    else:
+        print(f"{DEFAULT_PROFILES_PATH} not found, only using the example profile")
+    return paths
+
+
+def node_json(path):
+    with open(path) as f:
+        data = json.load(f)
+    preprocessed = ProfilePreprocessor.processVariables(data)
+    return ComplexProfileConverter(True, True, 1000, 7000, preprocessed).get_profile()
+
+
+def transfer_ms(size):
+    return size * BITS_PER_BYTE / SerialConnection.BAUDRATE * 1000
+
+
+def main():
+    totals = [0, 0, 0]
+    encode_time = 0
+    print(f"{'profile':>32} {'json.dumps':>16} {'minified':>16} {'compact':>16}")
+    for path in profile_paths():
+        profile = node_json(path)
+        start = time.perf_counter()
+        compact = dumps_minified(encode_compact(profile))
+        encode_time += time.perf_counter() - start
+        assert decode_compact(json.loads(compact)) == profile
+
+        sizes = [len(json.dumps(profile)), len(dumps_minified(profile)), len(compact)]
+        totals = [total + size for total, size in zip(totals, sizes)]
+        name = os.path.basename(path)[:32]
+        print(
+            f"{name:>32} "
+            + " ".join(f"{size:6d} B {transfer_ms(size):5.0f} ms" for size in sizes)
+        )
+
+    print(
+        f"{'total':>32} "
+        + " ".join(f"{size:6d} B {transfer_ms(size):5.0f} ms" for size in totals)
+    )
+    print(
+        f"compact saves {(1 - totals[2] / totals[0]) * 100:.1f}% over json.dumps, "
+        f"encoding took {encode_time * 1000:.2f} ms in total"
+    )
+
+
+if __name__ == "__main__":
+    main()
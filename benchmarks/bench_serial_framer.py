@@ -0,0 +1,155 @@
+"""Micro-benchmark for the ESP32 serial line framing.
+
+Replays the emulated espresso shot through a fake serial port which hands
+out the bytes in bursty, randomly sized chunks and compares the previous
+bytearray based readline with the preallocated SerialFramer.
+
+    python -m benchmarks.bench_serial_framer
+"""
+
+import random
+import time
+import tracemalloc
+
+from esp_serial.connection.emulation_data import EmulationData
+from esp_serial.framer import SerialFramer
+
+REPETITIONS = 20
+
+
+class BurstyPort:
+    """Mimics the parts of pyserial used by the framers"""
+
+    def __init__(self, payload: bytes, seed=42) -> None:
+        self.payload = payload
+        self.view = memoryview(payload)
+        self.pos = 0
+        rng = random.Random(seed)
+        # Often a single byte is waiting, sometimes a whole burst of messages
+        self.bursts = [
+            rng.choice([1, 1, 1, 7, 64, 180, 512, 1500]) for _ in range(4096)
+        ]
+        self.burst = 0
+        self.available = 0
+
+    def exhausted(self):
+        return self.pos >= len(self.payload)
+
+    @property
+    def in_waiting(self):
+        if self.available == 0 and not self.exhausted():
+            self.available = self.bursts[self.burst % len(self.bursts)]
+            self.burst += 1
+        return min(self.available, len(self.payload) - self.pos)
+
+    def read(self, size):
+        size = min(size, len(self.payload) - self.pos)
+        data = self.payload[self.pos : self.pos + size]
+        self.pos += size
+        self.available = max(0, self.available - size)
+        return data
+
+    def readinto(self, buffer):
+        size = min(len(buffer), len(self.payload) - self.pos)
+        buffer[:size] = self.view[self.pos : self.pos + size]
+        self.pos += size
+        self.available = max(0, self.available - size)
+        return size
+
+
+class LegacyReadLine:
+    """The readline Machine used before the SerialFramer"""
+
+    def __init__(self, s):
+        self.buf = bytearray()
+        self.s = s
+
+    def readline(self):
+        i = self.buf.find(b"\n")
+        if i >= 0:
+            r = self.buf[: i + 1]
+            self.buf = self.buf[i + 1 :]
+            return r
+        while not self.s.exhausted():
+            i = max(1, min(2048, self.s.in_waiting))
+            data = self.s.read(i)
+            i = data.find(b"\n")
+            if i >= 0:
+                r = self.buf + data[: i + 1]
+                self.buf[0:] = data[i + 1 :]
+                return r
+            else:
+                self.buf.extend(data)
+        return self.buf
+
+
+def build_payload():
+    lines = [line.strip() for line in EmulationData.ESPRESSO_DATA if line.strip()]
+    return ("\r\n".join(lines) + "\r\n").encode("utf-8") * REPETITIONS
+
+
+def run_legacy(payload, on_line):
+    port = BurstyPort(payload)
+    uart = LegacyReadLine(port)
+    count = 0
+    while not port.exhausted() or len(uart.buf) > 0:
+        line = uart.readline()
+        if len(line) > 0:
+            on_line(line)
+            count += 1
+    return count
+
+
+def run_framer(payload, on_line):
+    port = BurstyPort(payload)
+    framer = SerialFramer()
+    count = 0
+    while not port.exhausted():
+        framer.read_from(port)
+        for line in framer.lines():
+            on_line(line)
+            count += 1
+    return count
+
+
+def decode(line):
+    return str(line, "utf-8")
+
+
+def measure(name, runner, payload):
+    start = time.perf_counter()
+    lines = runner(payload, decode)
+    elapsed = time.perf_counter() - start
+
+    # Trace a second pass: the peak above the baseline, taken per line, is the
+    # memory the framer had to allocate to produce (and decode) that line
+    samples = []
+
+    def on_line(line):
+        _current, peak = tracemalloc.get_traced_memory()
+        samples.append(peak - baseline[0])
+        decode(line)
+        tracemalloc.reset_peak()
+        baseline[0] = tracemalloc.get_traced_memory()[0]
+
+    baseline = [0]
+    tracemalloc.start()
+    baseline[0] = tracemalloc.get_traced_memory()[0]
+    runner(payload, on_line)
+    tracemalloc.stop()
+
+    print(
+        f"{name:>14}: {lines} lines, {lines / elapsed:>10.0f} lines/s, "
+        f"{sum(samples) / len(samples):>7.1f} bytes allocated per line"
+    )
+
+
+def main():
+    payload = build_payload()
+    print(f"Replaying {len(payload)} bytes of emulated espresso data")
+    measure("legacy", run_legacy, payload)
+    measure("SerialFramer", run_framer, payload)
+
+
+if __name__ == "__main__":
+    main()
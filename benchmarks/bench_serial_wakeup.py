@@ -0,0 +1,102 @@
+"""Wake-up latency of the serial reader.
+
+Writes timestamped lines into a pty every few milliseconds and measures how
+long it takes until they are parsed, once with the previous dedicated thread
+blocking in SerialFramer.read_from() and once with the port registered on the
+IOLoop, the way Machine reads it now. The CPU time of the whole process is
+reported as well.
+
+    python -m benchmarks.bench_serial_wakeup
+"""
+
+import os
+import pty
+import statistics
+import threading
+import time
+
+import serial
+import tornado.ioloop
+
+from esp_serial.framer import SerialFramer
+
+MESSAGES = 400
+INTERVAL = 0.005
+
+
+def open_pty():
+    them, us = pty.openpty()
+    port = serial.Serial(os.ttyname(us), baudrate=115200, timeout=2)
+    return them, port
+
+
+def writer(fd):
+    for _ in range(MESSAGES):
+        os.write(fd, f"{time.perf_counter()}\n".encode())
+        time.sleep(INTERVAL)
+
+
+def collect(framer, latencies):
+    now = time.perf_counter()
+    for line in framer.lines():
+        latencies.append(now - float(str(line, "utf-8")))
+
+
+def threaded():
+    them, port = open_pty()
+    framer = SerialFramer()
+    latencies = []
+
+    def reader():
+        while len(latencies) < MESSAGES:
+            framer.read_from(port)
+            collect(framer, latencies)
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    writer(them)
+    thread.join()
+    port.close()
+    return latencies
+
+
+def ioloop():
+    them, port = open_pty()
+    framer = SerialFramer()
+    latencies = []
+    loop = tornado.ioloop.IOLoop(make_current=False)
+
+    def on_readable(fd, events):
+        framer.read_fd(fd)
+        collect(framer, latencies)
+        if len(latencies) >= MESSAGES:
+            loop.stop()
+
+    loop.add_handler(port.fileno(), on_readable, tornado.ioloop.IOLoop.READ)
+    thread = threading.Thread(target=writer, args=(them,))
+    thread.start()
+    loop.start()
+    thread.join()
+    loop.close()
+    port.close()
+    return latencies
+
+
+def report(name, run):
+    cpu = time.process_time()
+    latencies = run()
+    cpu = time.process_time() - cpu
+    print(
+        f"{name:>16}: median {statistics.median(latencies) * 1e6:7.1f} us, "
+        f"p99 {sorted(latencies)[int(len(latencies) * 0.99)] * 1e6:7.1f} us, "
+        f"{cpu * 1000:6.1f} ms CPU for {MESSAGES} lines"
+    )
+
+
+def main():
+    report("reader thread", threaded)
+    report("IOLoop handler", ioloop)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Memory and CPU of recording a 60 s shot in shot_manager.Shot.
+
+Replays the emulated espresso Data and Sensors lines at SAMPLE_RATE Hz for
+60 s into the columnar Shot and into the per sample dicts it used to keep,
+then builds the shot file JSON from both.
+
+    python -m benchmarks.bench_shot_buffer
+"""
+
+import json
+import os
+import time
+import tracemalloc
+from dataclasses import replace
+
+from esp_serial.connection.emulation_data import EmulationData
+from esp_serial.data import SensorData, ShotData
+from esp_serial.dispatcher import MessageDispatcher, MessageType
+from shot_manager import Shot
+
+SHOT_SECONDS = 60
+SAMPLE_RATE = int(os.getenv("SAMPLE_RATE", "25"))
+
+
+class LegacyShot:
+    """The dict per sample Shot, without the profile lookup"""
+
+    def __init__(self) -> None:
+        self.shotData = []
+
+    def addSensorData(self, sensorData: SensorData):
+        if len(self.shotData) > 0:
+            self.shotData[-1]["sensors"] = sensorData.as_dict()
+
+    def addShotData(self, shotData: ShotData):
+        self.shotData.append(
+            {
+                "shot": {
+                    "pressure": shotData.pressure,
+                    "flow": shotData.flow,
+                    "weight": shotData.weight,
+                    "gravimetric_flow": shotData.gravimetric_flow,
+                    "setpoints": shotData.to_sio().get("setPoints", {}),
+                },
+                "time": shotData.time,
+                "status": shotData.status,
+            }
+        )
+
+    def to_json(self):
+        return {"data": self.shotData}
+
+
+def emulated_messages():
+    data = []
+    sensors = []
+    for line in EmulationData.ESPRESSO_DATA:
+        kind, message = MessageDispatcher.parse(line.strip(" \t\r\n"))
+        if kind is MessageType.DATA:
+            data.append(message)
+        elif kind is MessageType.SENSORS:
+            sensors.append(message)
+
+    messages = []
+    for i in range(SHOT_SECONDS * SAMPLE_RATE):
+        sample = replace(data[i % len(data)], time=i * 1000 // SAMPLE_RATE)
+        messages.append((sample, sensors[i % len(sensors)]))
+    return messages
+
+
+def record(shot, messages):
+    for data, sensors in messages:
+        shot.addShotData(data)
+        shot.addSensorData(sensors)
+    return shot
+
+
+def new_shot():
+    shot = Shot()
+    # Skips the ProfileManager lookup
+    shot.profile_name = "benchmark"
+    shot.profile = {}
+    return shot
+
+
+def best_of(function, repeat=5):
+    """Lowest CPU time of `repeat` runs in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.process_time()
+        function()
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(name, factory, messages):
+    tracemalloc.start()
+    shot = record(factory(), messages)
+    memory, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    record_cpu = best_of(lambda: record(factory(), messages))
+    save_cpu = best_of(lambda: json.dumps(shot.to_json(), ensure_ascii=False))
+    encoded = json.dumps(shot.to_json(), ensure_ascii=False)
+
+    print(
+        f"{name:>8}: {memory / 1024:8.1f} KiB held, recording {record_cpu * 1000:6.1f} ms, "
+        f"JSON at save {save_cpu * 1000:6.1f} ms ({len(encoded) / 1024:.0f} KiB)"
+    )
+
+
+def main():
+    messages = emulated_messages()
+    print(
+        f"{len(messages)} Data + Sensors samples ({SHOT_SECONDS} s at {SAMPLE_RATE} Hz)"
+    )
+    report("dicts", LegacyShot, messages)
+    report("columns", new_shot, messages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Compression ratio against compression time of the shot files.
+
+Builds TRAINING_SHOTS + TEST_SHOTS shots from the emulated espresso data,
+each with its own start offset, length and scaling, trains a dictionary on
+the first ones like ShotCompression.refresh_dictionary() does and compresses
+the others in the chunks ShotFileWriter writes, with and without the
+dictionary. The emulator replays the same shot over and over, real shots
+differ more from each other.
+
+    python -m benchmarks.bench_shot_compression
+"""
+
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from dataclasses import replace
+
+# The dictionaries are written below HISTORY_PATH
+BENCHMARK_HISTORY_PATH = tempfile.mkdtemp()
+os.environ["HISTORY_PATH"] = BENCHMARK_HISTORY_PATH
+
+import zstandard as zstd  # noqa: E402
+
+from benchmarks.bench_shot_buffer import emulated_messages, new_shot  # noqa: E402
+from shot_compression import SHOT_COMPRESSION_LEVELS, ShotCompression  # noqa: E402
+from shot_manager import ShotManager  # noqa: E402
+
+TRAINING_SHOTS = 20
+TEST_SHOTS = 5
+
+
+def make_shot(messages, seed):
+    rng = random.Random(seed)
+    offset = rng.randrange(len(messages))
+    scale = rng.uniform(0.9, 1.1)
+    shot = new_shot()
+    for index in range(rng.randrange(750, 1500)):
+        data, sensors = messages[(offset + index) % len(messages)]
+        shot.addShotData(
+            replace(
+                data,
+                pressure=data.pressure * scale,
+                flow=data.flow * scale,
+                weight=data.weight * scale,
+                time=index * 40,
+            )
+        )
+        shot.addSensorData(sensors)
+    return shot
+
+
+def chunks(shot):
+    """The text ShotFileWriter compresses, split the same way"""
+    yield json.dumps(shot.header())[:-1] + ', "data": ['
+    lines = [json.dumps(sample) for sample in shot.data()]
+    step = ShotManager.WRITE_CHUNK_SAMPLES
+    for start in range(0, len(lines), step):
+        yield ("\n" if start == 0 else ",\n") + ",\n".join(lines[start : start + step])
+    yield "\n]}"
+
+
+def compress(shot_chunks, level):
+    output = io.BytesIO()
+    compressor = ShotCompression.compressor(level).stream_writer(output, closefd=False)
+    for chunk in shot_chunks:
+        compressor.write(chunk)
+        compressor.flush(zstd.FLUSH_BLOCK)
+    compressor.flush(zstd.FLUSH_FRAME)
+    return len(output.getvalue())
+
+
+def main():
+    messages = emulated_messages()
+    folder = tempfile.mkdtemp()
+    try:
+        training_files = []
+        for seed in range(TRAINING_SHOTS):
+            path = os.path.join(folder, f"{seed}.shot.json.zst")
+            with open(path, "wb") as file:
+                file.write(
+                    zstd.ZstdCompressor().compress(
+                        json.dumps(make_shot(messages, seed).to_json()).encode()
+                    )
+                )
+            training_files.append(path)
+
+        test_shots = [
+            [chunk.encode() for chunk in chunks(make_shot(messages, 1000 + seed))]
+            for seed in range(TEST_SHOTS)
+        ]
+        raw_bytes = sum(len(chunk) for shot in test_shots for chunk in shot)
+
+        start = time.perf_counter()
+        ShotCompression.train_dictionary(training_files)
+        training_ms = (time.perf_counter() - start) * 1000
+        dictionary = ShotCompression._dictionary
+        print(
+            f"{TEST_SHOTS} shots, {raw_bytes / TEST_SHOTS / 1024:.0f} KiB JSON each, "
+            f"dictionary trained on {TRAINING_SHOTS} shots in {training_ms:.0f} ms"
+        )
+
+        for level in SHOT_COMPRESSION_LEVELS + (15, 19, 22):
+            results = []
+            for with_dictionary in (False, True):
+                ShotCompression._dictionary = dictionary if with_dictionary else None
+                start = time.process_time()
+                compressed = sum(compress(shot, level) for shot in test_shots)
+                compression_ms = (time.process_time() - start) * 1000 / TEST_SHOTS
+                results.append(
+                    f"{raw_bytes / compressed:5.1f}x {compression_ms:7.1f} ms"
+                )
+            print(f"level {level:2d}: {results[0]}, with dictionary {results[1]}")
+    finally:
+        shutil.rmtree(folder)
+        shutil.rmtree(BENCHMARK_HISTORY_PATH)
+
+
+if __name__ == "__main__":
+    main()
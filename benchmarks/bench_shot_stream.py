@@ -0,0 +1,99 @@
+"""Cost of saving a 60 s shot at the end vs compressing it while brewing.
+
+Records the emulated espresso shot (see bench_shot_buffer) and writes the
+shot file once the way ShotManager.stop() used to (build the JSON, then
+compress it in one go at level 22) and once through ShotFileWriter, which
+gets the samples in chunks of ShotManager.WRITE_CHUNK_SAMPLES while the
+shot is recorded, at the level ShotCompression starts with.
+
+    python -m benchmarks.bench_shot_stream
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import zstandard as zstd
+
+from benchmarks.bench_shot_buffer import (
+    SAMPLE_RATE,
+    SHOT_SECONDS,
+    emulated_messages,
+    new_shot,
+)
+from shot_file_writer import ShotFileWriter
+from shot_manager import ShotManager
+
+
+def save_at_stop(messages, folder):
+    shot = new_shot()
+    for data, sensors in messages:
+        shot.addShotData(data)
+        shot.addSensorData(sensors)
+
+    start = time.perf_counter()
+    data_json = json.dumps(shot.to_json(), ensure_ascii=False)
+    path = os.path.join(folder, "stop.shot.json.zst")
+    with open(path, "wb") as file:
+        cctx = zstd.ZstdCompressor(level=22)
+        with cctx.stream_writer(file) as compressor:
+            compressor.write(data_json.encode("utf-8"))
+    stop_time = time.perf_counter() - start
+    return stop_time, 0.0, os.path.getsize(path)
+
+
+def save_while_brewing(messages, folder):
+    shot = new_shot()
+    writer = ShotFileWriter(os.path.join(folder, "partial.shot.json.zst"))
+    written = 0
+    chunk_time = 0.0
+    chunks = 0
+
+    def write_samples(end):
+        nonlocal written
+        if written == 0:
+            writer.write_header(shot.header())
+        writer.write_samples(shot.data(written, end))
+        written = end
+
+    for data, sensors in messages:
+        shot.addShotData(data)
+        end = len(shot) - 1
+        if end - written >= ShotManager.WRITE_CHUNK_SAMPLES:
+            start = time.perf_counter()
+            write_samples(end)
+            chunk_time += time.perf_counter() - start
+            chunks += 1
+        shot.addSensorData(sensors)
+
+    start = time.perf_counter()
+    write_samples(len(shot))
+    path = os.path.join(folder, "brewing.shot.json.zst")
+    writer.finish(path)
+    stop_time = time.perf_counter() - start
+    writer.flush()
+    return stop_time, chunk_time / chunks, os.path.getsize(path)
+
+
+def main():
+    messages = emulated_messages()
+    folder = tempfile.mkdtemp()
+    print(f"{len(messages)} samples ({SHOT_SECONDS} s at {SAMPLE_RATE} Hz)")
+    try:
+        for name, save in (
+            ("at stop", save_at_stop),
+            ("while brewing", save_while_brewing),
+        ):
+            stop_time, chunk_time, size = save(messages, folder)
+            print(
+                f"{name:>14}: {stop_time * 1000:7.1f} ms after the shot, "
+                f"{chunk_time * 1000:5.2f} ms per chunk, {size / 1024:6.1f} KiB"
+            )
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
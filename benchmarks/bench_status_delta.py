@@ -0,0 +1,101 @@
+"""Websocket bytes and JSON encoding time of the full vs delta `status` stream.
+
+Runs the emulator through an espresso shot and the following idle phase,
+builds the status dict from every Data message like live() does and
+encodes it once as the full "status" and once as a "status_delta" frame.
+Every Data message counts as one live() tick, which is the worst case for the
+delta stream as the sensor values change on every tick.
+
+    python -m benchmarks.bench_status_delta
+"""
+
+import json
+import os
+import time
+
+os.environ.setdefault("EMULATION_SPEED", "1000")
+
+from esp_serial.connection.emulator_serial_connection import (  # noqa: E402
+    EmulatorSerialConnection,
+)
+from esp_serial.dispatcher import MessageDispatcher, MessageType  # noqa: E402
+from esp_serial.framer import FRAME_START, SerialFramer  # noqa: E402
+from status_delta import StatusDeltaEncoder, apply_status_delta  # noqa: E402
+
+TICKS = int(os.getenv("TICKS", "1500"))
+CLIENTS = (1, 5, 20)
+
+
+def emulated_statuses():
+    connection = EmulatorSerialConnection()
+    framer = SerialFramer()
+    time.sleep(2.2)
+    connection.port.write(b"action,start\x03")
+
+    while True:
+        framer.read_from(connection.port)
+        for line in framer.lines():
+            if line[0] == FRAME_START:
+                kind, message = MessageDispatcher.parse_frame(line)
+            else:
+                kind, message = MessageDispatcher.parse(
+                    str(line, "utf-8", errors="ignore").strip("\r\n")
+                )
+            if kind is not MessageType.DATA or message is None:
+                continue
+            status = message.to_sio()
+            status["loaded_profile"] = "Italian limbus"
+            status["id"] = "05051ed3-9996-43e8-9da6-963f2b31d481"
+            yield status
+
+
+def main():
+    full_bytes = 0
+    delta_bytes = 0
+    full_time = 0
+    delta_time = 0
+    diff_time = 0
+    keyframes = 0
+    encoder = StatusDeltaEncoder()
+    client_status = None
+
+    statuses = emulated_statuses()
+    for _tick in range(TICKS):
+        status = next(statuses)
+
+        start = time.perf_counter()
+        full_bytes += len(json.dumps(status))
+        full_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        frame = encoder.encode(status)
+        diff_time += time.perf_counter() - start
+        if frame is not None:
+            start = time.perf_counter()
+            delta_bytes += len(json.dumps(frame))
+            delta_time += time.perf_counter() - start
+            keyframes += frame["keyframe"]
+            client_status = apply_status_delta(client_status, frame)
+
+        assert client_status == status
+
+    print(f"{TICKS} ticks, {keyframes} keyframes")
+    print(f"{'full status':>14}: {full_bytes / TICKS:6.1f} B/tick")
+    print(
+        f"{'status_delta':>14}: {delta_bytes / TICKS:6.1f} B/tick "
+        f"({(1 - delta_bytes / full_bytes) * 100:.1f}% less)"
+    )
+    # python-socketio serializes the packet once per connected client, the
+    # diff is computed once per tick
+    for clients in CLIENTS:
+        full_us = full_time * clients / TICKS * 1e6
+        delta_us = (diff_time + delta_time * clients) / TICKS * 1e6
+        print(
+            f"{clients:3d} clients: full {full_us:7.1f} µs/tick, "
+            f"delta {delta_us:7.1f} µs/tick"
+        )
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
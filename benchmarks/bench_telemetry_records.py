@@ -0,0 +1,99 @@
+"""Memory and CPU cost of the SensorData / ShotData telemetry records.
+
+Compares the slotted records with equivalent plain (__dict__ based)
+dataclasses for 10k samples: memory held, construction time, the per Data
+line time/state update and the dict conversion done by the shot managers.
+
+    python -m benchmarks.bench_telemetry_records
+"""
+
+import dataclasses
+import time
+import tracemalloc
+
+from esp_serial.data import SensorData, ShotData
+
+SAMPLES = 10_000
+
+
+def unslotted(cls):
+    """Rebuilds a record class as the plain dataclass it used to be"""
+    return dataclasses.make_dataclass(
+        f"Legacy{cls.__name__}",
+        [
+            (field.name, field.type, dataclasses.field(default=field.default))
+            for field in dataclasses.fields(cls)
+        ],
+    )
+
+
+LegacySensorData = unslotted(SensorData)
+LegacyShotData = unslotted(ShotData)
+
+SENSOR_ARGS = tuple(float(i) for i in range(20))
+SHOT_ARGS = (9.0, 2.1, 18.3, 92.5, "infusion", "mimoja", -1, "brewing")
+
+
+def construct(cls, args):
+    return [cls(*args) for _ in range(SAMPLES)]
+
+
+def memory_of(cls, args):
+    tracemalloc.start()
+    records = construct(cls, args)
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return size
+
+
+def timed(function, *args, repeat=5):
+    """Best of `repeat` runs in ms"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(name, cls, args):
+    construction_ms = timed(construct, cls, args)
+    print(
+        f"{name:>18}: {memory_of(cls, args) / 1024:8.1f} KiB, "
+        f"construct {construction_ms:6.2f} ms per {SAMPLES} samples"
+    )
+
+
+def main():
+    report("SensorData (dict)", LegacySensorData, SENSOR_ARGS)
+    report("SensorData (slots)", SensorData, SENSOR_ARGS)
+    report("ShotData (dict)", LegacyShotData, SHOT_ARGS)
+    report("ShotData (slots)", ShotData, SHOT_ARGS)
+
+    legacy_shots = construct(LegacyShotData, SHOT_ARGS)
+    shots = construct(ShotData, SHOT_ARGS)
+    replace_ms = timed(
+        lambda: [
+            dataclasses.replace(s, time=100, is_extracting=True) for s in legacy_shots
+        ]
+    )
+    in_place_ms = timed(lambda: [s.with_time_and_state(100, True) for s in shots])
+    print(f"\nTime and state per {SAMPLES} Data lines:")
+    print(f"{'dataclasses.replace':>24}: {replace_ms:6.2f} ms")
+    print(f"{'with_time_and_state':>24}: {in_place_ms:6.2f} ms")
+
+    legacy_sensors = construct(LegacySensorData, SENSOR_ARGS)
+    sensors = construct(SensorData, SENSOR_ARGS)
+    dict_ms = timed(lambda: [dict(s.__dict__) for s in legacy_sensors])
+    as_dict_ms = timed(lambda: [s.as_dict() for s in sensors])
+    as_tuple_ms = timed(lambda: [s.as_tuple() for s in sensors])
+    print(f"\nSensor sample conversion per {SAMPLES} Sensors lines:")
+    print(f"{'dict(__dict__)':>24}: {dict_ms:6.2f} ms")
+    print(f"{'as_dict()':>24}: {as_dict_ms:6.2f} ms")
+    print(f"{'as_tuple()':>24}: {as_tuple_ms:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -42,6 +42,23 @@ history = Table(
     Column("profile_name", Text, nullable=False),
     Column("profile_id", Text, nullable=False),
     Column("profile_key", Integer, ForeignKey("profile.key"), nullable=False),
+    # Summary metrics, see shot_summary.summarize()
+    Column("peak_pressure", Float, nullable=True),
+    Column("total_time", Float, nullable=True),
+    Column("final_weight", Float, nullable=True),
+    Column("average_flow", Float, nullable=True),
+    Column("ratio", Float, nullable=True),
+    # Downsampled graph of the shot, see shot_summary.preview(). NULL until
+    # the summary backfill processed the shot.
+    Column("preview", JSON(none_as_null=True), nullable=True),
+)
+
+HISTORY_SUMMARY_COLUMNS = (
+    "peak_pressure",
+    "total_time",
+    "final_weight",
+    "average_flow",
+    "ratio",
 )
 
 shot_annotation = Table(
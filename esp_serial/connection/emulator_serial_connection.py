@@ -5,7 +5,15 @@ import time
 import os
 import pty
 import fcntl
+import re
 from .emulation_data import EmulationData
+from ..dispatcher import (
+    FRAME_TYPE_DATA,
+    FRAME_TYPE_SENSORS,
+    MessageDispatcher,
+    MessageType,
+)
+from ..framer import encode_frame
 
 from log import MeticulousLogger
 
@@ -13,6 +21,8 @@ logger = MeticulousLogger.getLogger(__name__)
 
 EMULATION_SPEED = int(os.getenv("EMULATION_SPEED", "100"))
 
+profileHashRegex = re.compile(rb"hash,([0-9a-f]{32})\x03")
+
 
 class EmulatorSerialConnection(SerialConnection):
     # Data and Sensor message every 150ms, therefore 75ms sleep per message
@@ -25,6 +35,8 @@ class EmulatorSerialConnection(SerialConnection):
 
         super().__init__(os.ttyname(self.us))
         self.line_counter = 0
+        # Set once the backend asks for binary Data and Sensors frames
+        self.binary_telemetry = False
         self.flasher = MagicMock()
         self.send_data_thread = NamedThread("EmulationData", target=self.send_data)
         self.send_data_thread.start()
@@ -54,6 +66,13 @@ class EmulatorSerialConnection(SerialConnection):
             # with an exception
             try:
                 host_commands = os.read(self.them, 2048)
+                uploaded_hash = profileHashRegex.search(host_commands)
+                if uploaded_hash is not None:
+                    # Confirm loading the profile like the firmware does
+                    os.write(
+                        self.them,
+                        b"hash: " + uploaded_hash.group(1) + b"\r\nJSON cargado\r\n",
+                    )
                 if b"action,start" in host_commands:
                     logger.info("Starting espresso simulation!")
                     data_source = EmulationData.ESPRESSO_DATA
@@ -64,6 +83,9 @@ class EmulatorSerialConnection(SerialConnection):
                     data_source = EmulationData.PURGE_DATA
                     self.line_counter = 0
                     continue
+                if b"action,binary_telemetry" in host_commands:
+                    logger.info("Switching to binary telemetry frames")
+                    self.binary_telemetry = True
                 if b"action,stop" in host_commands:
                     logger.info("Stopping all simulations, returning to idle!")
                     data_source = EmulationData.IDLE_DATA
@@ -80,14 +102,35 @@ class EmulatorSerialConnection(SerialConnection):
             if line == "":
                 continue
 
-            line += "\r\n"
-            os.write(self.them, bytes(line.encode()))
+            frame = None
+            if self.binary_telemetry:
+                frame = EmulatorSerialConnection.to_binary_frame(line)
+
+            if frame is not None:
+                os.write(self.them, frame)
+            else:
+                line += "\r\n"
+                os.write(self.them, bytes(line.encode()))
             time.sleep(sleep_time)
 
+    def to_binary_frame(line):
+        """Encodes a Data or Sensors text line the way the firmware would send it
+        in binary telemetry mode. Returns None for all other messages"""
+        if not line.startswith(("Data,", "Sensors,")):
+            return None
+        (message_type, message) = MessageDispatcher.parse(line)
+        if message is None:
+            return None
+        if message_type is MessageType.DATA:
+            return encode_frame(FRAME_TYPE_DATA, message.to_binary())
+        return encode_frame(FRAME_TYPE_SENSORS, message.to_binary())
+
     def reset(self, bootloader=False, sleep=0, ignored_bootloader_sleep=0):
         logger.info("Resetting Dummy ESP32")
         # Next iteration we will return to the idle mode with this
         self.line_counter = 1 << 42
+        # A freshly booted ESP talks text until asked otherwise
+        self.binary_telemetry = False
 
     def sendUpdate(self):
         logger.info("Emulated ESP32 cannot be updated")
@@ -1,7 +1,9 @@
-from dataclasses import dataclass, replace
+from dataclasses import dataclass, fields
 from enum import Enum, auto, unique
+from operator import attrgetter, itemgetter
 import re
 import math
+import struct
 
 from log import MeticulousLogger
 from config import MeticulousConfig, GET_ACCESSORY_DATA, CONFIG_USER
@@ -10,6 +12,58 @@ logger = MeticulousLogger.getLogger(__name__)
 
 colorSensorRegex = None
 
+# Each value of a color coded sensor line follows its colored label
+colorSensorValueRegex = re.compile("\033\\[1;3[1-6]m [a-z0-9_]*\033\\[0m([^\033]*)")
+
+# Positional SensorData arguments (external_1 ... adc_3) picked out of the values
+# of a color coded line, keyed by the number of values. Index -1 is a 0.0 padding
+# for the fields the firmware does not send in that layout
+colorSensorLayouts = {
+    18: itemgetter(
+        0, 1, 2, 3, 4, 5, 6, -1, -1, 8, 9, 10, 11, 12, -1, 13, 14, 15, 16, 17
+    ),
+    20: itemgetter(
+        0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 14, 13, 15, 16, 17, 18, 19
+    ),
+}
+
+
+# Binary telemetry frames carry every number as a little endian int32 fixed point
+# value in hundredths, the resolution the firmware prints in text mode. Dividing
+# by the scale yields exactly the float that parsing the printed text would.
+BINARY_FIXED_POINT_SCALE = 100
+# Stands in for NaN, which the fixed point encoding cannot represent
+BINARY_NAN = -(2**31)
+
+# external_1 ... adc_3 (in field order), water_status, motor_thermistor
+sensorDataStruct = struct.Struct("<20i?i")
+# pressure, flow, weight, temperature, main kind and setpoint, aux kind and
+# setpoint, aux active, gravimetric_flow and the length of the status string.
+# The status and a length prefixed profile name follow the fixed part
+shotDataStruct = struct.Struct("<4iBiBi?iB")
+
+# Controller kinds by their index in a binary Data frame
+binaryControlTypes = (None, "Flow", "Pressure", "Piston", "Power", "Temperature")
+
+
+def to_fixed_point(value):
+    if isinstance(value, str) or math.isnan(value):
+        return BINARY_NAN
+    return round(value * BINARY_FIXED_POINT_SCALE)
+
+
+def from_fixed_point_with_nan(value):
+    if value == BINARY_NAN:
+        return "NaN"
+    return value / BINARY_FIXED_POINT_SCALE
+
+
+def from_fixed_point_float(value):
+    # The setpoints are parsed with float() from text, which keeps NaN a float
+    if value == BINARY_NAN:
+        return float("nan")
+    return value / BINARY_FIXED_POINT_SCALE
+
 
 def safeFloat(val):
     convert = float(val)
@@ -28,7 +82,7 @@ def safe_float_with_nan(value):
         return "NaN"
 
 
-@dataclass
+@dataclass(slots=True)
 class SensorData:
     """Class respresenting the current state of all sensors"""
 
@@ -56,6 +110,47 @@ class SensorData:
     motor_thermistor: float = 0.0
 
     def from_color_coded_args(colorSeperatedArgs):
+        data = SensorData._from_color_coded_values(colorSeperatedArgs)
+        if data is None:
+            data = SensorData._from_color_coded_args_slow(colorSeperatedArgs)
+        return data
+
+    def _from_color_coded_values(colorSeperatedArgs):
+        """
+        Fast path for the common, well formed color coded lines: pulls all values
+        out with a single findall and converts them in one go.
+
+        Returns None whenever the line does not look exactly like what the fast path
+        expects, so that the caller can fall back to the regular parser which also
+        takes care of logging the failure.
+        """
+        if MeticulousConfig[CONFIG_USER][GET_ACCESSORY_DATA]:
+            return None
+
+        values = colorSensorValueRegex.findall(colorSeperatedArgs)
+        layout = colorSensorLayouts.get(len(values))
+        # Every escape sequence has to belong to one of the labels we matched,
+        # otherwise there is text in between we would silently skip
+        if (
+            layout is None
+            or not colorSeperatedArgs.startswith("\033[")
+            or colorSeperatedArgs.count("\033[") != 2 * len(values)
+        ):
+            return None
+
+        try:
+            numbers = list(map(float, values))
+        except ValueError:
+            return None
+
+        # safeFloat() maps NaN to 0, leave those rare lines to the slow path
+        if math.isnan(sum(numbers)):
+            return None
+
+        numbers.append(0.0)
+        return SensorData(*layout(numbers))
+
+    def _from_color_coded_args_slow(colorSeperatedArgs):
         global colorSensorRegex
         if colorSensorRegex is None:
             startColor = "\033\\[1;(31|32|33|34|35|36)m"
@@ -136,6 +231,65 @@ class SensorData:
             return None
         return data
 
+    def from_binary(buffer, offset=0):
+        try:
+            values = sensorDataStruct.unpack_from(buffer, offset)
+        except struct.error as e:
+            logger.warning(
+                f"Failed to parse binary SensorData: {bytes(buffer).hex()}", exc_info=e
+            )
+            return None
+
+        *numbers, water_status, motor_thermistor = values
+        if BINARY_NAN in numbers:
+            # Same as safeFloat() does for the text lines
+            numbers = [0 if number == BINARY_NAN else number for number in numbers]
+        if not MeticulousConfig[CONFIG_USER][GET_ACCESSORY_DATA]:
+            motor_thermistor = 0
+        return SensorData(
+            *[number / BINARY_FIXED_POINT_SCALE for number in numbers],
+            water_status,
+            motor_thermistor / BINARY_FIXED_POINT_SCALE,
+        )
+
+    def to_binary(self):
+        (*numbers, water_status, motor_thermistor) = self.as_tuple()
+        return sensorDataStruct.pack(
+            *map(to_fixed_point, numbers),
+            water_status,
+            to_fixed_point(motor_thermistor),
+        )
+
+    def as_tuple(self):
+        return sensorDataGetter(self)
+
+    def as_dict(self):
+        # Spelled out as it is noticeably faster than zipping the field names
+        return {
+            "external_1": self.external_1,
+            "external_2": self.external_2,
+            "bar_up": self.bar_up,
+            "bar_mid_up": self.bar_mid_up,
+            "bar_mid_down": self.bar_mid_down,
+            "bar_down": self.bar_down,
+            "tube": self.tube,
+            "motor_temp": self.motor_temp,
+            "lam_temp": self.lam_temp,
+            "motor_position": self.motor_position,
+            "motor_speed": self.motor_speed,
+            "motor_power": self.motor_power,
+            "motor_current": self.motor_current,
+            "bandheater_power": self.bandheater_power,
+            "bandheater_current": self.bandheater_current,
+            "pressure_sensor": self.pressure_sensor,
+            "adc_0": self.adc_0,
+            "adc_1": self.adc_1,
+            "adc_2": self.adc_2,
+            "adc_3": self.adc_3,
+            "water_status": self.water_status,
+            "motor_thermistor": self.motor_thermistor,
+        }
+
     def to_sio_temperatures(self):
         return {
             "t_ext_1": self.external_1,
@@ -175,6 +329,10 @@ class SensorData:
         return {"motor_thermistor": self.motor_thermistor}
 
 
+sensorDataFields = tuple(field.name for field in fields(SensorData))
+sensorDataGetter = attrgetter(*sensorDataFields)
+
+
 @dataclass
 class ESPInfo:
     """Class respresenting the current ESPs firmware and status"""
@@ -241,7 +399,7 @@ class ControlTypes:
     POWER = "Power"
 
 
-@dataclass
+@dataclass(slots=True)
 class ShotData:
     """Class respresenting a Datapoint of the machine in time, used to track a shot"""
 
@@ -264,8 +422,33 @@ class ShotData:
     aux_setpoint: float = -1
     is_aux_controller_active: bool = False
 
-    def clone_with_time_and_state(self, shot_start_time, is_brewing):
-        return replace(self, time=shot_start_time, is_extracting=is_brewing)
+    def with_time_and_state(self, shot_start_time, is_brewing):
+        """Sets the shot time and extraction state of this sample in place"""
+        self.time = shot_start_time
+        self.is_extracting = is_brewing
+        return self
+
+    def as_tuple(self):
+        return shotDataGetter(self)
+
+    def as_dict(self):
+        return {
+            "pressure": self.pressure,
+            "flow": self.flow,
+            "weight": self.weight,
+            "temperature": self.temperature,
+            "status": self.status,
+            "profile": self.profile,
+            "time": self.time,
+            "state": self.state,
+            "is_extracting": self.is_extracting,
+            "gravimetric_flow": self.gravimetric_flow,
+            "main_controller_kind": self.main_controller_kind,
+            "main_setpoint": self.main_setpoint,
+            "aux_controller_kind": self.aux_controller_kind,
+            "aux_setpoint": self.aux_setpoint,
+            "is_aux_controller_active": self.is_aux_controller_active,
+        }
 
     def from_args(args):
         try:
@@ -304,17 +487,6 @@ class ShotData:
                 logger.warning(f"Failed to parse ShotData: {args}", exc_info=e)
                 pass
 
-        state = MachineState.IDLE
-        if profile is not None:
-            if profile not in [
-                MachineStatus.IDLE,
-                MachineStatus.PURGE,
-                MachineStatus.HOME,
-            ]:
-                state = MachineState.BREWING
-            else:
-                state = profile.lower()
-
         try:
             data = ShotData(
                 safe_float_with_nan(args[0]),
@@ -323,7 +495,7 @@ class ShotData:
                 safe_float_with_nan(args[3]),
                 status,
                 profile,
-                state=state,
+                state=ShotData._state_for_profile(profile),
                 main_controller_kind=main_controller_kind,
                 main_setpoint=main_setpoint,
                 aux_controller_kind=aux_controller_kind,
@@ -337,18 +509,87 @@ class ShotData:
 
         return data
 
-    def to_sio(self):
-        setpoints = {
-            "active": None,
-        }
+    def from_binary(buffer, offset=0):
+        try:
+            (
+                pressure,
+                flow,
+                weight,
+                temperature,
+                main_controller_kind,
+                main_setpoint,
+                aux_controller_kind,
+                aux_setpoint,
+                is_aux_controller_active,
+                gravimetric_flow,
+                status_length,
+            ) = shotDataStruct.unpack_from(buffer, offset)
+            offset += shotDataStruct.size
+            status = str(buffer[offset : offset + status_length], "utf-8")
+            offset += status_length
+            profile_length = buffer[offset]
+            profile = str(buffer[offset + 1 : offset + 1 + profile_length], "utf-8")
 
-        if self.main_controller_kind is not None:
-            setpoints[self.main_controller_kind.lower()] = self.main_setpoint
-            setpoints["active"] = self.main_controller_kind.lower()
-        if self.aux_controller_kind is not None:
-            setpoints[self.aux_controller_kind.lower()] = self.aux_setpoint
-            if self.is_aux_controller_active:
-                setpoints["active"] = self.aux_controller_kind.lower()
+            data = ShotData(
+                from_fixed_point_with_nan(pressure),
+                from_fixed_point_with_nan(flow),
+                from_fixed_point_with_nan(weight),
+                from_fixed_point_with_nan(temperature),
+                status,
+                profile,
+                state=ShotData._state_for_profile(profile),
+                main_controller_kind=binaryControlTypes[main_controller_kind],
+                main_setpoint=from_fixed_point_float(main_setpoint),
+                aux_controller_kind=binaryControlTypes[aux_controller_kind],
+                aux_setpoint=from_fixed_point_float(aux_setpoint),
+                is_aux_controller_active=is_aux_controller_active,
+                gravimetric_flow=from_fixed_point_with_nan(gravimetric_flow),
+            )
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            logger.warning(
+                f"Failed to parse binary ShotData: {bytes(buffer).hex()}", exc_info=e
+            )
+            return None
+
+        return data
+
+    def to_binary(self):
+        status = (self.status or "").encode("utf-8")[:255]
+        profile = (self.profile or "").encode("utf-8")[:255]
+        header = shotDataStruct.pack(
+            to_fixed_point(self.pressure),
+            to_fixed_point(self.flow),
+            to_fixed_point(self.weight),
+            to_fixed_point(self.temperature),
+            binaryControlTypes.index(self.main_controller_kind),
+            to_fixed_point(self.main_setpoint),
+            binaryControlTypes.index(self.aux_controller_kind),
+            to_fixed_point(self.aux_setpoint),
+            self.is_aux_controller_active,
+            to_fixed_point(self.gravimetric_flow),
+            len(status),
+        )
+        return header + status + bytes((len(profile),)) + profile
+
+    def _state_for_profile(profile):
+        if profile is None:
+            return MachineState.IDLE
+        if profile not in [
+            MachineStatus.IDLE,
+            MachineStatus.PURGE,
+            MachineStatus.HOME,
+        ]:
+            return MachineState.BREWING
+        return profile.lower()
+
+    def to_sio(self):
+        setpoints = controller_setpoints(
+            self.main_controller_kind,
+            self.main_setpoint,
+            self.aux_controller_kind,
+            self.aux_setpoint,
+            self.is_aux_controller_active,
+        )
 
         # Create sensors dictionary with base data
         sensors = {
@@ -371,6 +612,26 @@ class ShotData:
         return data
 
 
+def controller_setpoints(main_kind, main_setpoint, aux_kind, aux_setpoint, aux_active):
+    """The "setpoints" dict sent over socket.io and stored with every shot sample"""
+    setpoints = {
+        "active": None,
+    }
+
+    if main_kind is not None:
+        setpoints[main_kind.lower()] = main_setpoint
+        setpoints["active"] = main_kind.lower()
+    if aux_kind is not None:
+        setpoints[aux_kind.lower()] = aux_setpoint
+        if aux_active:
+            setpoints["active"] = aux_kind.lower()
+    return setpoints
+
+
+shotDataFields = tuple(field.name for field in fields(ShotData))
+shotDataGetter = attrgetter(*shotDataFields)
+
+
 @unique
 class ButtonEventEnum(Enum):
     # Enum representing the events from the machine
@@ -0,0 +1,139 @@
+from enum import Enum, auto, unique
+
+from log import MeticulousLogger
+
+from .data import (
+    ButtonEventData,
+    ESPInfo,
+    HeaterTimeoutInfo,
+    MachineNotify,
+    SensorData,
+    ShotData,
+)
+from .framer import FRAME_HEADER_SIZE
+
+logger = MeticulousLogger.getLogger(__name__)
+
+
+@unique
+class MessageType(Enum):
+    BUTTON = auto()
+    DATA = auto()
+    SENSORS = auto()
+    ESP_INFO = auto()
+    NOTIFY = auto()
+    HEATER_TIMEOUT = auto()
+    PROFILE_HASH = auto()
+    PROFILE_LOADED = auto()
+    ESP_ERROR = auto()
+    UNKNOWN = auto()
+
+
+# FIXME: This should be replace in the firmware with an "Event," prefix for cleanliness
+BARE_BUTTON_EVENTS = ("CCW", "CW", "push", "pu_d", "elng", "ta_d", "ta_l", "strt")
+
+# Printed by the ESP with the MD5 of a received profile, before loading it
+PROFILE_HASH_PREFIX = "hash: "
+# Printed by the ESP after the profile of the hash line loaded
+PROFILE_LOADED_LINE = "JSON cargado"
+# Lines the ESP prints when something failed, such as "E (1234) tag: ..." logs
+ESP_ERROR_PREFIX = "E ("
+ESP_ERROR_MARKER = "error"
+
+
+# Type byte of the binary telemetry frames
+FRAME_TYPE_DATA = 0x01
+FRAME_TYPE_SENSORS = 0x02
+
+
+def _parse_event(rest, args):
+    return ButtonEventData.from_args(args)
+
+
+def _parse_data(rest, args):
+    return ShotData.from_args(args)
+
+
+def _parse_sensors(rest, args):
+    if len(args) == 1:
+        return SensorData.from_color_coded_args(rest)
+    return SensorData.from_args(args)
+
+
+def _parse_esp_info(rest, args):
+    return ESPInfo.from_args(args)
+
+
+def _parse_notify(rest, args):
+    notification_type, _, message = rest.partition(",")
+    return MachineNotify(notification_type, message.replace(";", "\n"))
+
+
+def _parse_heater_timeout(rest, args):
+    try:
+        return HeaterTimeoutInfo.from_args(args)
+    except Exception as e:
+        logger.error(f"Error processing HeaterTimeoutInfo: {e}", exc_info=True)
+        return None
+
+
+class MessageDispatcher:
+    """Routes each line from the ESP32 to the parser of its message type.
+
+    Only the first token is looked at to pick the parser from a dict, the
+    remainder of the line is split at most once and handed to the parser.
+    Binary telemetry frames are routed the same way by their type byte.
+    """
+
+    MESSAGE_PARSERS = {
+        "Event": (MessageType.BUTTON, _parse_event),
+        "Data": (MessageType.DATA, _parse_data),
+        "Sensors": (MessageType.SENSORS, _parse_sensors),
+        "ESPInfo": (MessageType.ESP_INFO, _parse_esp_info),
+        "Notify": (MessageType.NOTIFY, _parse_notify),
+        "HeaterTimeoutInfo": (MessageType.HEATER_TIMEOUT, _parse_heater_timeout),
+    }
+
+    FRAME_PARSERS = {
+        FRAME_TYPE_DATA: (MessageType.DATA, ShotData.from_binary),
+        FRAME_TYPE_SENSORS: (MessageType.SENSORS, SensorData.from_binary),
+    }
+
+    @staticmethod
+    def parse(line: str):
+        """Parses a single line (without line ending) into (MessageType, message)"""
+        prefix, separator, rest = line.partition(",")
+
+        if not separator:
+            if prefix in BARE_BUTTON_EVENTS:
+                return (MessageType.BUTTON, ButtonEventData.from_args([prefix]))
+            if prefix.startswith(PROFILE_HASH_PREFIX):
+                logger.info("%s", line)
+                profile_hash = prefix[len(PROFILE_HASH_PREFIX) :].strip()
+                return (MessageType.PROFILE_HASH, profile_hash)
+            if prefix == PROFILE_LOADED_LINE:
+                logger.info("%s", line)
+                return (MessageType.PROFILE_LOADED, None)
+
+        entry = MessageDispatcher.MESSAGE_PARSERS.get(prefix)
+        if entry is None:
+            logger.info("%s", line)
+            if line.startswith(ESP_ERROR_PREFIX) or ESP_ERROR_MARKER in line.lower():
+                return (MessageType.ESP_ERROR, None)
+            return (MessageType.UNKNOWN, None)
+
+        (message_type, parser) = entry
+        args = rest.split(",") if separator else []
+        return (message_type, parser(rest, args))
+
+    @staticmethod
+    def parse_frame(frame):
+        """Parses a complete binary frame as handed out by the SerialFramer"""
+        entry = MessageDispatcher.FRAME_PARSERS.get(frame[1])
+        if entry is None:
+            logger.info("Unknown binary frame: %s", bytes(frame).hex())
+            return (MessageType.UNKNOWN, None)
+
+        (message_type, parser) = entry
+        # Hand over the payload only, without header and checksum
+        return (message_type, parser(frame[FRAME_HEADER_SIZE:-1]))
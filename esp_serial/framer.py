@@ -0,0 +1,170 @@
+import os
+from typing import Optional
+
+# Binary telemetry frames are laid out as
+#   FRAME_START | type (u8) | payload length (u8) | payload | checksum (u8)
+# where the checksum is the sum of the type, length and payload bytes modulo 256.
+# Text lines never start with FRAME_START, so both can share the same stream
+FRAME_START = 0x02
+FRAME_HEADER_SIZE = 3
+FRAME_MAX_PAYLOAD = 255
+
+
+def frame_checksum(data) -> int:
+    return sum(data) & 0xFF
+
+
+def encode_frame(frame_type: int, payload: bytes) -> bytes:
+    """Wraps `payload` into a binary frame, as the firmware does"""
+    if len(payload) > FRAME_MAX_PAYLOAD:
+        raise ValueError(f"Frame payload too long: {len(payload)} bytes")
+    header = bytes((FRAME_START, frame_type, len(payload)))
+    return header + payload + bytes((frame_checksum(header[1:] + payload),))
+
+
+class SerialFramer:
+    """Splits the ESP32 serial stream into lines without reallocating per line.
+
+    Bytes are read straight into a preallocated buffer which is used as a
+    ring: lines are consumed from the front while new data is appended at
+    the back. Once the back is reached the (usually tiny) unfinished tail is
+    moved to the front, so every line stays contiguous and can be handed out
+    as a memoryview slice of the buffer.
+
+    Binary telemetry frames (see encode_frame()) are recognized by their
+    FRAME_START byte and handed out whole, without a newline. Frames with a bad
+    checksum are counted and skipped over byte by byte until the stream is back
+    in sync.
+
+    Machine registers the serial port on the IOLoop, its _on_readable handler
+    calls read_fd() once the port is readable and then handles every line
+    yielded by lines().
+
+    The slices returned by lines() are only valid until the next call to
+    writable() / read_fd(), consumers have to decode or copy them first.
+    """
+
+    # The ESP echoes loaded profiles as a single line, those can be >10kB
+    DEFAULT_SIZE = 64 * 1024
+
+    def __init__(self, size: int = DEFAULT_SIZE) -> None:
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        # First byte which has not been handed out as part of a line yet
+        self._start = 0
+        # One past the last byte received
+        self._end = 0
+        # Everything in [_start, _scan) is known to not contain a newline
+        self._scan = 0
+        self.corrupt_frames = 0
+
+    def pending(self) -> int:
+        return self._end - self._start
+
+    def writable(self) -> memoryview:
+        """Returns the free space at the back of the buffer to read into"""
+        if self._start == self._end:
+            # Everything got consumed, rewind for free
+            self._start = self._end = self._scan = 0
+        elif self._end == len(self._buf) and self._start > 0:
+            self._compact()
+        return self._view[self._end :]
+
+    def commit(self, count) -> int:
+        """Marks `count` bytes of the last writable() view as received"""
+        if count:
+            self._end += count
+            return count
+        return 0
+
+    def read_from(self, port) -> int:
+        """Reads whatever the (py)serial port has available into the buffer.
+
+        Reads at least one byte, so this blocks until data arrives or the
+        ports timeout is hit. Only used by tests and benchmarks, Machine reads
+        through read_fd() on the IOLoop.
+        """
+        target = self.writable()
+        size = max(1, min(len(target), port.in_waiting))
+        return self.commit(port.readinto(target[:size]))
+
+    def read_fd(self, fd) -> Optional[int]:
+        """Reads whatever a readable, non-blocking file descriptor has available.
+
+        Returns None once the other end is gone (EOF), as the fd then keeps
+        polling readable without ever delivering data.
+        """
+        target = self.writable()
+        if len(target) == 0:
+            return 0
+        try:
+            count = os.readv(fd, [target])
+        except BlockingIOError:
+            return 0
+        if count == 0:
+            return None
+        return self.commit(count)
+
+    def feed(self, data) -> None:
+        """Copies `data` into the buffer, used by tests and benchmarks"""
+        data = memoryview(data)
+        while len(data) > 0:
+            target = self.writable()
+            if len(target) == 0:
+                return
+            count = min(len(target), len(data))
+            target[:count] = data[:count]
+            self.commit(count)
+            data = data[count:]
+
+    def lines(self):
+        """Yields every complete line (including the newline) or frame received so far"""
+        buf = self._buf
+        while True:
+            if self._start < self._end and buf[self._start] == FRAME_START:
+                size = self._frame_size()
+                if size is None:
+                    # Wait for the rest of the frame
+                    return
+                if size > 0:
+                    frame = self._view[self._start : self._start + size]
+                    self._start = self._scan = self._start + size
+                    yield frame
+                    continue
+                self.corrupt_frames += 1
+                self._start += 1
+                self._scan = max(self._scan, self._start)
+                continue
+
+            newline = buf.find(b"\n", self._scan, self._end)
+            if newline < 0:
+                self._scan = self._end
+                if self._start == 0 and self._end == len(buf):
+                    # The buffer is full without a single newline. Hand out what we
+                    # have instead of stalling the stream forever
+                    self._start = self._scan = self._end
+                    yield self._view[: self._end]
+                return
+            line = self._view[self._start : newline + 1]
+            self._start = self._scan = newline + 1
+            yield line
+
+    def _frame_size(self):
+        """Size of the frame at _start, None if incomplete or 0 if it is corrupt"""
+        available = self._end - self._start
+        if available < FRAME_HEADER_SIZE:
+            return None
+        size = FRAME_HEADER_SIZE + self._buf[self._start + 2] + 1
+        if available < size:
+            return None
+        checksum = frame_checksum(self._view[self._start + 1 : self._start + size - 1])
+        if checksum != self._buf[self._start + size - 1]:
+            return 0
+        return size
+
+    def _compact(self) -> None:
+        pending = self._end - self._start
+        self._view[:pending] = self._view[self._start : self._end]
+        self._scan -= self._start
+        self._start = 0
+        self._end = pending
@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import deque
+
+from log import MeticulousLogger
+from named_thread import NamedThread
+
+logger = MeticulousLogger.getLogger(__name__)
+
+
+class SerialWriter:
+    """Owns all writes to the ESP32 serial port.
+
+    Writes are queued from any thread and sent in order by a single writer
+    thread. Whatever piled up while the previous write was in flight (small
+    commands, usually) is joined and sent as one write, up to MAX_BATCH
+    bytes. Larger buffers like profiles are always sent in one piece.
+    """
+
+    MAX_BATCH = 4096
+    RATE_WINDOW = 1.0
+
+    def __init__(self, port) -> None:
+        self._port = port
+        self._queue = deque()
+        self._queued_bytes = 0
+        self._wakeup = threading.Condition()
+        self._in_flight = 0
+
+        self.bytes_written = 0
+        self.writes = 0
+        self.messages = 0
+        # (timestamp, bytes) of the writes in the last RATE_WINDOW seconds
+        self._recent = deque()
+
+        self._thread = NamedThread("SerialWriter", target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, data: bytes, on_written=None) -> None:
+        """Queues `data`, on_written(seconds) is called once it was sent"""
+        with self._wakeup:
+            self._queue.append((bytes(data), on_written))
+            self._queued_bytes += len(data)
+            # flush() waits on the same condition
+            self._wakeup.notify_all()
+
+    def flush(self, timeout=None) -> bool:
+        """Waits until everything queued so far has been written"""
+        with self._wakeup:
+            return self._wakeup.wait_for(
+                lambda: len(self._queue) == 0 and self._in_flight == 0, timeout
+            )
+
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def bytes_per_second(self) -> float:
+        now = time.monotonic()
+        # Copied first as the writer thread keeps appending
+        recent = list(self._recent)
+        return (
+            sum(
+                size
+                for (timestamp, size) in recent
+                if now - timestamp <= SerialWriter.RATE_WINDOW
+            )
+            / SerialWriter.RATE_WINDOW
+        )
+
+    def stats(self):
+        return {
+            "queue_depth": self.depth(),
+            "queued_bytes": self._queued_bytes,
+            "bytes_per_second": self.bytes_per_second(),
+            "bytes_written": self.bytes_written,
+            "writes": self.writes,
+            "messages": self.messages,
+        }
+
+    def _next_batch(self):
+        batch = [self._queue.popleft()]
+        size = len(batch[0][0])
+        while self._queue and size + len(self._queue[0][0]) <= SerialWriter.MAX_BATCH:
+            batch.append(self._queue.popleft())
+            size += len(batch[-1][0])
+        self._queued_bytes -= size
+        self._in_flight = len(batch)
+        return batch
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                self._wakeup.wait_for(lambda: len(self._queue) > 0)
+                batch = self._next_batch()
+
+            data = b"".join(item for (item, _callback) in batch)
+            start = time.monotonic()
+            try:
+                self._port.write(data)
+            except Exception as e:
+                logger.error(f"Writing {len(data)} bytes to the ESP32 failed: {e}")
+            end = time.monotonic()
+
+            self.bytes_written += len(data)
+            self.writes += 1
+            self.messages += len(batch)
+            self._recent.append((end, len(data)))
+            while self._recent and end - self._recent[0][0] > SerialWriter.RATE_WINDOW:
+                self._recent.popleft()
+
+            for _item, callback in batch:
+                if callback is not None:
+                    try:
+                        callback(end - start)
+                    except Exception as e:
+                        logger.error("Serial write callback failed", exc_info=e)
+
+            with self._wakeup:
+                self._in_flight = 0
+                self._wakeup.notify_all()
@@ -0,0 +1,203 @@
+import threading
+import time
+from enum import IntEnum, unique
+
+from log import MeticulousLogger
+from named_thread import NamedThread
+from telemetry_bus import LatencyCounter
+
+logger = MeticulousLogger.getLogger(__name__)
+
+
+@unique
+class WritePriority(IntEnum):
+    # Lower values run first, jobs of the same priority in submission order
+    SHOT = 0
+    DEBUG = 1
+    MAINTENANCE = 2
+
+
+class WriteJob:
+    def __init__(self, name, function, args, priority, retries, required) -> None:
+        self.name = name
+        self.function = function
+        self.args = args
+        self.priority = priority
+        self.retries = retries
+        self.required = required
+        self.attempt = 0
+        self.seq = 0
+        self.ready_at = 0.0
+        self.submitted_at = time.monotonic()
+
+    def order(self):
+        return (self.priority, self.seq)
+
+
+class HistoryWriter:
+    """The one thread compressing and writing the shot history.
+
+    Jobs are queued with a priority and run one after the other, so back to
+    back shots never compress concurrently. A failing job is retried up to
+    its number of retries after RETRY_DELAY seconds, without holding up the
+    jobs behind it. The queue holds at most MAX_JOBS, when it is full a new
+    job replaces the newest queued job of a lower priority or is dropped.
+    Required jobs are neither dropped nor replaced, they are queued even
+    beyond MAX_JOBS.
+    zstd releases the GIL while compressing, so a thread is enough to keep
+    the work away from the IOLoop.
+    """
+
+    MAX_JOBS = 64
+    RETRY_DELAY = 1.0
+
+    _jobs = []
+    _wakeup = threading.Condition()
+    _thread = None
+    _running = None
+    _seq = 0
+
+    _durations = {}
+    _waits = {}
+    _max_queue_length = 0
+    _completed = 0
+    _failed = 0
+    _retried = 0
+    _dropped = 0
+
+    @staticmethod
+    def submit(
+        name, function, *args, priority=WritePriority.SHOT, retries=0, required=False
+    ) -> bool:
+        """Queues function(*args), returns False if the job was dropped"""
+        job = WriteJob(name, function, args, priority, retries, required)
+        with HistoryWriter._wakeup:
+            if HistoryWriter._thread is None:
+                HistoryWriter._thread = NamedThread(
+                    "HistoryWriter", target=HistoryWriter._run, daemon=True
+                )
+                HistoryWriter._thread.start()
+
+            if len(HistoryWriter._jobs) >= HistoryWriter.MAX_JOBS:
+                victims = [job for job in HistoryWriter._jobs if not job.required]
+                victim = max(victims, key=WriteJob.order) if victims else None
+                if victim is not None and victim.priority > priority:
+                    HistoryWriter._jobs.remove(victim)
+                    HistoryWriter._dropped += 1
+                    logger.error(
+                        f"History writer queue is full, dropping {victim.name} for {name}"
+                    )
+                elif required:
+                    logger.warning(
+                        f"History writer queue is full, queueing required {name} anyway"
+                    )
+                else:
+                    HistoryWriter._dropped += 1
+                    logger.error(f"History writer queue is full, dropping {name}")
+                    return False
+
+            HistoryWriter._queue(job)
+            HistoryWriter._max_queue_length = max(
+                HistoryWriter._max_queue_length, len(HistoryWriter._jobs)
+            )
+        return True
+
+    @staticmethod
+    def _queue(job) -> None:
+        job.seq = HistoryWriter._seq
+        HistoryWriter._seq += 1
+        HistoryWriter._jobs.append(job)
+        # flush() waits on the same condition
+        HistoryWriter._wakeup.notify_all()
+
+    @staticmethod
+    def flush(timeout=None) -> bool:
+        """Waits until every queued job ran, including its retries"""
+        with HistoryWriter._wakeup:
+            return HistoryWriter._wakeup.wait_for(
+                lambda: not HistoryWriter._jobs and HistoryWriter._running is None,
+                timeout,
+            )
+
+    @staticmethod
+    def queue_length() -> int:
+        return len(HistoryWriter._jobs)
+
+    @staticmethod
+    def stats():
+        running = HistoryWriter._running
+        return {
+            "queue_length": HistoryWriter.queue_length(),
+            "max_queue_length": HistoryWriter._max_queue_length,
+            "running": running.name if running is not None else None,
+            "completed": HistoryWriter._completed,
+            "failed": HistoryWriter._failed,
+            "retried": HistoryWriter._retried,
+            "dropped": HistoryWriter._dropped,
+            "duration": {
+                name: counter.stats()
+                for name, counter in HistoryWriter._durations.items()
+            },
+            "wait": {
+                name: counter.stats() for name, counter in HistoryWriter._waits.items()
+            },
+        }
+
+    @staticmethod
+    def _counter(counters, name) -> LatencyCounter:
+        if name not in counters:
+            counters[name] = LatencyCounter()
+        return counters[name]
+
+    @staticmethod
+    def _next_job():
+        """Takes the next job which is ready, waits if there is none"""
+        while True:
+            now = time.monotonic()
+            ready = [job for job in HistoryWriter._jobs if job.ready_at <= now]
+            if ready:
+                job = min(ready, key=WriteJob.order)
+                HistoryWriter._jobs.remove(job)
+                return job
+            if HistoryWriter._jobs:
+                earliest = min(job.ready_at for job in HistoryWriter._jobs)
+                HistoryWriter._wakeup.wait(earliest - now)
+            else:
+                HistoryWriter._wakeup.wait()
+
+    @staticmethod
+    def _run() -> None:
+        while True:
+            with HistoryWriter._wakeup:
+                job = HistoryWriter._next_job()
+                HistoryWriter._running = job
+
+            start = time.monotonic()
+            HistoryWriter._counter(HistoryWriter._waits, job.name).record(
+                start - job.submitted_at
+            )
+            failed = False
+            try:
+                job.function(*job.args)
+            except Exception as e:
+                failed = True
+                logger.error(
+                    f"History job {job.name} failed (attempt {job.attempt + 1})",
+                    exc_info=e,
+                )
+            HistoryWriter._counter(HistoryWriter._durations, job.name).record(
+                time.monotonic() - start
+            )
+
+            with HistoryWriter._wakeup:
+                HistoryWriter._running = None
+                if not failed:
+                    HistoryWriter._completed += 1
+                elif job.attempt < job.retries:
+                    job.attempt += 1
+                    job.ready_at = time.monotonic() + HistoryWriter.RETRY_DELAY
+                    HistoryWriter._retried += 1
+                    HistoryWriter._queue(job)
+                else:
+                    HistoryWriter._failed += 1
+                HistoryWriter._wakeup.notify_all()
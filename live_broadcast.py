@@ -0,0 +1,166 @@
+import os
+
+import orjson
+import socketio
+from socketio import packet
+
+from log import MeticulousLogger
+from telemetry_bus import TelemetryBus
+
+logger = MeticulousLogger.getLogger(__name__)
+
+# A client with more than this many bytes not yet written to its websocket (or
+# packets waiting for its long-poll) is considered congested
+LIVE_MAX_PENDING_BYTES = int(os.getenv("LIVE_MAX_PENDING_BYTES", "16384"))
+LIVE_MAX_QUEUED_PACKETS = int(os.getenv("LIVE_MAX_QUEUED_PACKETS", "8"))
+
+
+class OrjsonSerializer:
+    """Stand-in for the json module, python-socketio encodes every packet with it"""
+
+    @staticmethod
+    def dumps(obj, *args, **kwargs) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    @staticmethod
+    def loads(data, *args, **kwargs):
+        return orjson.loads(data)
+
+
+class ClientBackpressure:
+    """Keeps track of how far behind each socket.io client is.
+
+    Tornado buffers everything written to a websocket without limit, so a
+    client on a bad connection would pile up stale telemetry. The websocket
+    handlers count the bytes they wrote but tornado did not flush yet, long
+    polling clients are judged by the engine.io queue. Live telemetry to a
+    congested client is dropped, the next tick brings fresher values anyway.
+    Everything not sent through broadcast() is never dropped.
+    """
+
+    _sio = None
+    # engine.io sid -> websocket handler
+    _handlers = {}
+    # socket.io sid -> number of frames dropped
+    drops = {}
+
+    def init(sio):
+        ClientBackpressure._sio = sio
+
+    def register(eio_sid, handler):
+        ClientBackpressure._handlers[eio_sid] = handler
+
+    def unregister(handler):
+        for eio_sid, registered in list(ClientBackpressure._handlers.items()):
+            if registered is handler:
+                del ClientBackpressure._handlers[eio_sid]
+
+    def on_connect(sid, environ):
+        """Websocket only clients connect through their websocket handler"""
+        handler = environ.get("tornado.handler")
+        if getattr(handler, "ws_connection", None) is not None:
+            eio_sid = ClientBackpressure._sio.manager.eio_sid_from_sid(sid, "/")
+            ClientBackpressure.register(eio_sid, handler)
+        ClientBackpressure.drops[sid] = 0
+
+    def on_disconnect(sid):
+        ClientBackpressure.drops.pop(sid, None)
+
+    def pending_bytes(eio_sid) -> int:
+        handler = ClientBackpressure._handlers.get(eio_sid)
+        return handler.pending_bytes if handler is not None else 0
+
+    def queued_packets(eio_sid) -> int:
+        if ClientBackpressure._sio is None:
+            return 0
+        socket = ClientBackpressure._sio.eio.sockets.get(eio_sid)
+        return socket.queue.qsize() if socket is not None else 0
+
+    def congested(eio_sid) -> bool:
+        return (
+            ClientBackpressure.pending_bytes(eio_sid) > LIVE_MAX_PENDING_BYTES
+            or ClientBackpressure.queued_packets(eio_sid) > LIVE_MAX_QUEUED_PACKETS
+        )
+
+    def count_drop(sid) -> None:
+        ClientBackpressure.drops[sid] = ClientBackpressure.drops.get(sid, 0) + 1
+        TelemetryBus.count("live_frames_dropped")
+
+    def stats():
+        if ClientBackpressure._sio is None:
+            return {}
+        clients = {}
+        for sid, dropped in ClientBackpressure.drops.items():
+            eio_sid = ClientBackpressure._sio.manager.eio_sid_from_sid(sid, "/")
+            clients[sid] = {
+                "dropped": dropped,
+                "pending_bytes": ClientBackpressure.pending_bytes(eio_sid),
+                "queued_packets": ClientBackpressure.queued_packets(eio_sid),
+            }
+        return clients
+
+
+def get_tornado_handler(sio):
+    """socketio.get_tornado_handler() which tracks the unflushed websocket bytes"""
+    ClientBackpressure.init(sio)
+
+    class BackpressureHandler(socketio.get_tornado_handler(sio)):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.pending_bytes = 0
+
+        async def open(self, *args, **kwargs):
+            # Clients upgrading from long polling name their session
+            eio_sid = self.get_query_argument("sid", None)
+            if eio_sid is not None:
+                ClientBackpressure.register(eio_sid, self)
+            await super().open(*args, **kwargs)
+
+        def on_close(self):
+            ClientBackpressure.unregister(self)
+            super().on_close()
+
+        def write_message(self, message, binary=False):
+            size = len(message)
+            future = super().write_message(message, binary)
+            self.pending_bytes += size
+            future.add_done_callback(lambda _future: self._flushed(size))
+            return future
+
+        def _flushed(self, size):
+            self.pending_bytes -= size
+
+    return BackpressureHandler
+
+
+async def broadcast(sio, event, data, room, namespace="/"):
+    """Emits live telemetry to everybody in `room`, encoding it only once.
+
+    python-socketio (before 5.9) encodes a broadcast again for every
+    recipient, live() hands the same encoded packet to all of them instead.
+    Clients which are still busy with earlier frames are skipped.
+    Returns the socket.io sids the frame was dropped for.
+    """
+    recipients = list(sio.manager.get_participants(namespace, room))
+    if not recipients:
+        return []
+
+    encoded = sio.packet_class(
+        packet.EVENT, namespace=namespace, data=[event, data]
+    ).encode()
+    # Binary payloads are split into the packet and its attachments
+    if not isinstance(encoded, list):
+        encoded = [encoded]
+
+    dropped = []
+    for sid, eio_sid in recipients:
+        if ClientBackpressure.congested(eio_sid):
+            ClientBackpressure.count_drop(sid)
+            dropped.append(sid)
+            continue
+        for part in encoded:
+            await sio.eio.send(eio_sid, part)
+
+    TelemetryBus.count("broadcast_encodes")
+    TelemetryBus.count("broadcast_sends", len(recipients) - len(dropped))
+    return dropped
@@ -0,0 +1,226 @@
+import asyncio
+import os
+import time
+import urllib.parse
+
+from esp_serial.data import SensorData
+from live_broadcast import ClientBackpressure, broadcast
+from log import MeticulousLogger
+from status_delta import StatusDeltaEncoder
+from telemetry_bus import TelemetryBus
+
+logger = MeticulousLogger.getLogger(__name__)
+
+# Every client is in exactly one of the live rooms, depending on what it
+# asked for on connect with its auth dict (or query string):
+#   {"telemetry": true}: one packed "telemetry" event per tick instead of the
+#       legacy "status", "sensors", "comunication", "actuators" and
+#       "accessories" events. Always on without LEGACY_TELEMETRY_EVENTS
+#   {"status_delta": true}: the status as "status_delta" frames
+LEGACY_TELEMETRY_EVENTS = os.getenv("LEGACY_TELEMETRY_EVENTS", "True").lower() in (
+    "true",
+    "1",
+    "y",
+)
+LIVE_ROOMS = ("status", "status_delta", "telemetry", "telemetry_delta")
+
+# The debug channels are only built for clients which subscribed to them with
+# a "subscribe" event. Clients on the legacy events start out subscribed to
+# all of them and receive each channel as its own event, sent to the room of
+# the same name.
+CHANNELS = {
+    "sensors": SensorData.to_sio_temperatures,
+    "comunication": SensorData.to_sio_communication,
+    "actuators": SensorData.to_sio_actuators,
+    "accessories": SensorData.to_sio_accessory_data,
+}
+
+
+def client_opted_in(environ, auth, option):
+    if isinstance(auth, dict) and auth.get(option):
+        return True
+    query = urllib.parse.parse_qs(environ.get("QUERY_STRING", ""))
+    return query.get(option, ["false"])[0].lower() in ("true", "1", "y")
+
+
+class LiveRateLimiter:
+    """Decides when live() sends the next tick.
+
+    A tick goes out as soon as new telemetry arrives, but at most `max_rate`
+    times per second: everything arriving until the rate limit allows the next
+    tick is coalesced into it. Without new telemetry live() still wakes up
+    every `heartbeat` seconds, so an idle machine is reported as well.
+    """
+
+    def __init__(self, max_rate, heartbeat, clock=time.monotonic) -> None:
+        self.min_interval = 1.0 / max_rate
+        self.heartbeat = heartbeat
+        self.clock = clock
+        self.last_emit = float("-inf")
+        self._new_telemetry = asyncio.Event()
+
+    def notify(self) -> None:
+        """Called for every new telemetry message, wakes up wait()"""
+        self._new_telemetry.set()
+
+    def emitted(self) -> None:
+        self.last_emit = self.clock()
+
+    def delay(self) -> float:
+        """Seconds until the rate limit allows the next tick"""
+        return max(0.0, self.last_emit + self.min_interval - self.clock())
+
+    def heartbeat_due(self) -> bool:
+        return self.clock() - self.last_emit >= self.heartbeat
+
+    async def wait(self) -> bool:
+        """Waits for the next tick, returns whether it is due as a heartbeat"""
+        timeout = self.last_emit + self.heartbeat - self.clock()
+        if timeout > 0:
+            try:
+                await asyncio.wait_for(self._new_telemetry.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        delay = self.delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._new_telemetry.clear()
+        return self.heartbeat_due()
+
+
+class LiveRooms:
+    """The live rooms and debug channel subscriptions of the socket.io clients"""
+
+    def __init__(self, sio, legacy_events=LEGACY_TELEMETRY_EVENTS) -> None:
+        self.sio = sio
+        self.legacy_events = legacy_events
+        self.members = {room: set() for room in LIVE_ROOMS}
+        self.channel_members = {channel: set() for channel in CHANNELS}
+        self.status_delta_encoder = StatusDeltaEncoder()
+        # Delta clients which had frames dropped and wait for the next keyframe
+        self.status_delta_resync = set()
+
+    def legacy_clients(self):
+        return self.members["status"] | self.members["status_delta"]
+
+    def packed_clients(self):
+        return self.members["telemetry"] | self.members["telemetry_delta"]
+
+    def room_for(self, environ, auth):
+        packed = not self.legacy_events or client_opted_in(environ, auth, "telemetry")
+        room = "telemetry" if packed else "status"
+        if client_opted_in(environ, auth, "status_delta"):
+            room += "_delta"
+        return room
+
+    async def connect(self, sid, environ, auth=None):
+        room = self.room_for(environ, auth)
+        self.members[room].add(sid)
+        await self.sio.enter_room(sid, room)
+        if room.endswith("_delta"):
+            # The new client needs the complete status to apply deltas onto
+            self.status_delta_encoder.request_keyframe()
+        if room.startswith("status"):
+            await self.subscribe(sid, list(CHANNELS))
+
+    def disconnect(self, sid):
+        for members in self.members.values():
+            members.discard(sid)
+        for members in self.channel_members.values():
+            members.discard(sid)
+        self.status_delta_resync.discard(sid)
+
+    async def subscribe(self, sid, data):
+        legacy = sid in self.legacy_clients()
+        for channel in requested_channels(data):
+            self.channel_members[channel].add(sid)
+            if legacy:
+                await self.sio.enter_room(sid, channel)
+
+    async def unsubscribe(self, sid, data):
+        for channel in requested_channels(data):
+            self.channel_members[channel].discard(sid)
+            await self.sio.leave_room(sid, channel)
+
+    def build_channels(self, sensor_sensors):
+        """Builds the debug channels somebody subscribed to.
+
+        Returns the channels for the legacy events and the channels for the
+        packed telemetry event, which carries every channel any of its clients
+        subscribed to.
+        """
+        legacy = self.legacy_clients()
+        packed = self.packed_clients()
+        legacy_channels = {}
+        packed_channels = {}
+        skipped_encodes = 0
+        for channel, to_sio in CHANNELS.items():
+            subscribers = self.channel_members[channel]
+            legacy_subscribers = len(subscribers & legacy)
+            packed_subscribed = not subscribers.isdisjoint(packed)
+
+            skipped_encodes += len(legacy) - legacy_subscribers
+            if not packed_subscribed:
+                skipped_encodes += len(packed)
+            if legacy_subscribers == 0 and not packed_subscribed:
+                TelemetryBus.count("skipped_channel_builds")
+                continue
+
+            data = to_sio(sensor_sensors)
+            if legacy_subscribers > 0:
+                legacy_channels[channel] = data
+            if packed_subscribed:
+                packed_channels[channel] = data
+        TelemetryBus.count("skipped_channel_encodes", skipped_encodes)
+        return legacy_channels, packed_channels
+
+    async def emit(self, machine_status, legacy_channels, packed_channels):
+        """Sends one tick of telemetry to every live room with clients in it"""
+        sio = self.sio
+        members = self.members
+        frame = None
+        delta_clients = members["status_delta"] | members["telemetry_delta"]
+        if delta_clients:
+            # Resynchronize clients which missed a frame as soon as they catch up
+            for sid in self.status_delta_resync & delta_clients:
+                if not ClientBackpressure.congested(
+                    sio.manager.eio_sid_from_sid(sid, "/")
+                ):
+                    self.status_delta_encoder.request_keyframe()
+                    break
+            frame = self.status_delta_encoder.encode(machine_status)
+
+        dropped = []
+        if members["status"]:
+            await broadcast(sio, "status", machine_status, "status")
+        if members["status_delta"] and frame is not None:
+            dropped += await broadcast(sio, "status_delta", frame, "status_delta")
+        for channel, data in legacy_channels.items():
+            await broadcast(sio, channel, data, channel)
+
+        if members["telemetry"]:
+            await broadcast(
+                sio,
+                "telemetry",
+                {"status": machine_status, **packed_channels},
+                "telemetry",
+            )
+        if members["telemetry_delta"] and (frame is not None or packed_channels):
+            packed = {**packed_channels}
+            if frame is not None:
+                packed["status_delta"] = frame
+            dropped += await broadcast(sio, "telemetry", packed, "telemetry_delta")
+
+        if frame is not None:
+            if frame["keyframe"]:
+                self.status_delta_resync.clear()
+            self.status_delta_resync.update(dropped)
+
+
+def requested_channels(data):
+    channels = [data] if isinstance(data, str) else list(data or [])
+    unknown = [channel for channel in channels if channel not in CHANNELS]
+    if unknown:
+        logger.warning(f"Unknown telemetry channels {unknown}")
+    return [channel for channel in channels if channel in CHANNELS]
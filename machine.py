@@ -1,11 +1,11 @@
 import asyncio
 import hashlib
-import json
 import os
 from named_thread import NamedThread
 import time
 from enum import Enum
 
+import tornado.ioloop
 from packaging import version
 
 from config import (
@@ -22,30 +22,54 @@ from config import (
     MeticulousConfig,
 )
 from esp_serial.connection.emulator_serial_connection import EmulatorSerialConnection
+from esp_serial.connection.serial_connection import SerialConnection
 from esp_serial.connection.fika_serial_connection import FikaSerialConnection
 from esp_serial.connection.usb_serial_connection import USBSerialConnection
 from esp_serial.data import (
-    ButtonEventData,
     ButtonEventEnum,
-    ESPInfo,
     MachineStatus,
     SensorData,
     ShotData,
-    MachineNotify,
     HeaterTimeoutInfo,
 )
+from esp_serial.dispatcher import MessageDispatcher, MessageType
 from esp_serial.esp_tool_wrapper import ESPToolWrapper
+from esp_serial.framer import FRAME_START, SerialFramer
+from esp_serial.writer import SerialWriter
 from log import MeticulousLogger
 from notifications import Notification, NotificationManager, NotificationResponse
+from profile_converter.compact_encoding import (
+    COMPACT_ENCODING_VERSION,
+    dumps_minified,
+    encode_compact,
+)
 from shot_debug_manager import ShotDebugManager
 from shot_manager import ShotManager
 from sounds import SoundPlayer, Sounds
+from telemetry_bus import MachineEvent, TelemetryBus
 
 logger = MeticulousLogger.getLogger(__name__)
 
 # can be from [FIKA, USB, EMULATOR / EMULATION]
 BACKEND = os.getenv("BACKEND", "FIKA").upper()
 
+# Ask the ESP to send Data and Sensors messages as binary frames. Firmware which
+# does not know the action keeps sending text, which is always understood
+BINARY_TELEMETRY = os.getenv("BINARY_TELEMETRY", "False").lower() in (
+    "true",
+    "1",
+    "y",
+)
+
+# Send profiles as "json_compact" uploads instead of plain (minified) JSON. The
+# ESP does not report whether it decodes them and no firmware release is known
+# to ship the decoder for COMPACT_ENCODING_VERSION, so this is opt-in
+COMPACT_PROFILES = os.getenv("COMPACT_PROFILES", "False").lower() in (
+    "true",
+    "1",
+    "y",
+)
+
 
 class esp_nvs_keys(Enum):
     color = "color_key"
@@ -69,7 +93,9 @@ class Machine:
     ]
 
     _connection = None
-    _thread = None
+    _loop = None
+    _framer = None
+    _writer = None
     _stopESPcomm = False
     _sio = None
     _espNotification = Notification("", [NotificationResponse.OK])
@@ -78,6 +104,16 @@ class Machine:
 
     infoReady = False
     profileReady = False
+    binaryTelemetry = False
+
+    # MD5 of the profile the ESP confirmed loading, uploading it again is skipped
+    acknowledgedProfileHash = None
+    _pendingProfileHash = None
+    # The ESP printed the hash of the pending profile and is loading it
+    _hashedProfile = False
+    profileUploadsSent = 0
+    profileUploadsSkipped = 0
+    profileUploadSavedBytes = 0
 
     data_sensors: ShotData = ShotData(
         state=MachineStatus.IDLE, status=MachineStatus.IDLE, profile=MachineStatus.IDLE
@@ -93,6 +129,16 @@ class Machine:
 
     is_idle = True
 
+    # State carried from one ESP message to the next
+    _old_status = MachineStatus.IDLE
+    _time_flag = False
+    _info_requested = False
+    _time_passed = 0
+    _emulated_firmware = False
+    _previous_preheat_remaining = None
+    # time.monotonic() of the last read from the ESP, for latency measurements
+    lastReadTime = 0.0
+
     @staticmethod
     def generate_random_serial():
         """
@@ -140,15 +186,10 @@ class Machine:
             case "FIKA" | _:
                 Machine._connection = FikaSerialConnection("/dev/ttymxc0")
 
+        Machine._writer = SerialWriter(Machine._connection.port)
         Machine.writeStr("\x03")
         Machine.action("info")
-
-        def startLoop():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-            loop.run_until_complete(Machine._read_data())
-            loop.close()
+        Machine.request_binary_telemetry()
 
         def flashingEsp():
             time.sleep(60)
@@ -158,346 +199,363 @@ class Machine:
             loop.run_until_complete(Machine.check_machine_alive())
             loop.close()
 
-        Machine._thread = NamedThread("MachineSerial", target=startLoop)
+        # The serial port is read from the IOLoop socket.io runs on
+        Machine._loop = tornado.ioloop.IOLoop.current()
+
+        # Everything parsed is published on the TelemetryBus, the consumers run
+        # from there instead of holding up the serial ingest
+        TelemetryBus.subscribe(
+            "Machine",
+            Machine._on_telemetry,
+            kinds=(MessageType.BUTTON, MessageType.HEATER_TIMEOUT, MessageType.NOTIFY),
+        )
+        TelemetryBus.subscribe(
+            "ShotManager", ShotManager.on_telemetry, kinds=ShotManager.TELEMETRY
+        )
+        TelemetryBus.subscribe(
+            "ShotDebugManager",
+            ShotDebugManager.on_telemetry,
+            kinds=ShotDebugManager.TELEMETRY,
+        )
+        TelemetryBus.subscribe(
+            "SoundPlayer", SoundPlayer.on_telemetry, kinds=MachineEvent
+        )
+
+        Machine._start_reading()
+
         Machine._flashingThread = NamedThread("FlashingEsp", target=flashingEsp)
-        Machine._thread.start()
         Machine._flashingThread.start()
 
-    class ReadLine:
-        def __init__(self, s):
-            self.buf = bytearray()
-            self.s = s
-
-        def readline(self):
-            i = self.buf.find(b"\n")
-            if i >= 0:
-                r = self.buf[: i + 1]
-                self.buf = self.buf[i + 1 :]
-                return r
-            while not Machine._stopESPcomm:
-                i = max(1, min(2048, self.s.in_waiting))
-                data = self.s.read(i)
-                i = data.find(b"\n")
-                if i >= 0:
-                    r = self.buf + data[: i + 1]
-                    self.buf[0:] = data[i + 1 :]
-                    return r
-                else:
-                    self.buf.extend(data)
-            return self.buf
-
-    async def _read_data():  # noqa: C901
+    def _start_reading():
         Machine.shot_start_time = time.time()
         Machine._connection.port.reset_input_buffer()
-        Machine._connection.port.write(b"32\n")
-        uart = Machine.ReadLine(Machine._connection.port)
-
-        old_status = MachineStatus.IDLE
-        old_ready = False
-        time_flag = False
-        info_requested = False
-        time_passed = 0
-        emulated_firmware = False
-        previous_preheat_remaining = None
+        Machine._writer.write(b"32\n")
+        Machine._framer = SerialFramer()
 
         logger.info("Starting to listen for esp32 messages")
         Machine.startTime = time.time()
-        while True:
-            if Machine._stopESPcomm:
-                await asyncio.sleep(0.1)
-                Machine.startTime = time.time()
-                continue
-
-            data = uart.readline()
-            if len(data) > 0:
-                # data_bit = bytes(data)
-                try:
-                    data_str = data.decode("utf-8")
-                except Exception:
-                    logger.info(f"decoding fails, message: {data}")
-                    continue
-
-                if MeticulousConfig[CONFIG_LOGGING][LOGGING_SENSOR_MESSAGES]:
-                    logger.info(data_str.strip("\r\n"))
-
-                data_str_sensors = data_str.strip("\r\n").split(",")
-
-                # potential message types
-                button_event = None
-                sensor = None
-                data = None
-                info = None
-                notify = None
+        Machine._add_reader()
 
-                if (
-                    data_str.startswith("rst:0x")
-                    and "boot:0x16 (SPI_FAST_FLASH_BOOT)" in data_str
-                ):
-                    Machine.reset_count += 1
-                    Machine.startTime = time.time()
-                    Machine.esp_info = None
-                    info_requested = False
-                    Machine.infoReady = False
-                    Machine.profileReady = False
-
-                if Machine.reset_count >= 3:
-                    logger.warning("The ESP seems to be resetting, sending update now")
-                    Machine.startUpdate()
-                    Machine.reset_count = 0
+    def _add_reader():
+        Machine._loop.add_handler(
+            Machine._connection.port.fileno(),
+            Machine._on_readable,
+            tornado.ioloop.IOLoop.READ,
+        )
 
-                if (
-                    Machine.infoReady
-                    and not info_requested
-                    and Machine.esp_info is None
-                ):
-                    logger.info(
-                        "Machine has not provided us with a firmware version yet. Requesting now"
-                    )
-                    Machine.action("info")
-                    info_requested = True
-
-                match (data_str_sensors):
-                    # FIXME: This should be replace in the firmware with an "Event," prefix
-                    # for cleanliness
-                    case [
-                        "CCW"
-                        | "CW"
-                        | "push"
-                        | "pu_d"
-                        | "elng"
-                        | "ta_d"
-                        | "ta_l"
-                        | "strt"
-                    ] as ev:
-                        button_event = ButtonEventData.from_args(ev)
-                    case ["Event", *eventData]:
-                        button_event = ButtonEventData.from_args(eventData)
-                    case ["Data", *dataArgs]:
-                        data = ShotData.from_args(dataArgs)
-                    case ["Sensors", colorCodedString]:
-                        sensor = SensorData.from_color_coded_args(colorCodedString)
-                    case ["Sensors", *sensorArgs]:
-                        sensor = SensorData.from_args(sensorArgs)
-                    case ["ESPInfo", *infoArgs]:
-                        info = ESPInfo.from_args(infoArgs)
-                    case ["Notify", *notifyArgs]:
-                        notify = MachineNotify(
-                            notifyArgs[0], ",".join(notifyArgs[1:]).replace(";", "\n")
-                        )
+    def _resume_reading():
+        if Machine._stopESPcomm:
+            Machine._loop.call_later(0.1, Machine._resume_reading)
+            return
+        Machine.startTime = time.time()
+        Machine._add_reader()
+
+    def _on_readable(fd, events):
+        """Called by the IOLoop whenever the serial port has data for us"""
+        if Machine._stopESPcomm:
+            # The port belongs to the flasher for now, check back later
+            Machine._loop.remove_handler(fd)
+            Machine._loop.call_later(0.1, Machine._resume_reading)
+            return
 
-                    case ["HeaterTimeoutInfo", *timeoutArgs]:
-                        try:
-                            heater_timeout_info = HeaterTimeoutInfo.from_args(
-                                timeoutArgs
-                            )
-                            Machine.heater_timeout_info = heater_timeout_info
-                            await Machine._sio.emit(
-                                "heater_status", heater_timeout_info.preheat_remaining
-                            )
-                            if (
-                                heater_timeout_info.preheat_remaining == 0
-                                and previous_preheat_remaining != 0
-                            ):
-                                logger.info("Heater_status: off")
-                            previous_preheat_remaining = (
-                                heater_timeout_info.preheat_remaining
-                            )
-
-                        except Exception as e:
-                            logger.error(
-                                f"Error processing HeaterTimeoutInfo: {e}",
-                                exc_info=True,
-                            )
-                    case [*_]:
-                        logger.info(data_str.strip("\r\n"))
-
-                old_ready = Machine.infoReady
-
-                if data is not None:
-                    Machine.is_idle = data.status == MachineStatus.IDLE
-                    is_purge = data.status == MachineStatus.PURGE
-                    is_retracting = data.status == MachineStatus.RETRACTING
-                    is_preparing = data.status == MachineStatus.CLOSING_VALVE
-                    is_heating = data.status == MachineStatus.HEATING
-
-                    if is_preparing and data.status != old_status:
-                        time_flag = True
-                        shot_start_time = time.time()
-                        logger.info("shot start_time: {:.1f}".format(shot_start_time))
-                        ShotManager.start()
-                        SoundPlayer.play_event_sound(Sounds.BREWING_START)
-
-                    if old_status == MachineStatus.IDLE and not Machine.is_idle:
-                        ShotDebugManager.start()
-                        if is_heating or is_preparing or is_retracting:
-                            time_passed = 0
-
-                    if Machine.is_idle and old_status != MachineStatus.IDLE:
-                        SoundPlayer.play_event_sound(Sounds.IDLE)
-
-                    if Machine.is_idle or is_purge or is_retracting:
-                        if time_flag is True:
-                            SoundPlayer.play_event_sound(Sounds.BREWING_END)
-                        time_flag = False
-                        ShotManager.stop()
-
-                    if Machine.is_idle:
-                        ShotDebugManager.stop()
-
-                    if is_heating and old_status != MachineStatus.HEATING:
-                        time_passed = 0
-                        SoundPlayer.play_event_sound(Sounds.HEATING_START)
-
-                    if old_status == MachineStatus.HEATING and not is_heating:
-                        SoundPlayer.play_event_sound(Sounds.HEATING_END)
-
-                    if time_flag:
-                        time_passed = int((time.time() - shot_start_time) * 1000.0)
-                        Machine.data_sensors = data.clone_with_time_and_state(
-                            time_passed, True
-                        )
-                        ShotManager.handleShotData(Machine.data_sensors)
-                    else:
-                        Machine.data_sensors = data.clone_with_time_and_state(
-                            time_passed, False
-                        )
+        try:
+            count = Machine._framer.read_fd(fd)
+            if count is None:
+                raise OSError("the serial port reached EOF")
+        except OSError as e:
+            logger.warning(f"Reading from the ESP32 failed: {e}")
+            Machine._loop.remove_handler(fd)
+            Machine._loop.call_later(1.0, Machine._resume_reading)
+            return
+        Machine.lastReadTime = time.monotonic()
+
+        for line in Machine._framer.lines():
+            Machine._handle_line(line)
+
+    def _emit(event, data):
+        # socket.io lives on the IOLoop, never emit from anywhere else
+        Machine._loop.add_callback(Machine._sio.emit, event, data)
+
+    def _on_telemetry(kind, message):
+        """Forwards the ESP messages which need no further processing"""
+        if kind is MessageType.BUTTON:
+            if (
+                message.event is not ButtonEventEnum.ENCODER_CLOCKWISE
+                and message.event is not ButtonEventEnum.ENCODER_COUNTERCLOCKWISE
+            ):
+                logger.debug(f"Button Event recieved: {message}")
+
+            Machine._emit("button", message.to_sio())
+
+        elif kind is MessageType.HEATER_TIMEOUT:
+            Machine._emit("heater_status", message.preheat_remaining)
+            if (
+                message.preheat_remaining == 0
+                and Machine._previous_preheat_remaining != 0
+            ):
+                logger.info("Heater_status: off")
+            Machine._previous_preheat_remaining = message.preheat_remaining
+
+        elif kind is MessageType.NOTIFY:
+            if message.notificationType == "acaia_msg":
+                responseOptions = []
+            else:
+                responseOptions = [NotificationResponse.OK]
+            if Machine._espNotification.acknowledged:
+                Machine._espNotification = Notification(
+                    message.message, responseOptions
+                )
+            else:
+                Machine._espNotification.message = message.message
+                Machine._espNotification.respone_options = responseOptions
+            logger.info(
+                f"New Notification from ESP: {Machine._espNotification.message}"
+            )
+            NotificationManager.add_notification(Machine._espNotification)
+
+    def _handle_line(line):  # noqa: C901
+        frame = None
+        if line[0] == FRAME_START:
+            frame = line
+            data_str = ""
+            if MeticulousConfig[CONFIG_LOGGING][LOGGING_SENSOR_MESSAGES]:
+                logger.info("%s", bytes(frame).hex())
+        else:
+            try:
+                data_str = str(line, "utf-8")
+            except Exception:
+                logger.info("decoding fails, message: %r", bytes(line))
+                return
+
+            data_str = data_str.strip("\r\n")
+            if MeticulousConfig[CONFIG_LOGGING][LOGGING_SENSOR_MESSAGES]:
+                logger.info("%s", data_str)
+
+        # potential message types
+        button_event = None
+        sensor = None
+        data = None
+        info = None
+        heater_timeout_info = None
 
-                    ShotDebugManager.handleShotData(Machine.data_sensors)
-                    old_status = Machine.data_sensors.status
-                    Machine.infoReady = True
-
-                if sensor is not None:
-                    Machine.sensor_sensors = sensor
-                    Machine.reset_count = 0
-                    ShotDebugManager.handleSensorData(Machine.sensor_sensors)
-                    if time_flag:
-                        ShotManager.handleSensorData(Machine.sensor_sensors)
-
-                if info is not None:
-                    Machine.esp_info = info
-                    Machine.reset_count = 0
-                    Machine.infoReady = True
-                    info_requested = False
-                    Machine.firmware_running = Machine._parseVersionString(
-                        info.firmwareV
-                    )
-
-                    if (
-                        info.serialNumber != ""
-                        and info.serialNumber != "NOT_ASSIGNED"
-                        and info.color != ""
-                        and info.color != "NOT_ASSIGNED"
-                        and info.batchNumber != ""
-                        and info.batchNumber != "NOT_ASSIGNED"
-                        and info.buildDate != ""
-                        and info.buildDate != "NOT_ASSIGNED"
-                    ):
-                        MeticulousConfig[CONFIG_SYSTEM][
-                            MACHINE_SERIAL_NUMBER
-                        ] = info.serialNumber
-                        MeticulousConfig[CONFIG_SYSTEM][MACHINE_COLOR] = info.color
-                        MeticulousConfig[CONFIG_SYSTEM][
-                            MACHINE_BATCH_NUMBER
-                        ] = info.batchNumber
-                        MeticulousConfig[CONFIG_SYSTEM][
-                            MACHINE_BUILD_DATE
-                        ] = info.buildDate
-
-                        MeticulousConfig.save()
-
-                    if not emulated_firmware:
-                        logger.info(
-                            f"ESPInfo running firmware version:   {Machine.firmware_running} on pinout version {Machine.esp_info.espPinout} Machine_color: {Machine.esp_info.color} Serial_number: {Machine.esp_info.serialNumber} Batch_number: {Machine.esp_info.batchNumber} Build_date: {Machine.esp_info.buildDate}"
-                        )
-                        logger.info(
-                            f"Backend available firmware version: {Machine.firmware_available}"
-                        )
-                        emulated_firmware = Machine.emulated
-                    needs_update = False
-                    if (
-                        Machine.firmware_available is not None
-                        and Machine.firmware_available is not None
-                    ):
-                        if (
-                            Machine.firmware_running["Release"]
-                            < Machine.firmware_available["Release"]
-                        ):
-                            needs_update = True
-                        if (
-                            Machine.firmware_running["Release"]
-                            == Machine.firmware_available["Release"]
-                        ):
-                            try:
-                                running_extra = int(
-                                    Machine.firmware_running["ExtraCommits"]
-                                )
-                                available_extra = int(
-                                    Machine.firmware_available["ExtraCommits"]
-                                )
-                                if running_extra < available_extra:
-                                    needs_update = True
-                            except Exception:
-                                pass
-
-                    if (
-                        needs_update
-                        and not MeticulousConfig[CONFIG_USER][
-                            DISALLOW_FIRMWARE_FLASHING
-                        ]
-                    ):
-                        info_string = f"Firmware {Machine.firmware_running.get('Release')}-{Machine.firmware_running['ExtraCommits']} is outdated, upgrading"
-                        logger.info(info_string)
-
-                        Machine.startUpdate()
-
-                if button_event is not None:
-                    if (
-                        button_event.event is not ButtonEventEnum.ENCODER_CLOCKWISE
-                        and button_event.event
-                        is not ButtonEventEnum.ENCODER_COUNTERCLOCKWISE
-                    ):
-                        logger.debug(f"Button Event recieved: {button_event}")
-
-                    await Machine._sio.emit("button", button_event.to_sio())
-
-                # FIXME this should be a callback to the frontends in the future
+        if (
+            data_str.startswith("rst:0x")
+            and "boot:0x16 (SPI_FAST_FLASH_BOOT)" in data_str
+        ):
+            Machine.reset_count += 1
+            Machine.startTime = time.time()
+            Machine.esp_info = None
+            Machine._info_requested = False
+            Machine.infoReady = False
+            Machine._forgetProfile()
+            Machine.binaryTelemetry = False
+
+        if Machine.reset_count >= 3:
+            logger.warning("The ESP seems to be resetting, sending update now")
+            Machine._startUpdateThread()
+            Machine.reset_count = 0
+
+        if (
+            Machine.infoReady
+            and not Machine._info_requested
+            and Machine.esp_info is None
+        ):
+            logger.info(
+                "Machine has not provided us with a firmware version yet. Requesting now"
+            )
+            Machine.action("info")
+            Machine._info_requested = True
+
+        if frame is not None:
+            (message_type, message) = MessageDispatcher.parse_frame(frame)
+            if not Machine.binaryTelemetry:
+                logger.info("ESP switched to binary telemetry")
+                Machine.binaryTelemetry = True
+        else:
+            (message_type, message) = MessageDispatcher.parse(data_str)
+        if message_type is MessageType.DATA:
+            data = message
+        elif message_type is MessageType.SENSORS:
+            sensor = message
+        elif message_type is MessageType.BUTTON:
+            button_event = message
+        elif message_type is MessageType.ESP_INFO:
+            info = message
+        elif message_type is MessageType.HEATER_TIMEOUT:
+            heater_timeout_info = message
+        elif message_type is MessageType.PROFILE_HASH:
+            # Only trust the confirmation of what we sent last. The hash is
+            # printed before loading, the profile is not held until it loaded
+            Machine._hashedProfile = message == Machine._pendingProfileHash
+        elif message_type is MessageType.PROFILE_LOADED:
+            if Machine._hashedProfile and Machine._pendingProfileHash is not None:
+                Machine.acknowledgedProfileHash = Machine._pendingProfileHash
+                Machine._pendingProfileHash = None
+            Machine._hashedProfile = False
+        elif message_type is MessageType.ESP_ERROR:
+            # Whatever failed, the pending profile might not have loaded
+            Machine._pendingProfileHash = None
+            Machine._hashedProfile = False
+
+        # Data is published once it got its time and state below
+        if message is not None and message_type is not MessageType.DATA:
+            TelemetryBus.publish(message_type, message, Machine.lastReadTime)
+
+        if heater_timeout_info is not None:
+            Machine.heater_timeout_info = heater_timeout_info
+
+        old_ready = Machine.infoReady
+
+        if data is not None:
+            Machine.is_idle = data.status == MachineStatus.IDLE
+            is_purge = data.status == MachineStatus.PURGE
+            is_retracting = data.status == MachineStatus.RETRACTING
+            is_preparing = data.status == MachineStatus.CLOSING_VALVE
+            is_heating = data.status == MachineStatus.HEATING
+
+            if is_preparing and data.status != Machine._old_status:
+                Machine._time_flag = True
+                Machine.shot_start_time = time.time()
+                logger.info("shot start_time: {:.1f}".format(Machine.shot_start_time))
+                TelemetryBus.publish(MachineEvent.BREWING_START)
+
+            if Machine._old_status == MachineStatus.IDLE and not Machine.is_idle:
+                TelemetryBus.publish(MachineEvent.ACTIVE)
+                if is_heating or is_preparing or is_retracting:
+                    Machine._time_passed = 0
+
+            if Machine.is_idle and Machine._old_status != MachineStatus.IDLE:
+                TelemetryBus.publish(MachineEvent.IDLE)
+
+            if Machine.is_idle or is_purge or is_retracting:
+                if Machine._time_flag is True:
+                    TelemetryBus.publish(MachineEvent.BREWING_END)
+                Machine._time_flag = False
+
+            if is_heating and Machine._old_status != MachineStatus.HEATING:
+                Machine._time_passed = 0
+                TelemetryBus.publish(MachineEvent.HEATING_START)
+
+            if Machine._old_status == MachineStatus.HEATING and not is_heating:
+                TelemetryBus.publish(MachineEvent.HEATING_END)
+
+            if Machine._time_flag:
+                Machine._time_passed = int(
+                    (time.time() - Machine.shot_start_time) * 1000.0
+                )
+                Machine.data_sensors = data.with_time_and_state(
+                    Machine._time_passed, True
+                )
+            else:
+                Machine.data_sensors = data.with_time_and_state(
+                    Machine._time_passed, False
+                )
+
+            TelemetryBus.publish(
+                MessageType.DATA, Machine.data_sensors, Machine.lastReadTime
+            )
+            Machine._old_status = Machine.data_sensors.status
+            Machine.infoReady = True
+
+        if sensor is not None:
+            Machine.sensor_sensors = sensor
+            Machine.reset_count = 0
+
+        if info is not None:
+            Machine.esp_info = info
+            Machine.reset_count = 0
+            Machine.infoReady = True
+            Machine._info_requested = False
+            Machine.firmware_running = Machine._parseVersionString(info.firmwareV)
+            if not Machine.binaryTelemetry:
+                # The ESP falls back to text whenever it resets
+                Machine.request_binary_telemetry()
+
+            if (
+                info.serialNumber != ""
+                and info.serialNumber != "NOT_ASSIGNED"
+                and info.color != ""
+                and info.color != "NOT_ASSIGNED"
+                and info.batchNumber != ""
+                and info.batchNumber != "NOT_ASSIGNED"
+                and info.buildDate != ""
+                and info.buildDate != "NOT_ASSIGNED"
+            ):
+                MeticulousConfig[CONFIG_SYSTEM][
+                    MACHINE_SERIAL_NUMBER
+                ] = info.serialNumber
+                MeticulousConfig[CONFIG_SYSTEM][MACHINE_COLOR] = info.color
+                MeticulousConfig[CONFIG_SYSTEM][MACHINE_BATCH_NUMBER] = info.batchNumber
+                MeticulousConfig[CONFIG_SYSTEM][MACHINE_BUILD_DATE] = info.buildDate
+
+                MeticulousConfig.save()
+
+            if not Machine._emulated_firmware:
+                logger.info(
+                    f"ESPInfo running firmware version:   {Machine.firmware_running} on pinout version {Machine.esp_info.espPinout} Machine_color: {Machine.esp_info.color} Serial_number: {Machine.esp_info.serialNumber} Batch_number: {Machine.esp_info.batchNumber} Build_date: {Machine.esp_info.buildDate}"
+                )
+                logger.info(
+                    f"Backend available firmware version: {Machine.firmware_available}"
+                )
+                Machine._emulated_firmware = Machine.emulated
+            needs_update = False
+            if (
+                Machine.firmware_available is not None
+                and Machine.firmware_available is not None
+            ):
                 if (
-                    button_event is not None
-                    and button_event.event is ButtonEventEnum.ENCODER_DOUBLE
+                    Machine.firmware_running["Release"]
+                    < Machine.firmware_available["Release"]
                 ):
-                    logger.info("DOUBLE ENCODER, Returning to idle")
-                    Machine.end_profile()
-
+                    needs_update = True
                 if (
-                    not old_ready
-                    and Machine.infoReady
-                    and MeticulousConfig[CONFIG_USER][MACHINE_HEAT_ON_BOOT]
+                    Machine.firmware_running["Release"]
+                    == Machine.firmware_available["Release"]
                 ):
-                    if Machine.data_sensors.status == MachineStatus.IDLE:
-                        logger.info("Tell the machine to preheat")
-                        logger.warning("NOT IMPLEMENTED YET")
-                        # Machine.action("preheat")
-
-                if notify is not None:
-                    if notify.notificationType == "acaia_msg":
-                        responseOptions = []
-                    else:
-                        responseOptions = [NotificationResponse.OK]
-                    if Machine._espNotification.acknowledged:
-                        Machine._espNotification = Notification(
-                            notify.message, responseOptions
+                    try:
+                        running_extra = int(Machine.firmware_running["ExtraCommits"])
+                        available_extra = int(
+                            Machine.firmware_available["ExtraCommits"]
                         )
-                    else:
-                        Machine._espNotification.message = notify.message
-                        Machine._espNotification.respone_options = responseOptions
-                    logger.info(
-                        f"New Notification from ESP: {Machine._espNotification.message}"
-                    )
-                    NotificationManager.add_notification(Machine._espNotification)
+                        if running_extra < available_extra:
+                            needs_update = True
+                    except Exception:
+                        pass
+
+            if (
+                needs_update
+                and not MeticulousConfig[CONFIG_USER][DISALLOW_FIRMWARE_FLASHING]
+            ):
+                info_string = f"Firmware {Machine.firmware_running.get('Release')}-{Machine.firmware_running['ExtraCommits']} is outdated, upgrading"
+                logger.info(info_string)
+
+                Machine._startUpdateThread()
+
+        # FIXME this should be a callback to the frontends in the future
+        if (
+            button_event is not None
+            and button_event.event is ButtonEventEnum.ENCODER_DOUBLE
+        ):
+            logger.info("DOUBLE ENCODER, Returning to idle")
+            Machine.end_profile()
+
+        if (
+            not old_ready
+            and Machine.infoReady
+            and MeticulousConfig[CONFIG_USER][MACHINE_HEAT_ON_BOOT]
+        ):
+            if Machine.data_sensors.status == MachineStatus.IDLE:
+                logger.info("Tell the machine to preheat")
+                logger.warning("NOT IMPLEMENTED YET")
+                # Machine.action("preheat")
 
     def startScaleMasterCalibration():
         Machine.action("scale_master_calibration")
 
+    def _startUpdateThread():
+        # Flashing takes a while, keep the IOLoop responsive meanwhile
+        NamedThread("FWUpgrade", target=Machine.startUpdate).start()
+
     def startUpdate():
         updateNotification = Notification(
             "Upgrading system realtime core. This will take around 20 seconds. The machines buttons will be disabled during the upgrade",
@@ -505,7 +563,10 @@ class Machine:
         NotificationManager.add_notification(updateNotification)
 
         Machine._stopESPcomm = True
+        # Let whatever is still queued go out before the flasher takes the port
+        Machine._writer.flush(timeout=5)
         error_msg = Machine._connection.sendUpdate()
+        Machine._forgetProfile()
         Machine._stopESPcomm = False
 
         if error_msg:
@@ -546,72 +607,90 @@ class Machine:
         Machine.writeStr(machine_msg)
         return True
 
+    def request_binary_telemetry():
+        if BINARY_TELEMETRY:
+            Machine.action("binary_telemetry")
+
     def writeStr(content):
         Machine.write(str.encode(content))
 
-    def write(content):
+    def write(content, on_written=None):
         if not Machine._stopESPcomm:
-            Machine._connection.port.write(content)
+            Machine._writer.write(content, on_written)
 
     def reset():
         Machine._connection.reset()
         Machine.infoReady = False
-        Machine.profileReady = False
+        Machine._forgetProfile()
+        Machine.binaryTelemetry = False
         Machine.startTime = time.time()
 
+    def supportsCompactProfiles():
+        return COMPACT_PROFILES
+
     def send_json_with_hash(json_obj):
-        json_string = json.dumps(json_obj)
-        json_data = "json\n" + json_string + "\x03"
+        if Machine.supportsCompactProfiles():
+            json_string = dumps_minified(encode_compact(json_obj))
+            json_data = f"json_compact,{COMPACT_ENCODING_VERSION}\n{json_string}\x03"
+        else:
+            json_string = dumps_minified(json_obj)
+            json_data = "json\n" + json_string + "\x03"
 
         logger.debug("JSON to stream to the machine:")
         logger.debug(json_data)
 
-        json_hash = hashlib.md5(json_data[5:-1].encode("utf-8")).hexdigest()
+        json_hash = hashlib.md5(json_string.encode("utf-8")).hexdigest()
 
         logger.info(f"JSON Hash: {json_hash}")
 
-        start = time.time()
-        Machine.write("hash,".encode("utf-8"))
-        Machine.write(json_hash.encode("utf-8"))
-        Machine.write("\x03".encode("utf-8"))
-        Machine.write(json_data.encode("utf-8"))
-        end = time.time()
-        time_ms = (end - start) * 1000
-        if time_ms > 10:
-            time_str = f"{int(time_ms)} ms"
-        else:
-            time_str = f"{int(time_ms*1000)} ns"
-        logger.info(f"Streaming profile to ESP32 took {time_str}")
+        # Hash and profile go out as a single buffer in a single write
+        upload = f"hash,{json_hash}\x03{json_data}".encode("utf-8")
+
+        def log_upload(seconds):
+            time_ms = seconds * 1000
+            if time_ms > 10:
+                time_str = f"{int(time_ms)} ms"
+            else:
+                time_str = f"{int(time_ms*1000)} ns"
+            logger.info(f"Streaming profile to ESP32 took {time_str}")
+
+        if json_hash == Machine.acknowledgedProfileHash:
+            Machine.profileUploadsSkipped += 1
+            Machine.profileUploadSavedBytes += len(upload)
+            saved_ms = len(upload) * 10 / SerialConnection.BAUDRATE * 1000
+            logger.info(
+                f"Streaming profile to ESP32 took 0 ms, the ESP already holds it "
+                f"(saved {len(upload)} bytes, ~{int(saved_ms)} ms)"
+            )
+            Machine.profileReady = True
+            return
+
+        # Until the ESP confirms loading this one we do not know what it holds
+        Machine.acknowledgedProfileHash = None
+        Machine._pendingProfileHash = json_hash
+        Machine._hashedProfile = False
+        Machine.profileUploadsSent += 1
+        Machine.write(upload, on_written=log_upload)
         Machine.profileReady = True
 
+    def _forgetProfile():
+        Machine.profileReady = False
+        Machine.acknowledgedProfileHash = None
+        Machine._pendingProfileHash = None
+        Machine._hashedProfile = False
+
     def setSerial(color, serial, batch_number, build_date):
         write_request = "nvs_request,write,"
+        # All four keys are sent as one write
         Machine.write(
-            (write_request + esp_nvs_keys.color.value + "," + color + "\x03").encode(
-                "utf-8"
-            )
-        )
-        Machine.write(
-            (
-                write_request + esp_nvs_keys.serial_number.value + "," + serial + "\x03"
-            ).encode("utf-8")
-        )
-        Machine.write(
-            (
-                write_request
-                + esp_nvs_keys.batch_number.value
-                + ","
-                + batch_number
-                + "\x03"
-            ).encode("utf-8")
-        )
-        Machine.write(
-            (
-                write_request
-                + esp_nvs_keys.build_date.value
-                + ","
-                + build_date
-                + "\x03"
+            "".join(
+                f"{write_request}{key.value},{value}\x03"
+                for (key, value) in [
+                    (esp_nvs_keys.color, color),
+                    (esp_nvs_keys.serial_number, serial),
+                    (esp_nvs_keys.batch_number, batch_number),
+                    (esp_nvs_keys.build_date, build_date),
+                ]
             ).encode("utf-8")
         )
 
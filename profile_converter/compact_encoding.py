@@ -0,0 +1,168 @@
+import json
+import string
+
+# Version 1 of the compact node-JSON encoding. The firmware carries the very same
+# tables, so entries must only ever be appended, never reordered or removed.
+COMPACT_ENCODING_VERSION = 1
+
+# Every key is replaced with a short code, derived from its index
+KEY_DICTIONARY = (
+    "kind",
+    "id",
+    "next_node_id",
+    "value",
+    "operator",
+    "controllers",
+    "triggers",
+    "source",
+    "name",
+    "algorithm",
+    "nodes",
+    "timer_reference_id",
+    "direction",
+    "speed",
+    "curve",
+    "interpolation_kind",
+    "points",
+    "reference",
+    "position_reference_id",
+    "weight_reference_id",
+    "gesture",
+    "message",
+    "stages",
+    "curve_id",
+    "time_reference_id",
+)
+
+# Keys whose values are one of a fixed set of strings. Those are sent as the
+# index into VALUE_DICTIONARY, anything not listed there is sent as is
+ENUM_KEYS = frozenset(
+    ("kind", "source", "algorithm", "interpolation_kind", "direction", "gesture")
+)
+
+VALUE_DICTIONARY = (
+    # Controllers
+    "piston_power_controller",
+    "flow_controller",
+    "pressure_controller",
+    "weight_controller",
+    "move_piston_controller",
+    "temperature_controller",
+    "tare_controller",
+    "log_controller",
+    "end_profile",
+    # Triggers
+    "piston_position_trigger",
+    "piston_speed_trigger",
+    "timer_trigger",
+    "weight_value_trigger",
+    "button_trigger",
+    "water_detection_trigger",
+    "flow_curve_trigger",
+    "pressure_curve_trigger",
+    "temperature_curve_trigger",
+    "piston_power_curve_trigger",
+    "flow_value_trigger",
+    "pressure_value_trigger",
+    "temperature_value_trigger",
+    "piston_power_value_trigger",
+    "exit",
+    # References and curves
+    "time_reference",
+    "position_reference",
+    "weight_reference",
+    "time",
+    "position",
+    "weight",
+    "linear_interpolation",
+    "catmull_interpolation",
+    # Algorithms
+    "Pressure PID v1.0",
+    "Pressure PID v2.0",
+    "Spring v1.0",
+    "Water Temperature PID v1.0",
+    "Cylinder Temperature PID v1.0",
+    "Tube Temperature PID v1.0",
+    "Plunger Temperature PID v1.0",
+    "Stable Temperature",
+    "Flow PID v1.0",
+    "Weight PID v1.0",
+    "Piston Ease-In",
+    "Piston Fast",
+    # Sources
+    "Flow Raw",
+    "Pressure Raw",
+    "Weight Raw",
+    "Raw Piston Power",
+    "Flow Average",
+    "Pressure Average",
+    "Weight Average",
+    "Average Piston Power",
+    "Flow Predictive",
+    "Pressure Predictive",
+    "Weight Predictive",
+    "Predictive Piston Power",
+    "Tube Temperature",
+    "Cylinder Temperature",
+    "Plunger Temperature",
+    "Water Temperature",
+    "Cylinder Temperature Average",
+    "Piston Position Raw",
+    "Start Button",
+    "Tare Button",
+    "Encoder",
+    "Encoder Button",
+    # Gestures and directions
+    "Single Tap",
+    "Double Tap",
+    "Right",
+    "Left",
+    "Pressed",
+    "Released",
+    "Long Press",
+    "DOWN",
+    "UP",
+)
+
+_KEY_CODES = string.ascii_lowercase + string.ascii_uppercase
+
+keyCodes = {key: _KEY_CODES[index] for index, key in enumerate(KEY_DICTIONARY)}
+keyNames = {code: key for key, code in keyCodes.items()}
+valueCodes = {value: index for index, value in enumerate(VALUE_DICTIONARY)}
+
+
+def encode_compact(node):
+    """Replaces the known keys and enum values of a node-JSON profile"""
+    if isinstance(node, dict):
+        encoded = {}
+        for key, value in node.items():
+            if key in ENUM_KEYS and isinstance(value, str):
+                value = valueCodes.get(value, value)
+            else:
+                value = encode_compact(value)
+            encoded[keyCodes.get(key, key)] = value
+        return encoded
+    if isinstance(node, list):
+        return [encode_compact(item) for item in node]
+    return node
+
+
+def decode_compact(node):
+    """Inverse of encode_compact(), what the firmware does on its side"""
+    if isinstance(node, dict):
+        decoded = {}
+        for code, value in node.items():
+            key = keyNames.get(code, code)
+            if key in ENUM_KEYS and isinstance(value, int):
+                value = VALUE_DICTIONARY[value]
+            else:
+                value = decode_compact(value)
+            decoded[key] = value
+        return decoded
+    if isinstance(node, list):
+        return [decode_compact(item) for item in node]
+    return node
+
+
+def dumps_minified(node) -> str:
+    return json.dumps(node, separators=(",", ":"))
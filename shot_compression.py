@@ -0,0 +1,195 @@
+import io
+import json
+import os
+import threading
+from pathlib import Path
+
+import zstandard as zstd
+
+from log import MeticulousLogger
+
+logger = MeticulousLogger.getLogger(__name__)
+
+HISTORY_PATH = os.getenv("HISTORY_PATH", "/meticulous-user/history")
+DICTIONARY_PATH = Path(HISTORY_PATH).joinpath("dictionaries")
+
+# Tunes the compression parameters for a shot of about this size. Without a
+# size the high levels allocate several hundred MiB for their match finders
+EXPECTED_SHOT_SIZE = 1024 * 1024
+
+# The levels a shot can be compressed with, see ShotCompression.record_shot().
+# Above 12 every step costs several times the CPU for a few percent
+SHOT_COMPRESSION_LEVELS = (1, 3, 6, 9, 12)
+DEFAULT_SHOT_COMPRESSION_LEVEL = int(os.getenv("SHOT_COMPRESSION_LEVEL", "9"))
+# Share of the shot duration the writer may spend compressing before the next
+# shot is compressed with a lower level
+MAX_COMPRESSION_LOAD = float(os.getenv("MAX_SHOT_COMPRESSION_LOAD", "0.05"))
+
+DICTIONARY_SIZE = 64 * 1024
+MIN_TRAINING_SHOTS = 20
+TRAINING_SHOTS = 100
+# A new dictionary is trained once this many shots were recorded with the old one
+RETRAIN_AFTER_SHOTS = 200
+# zstd reserves the ids below this for publicly registered dictionaries
+FIRST_DICTIONARY_ID = 32768
+# Samples per training sample, the same chunks ShotFileWriter compresses
+TRAINING_CHUNK_SAMPLES = 25
+
+
+class ShotCompression:
+    """Compression level and dictionary of the shot files.
+
+    Shots are compressed with a dictionary trained on the previous shots,
+    zstd stores its id in the frame header. Every dictionary ever used stays
+    in DICTIONARY_PATH so old files can still be read with read().
+
+    The level adapts to how long compressing the previous shot took: When the
+    writer was busy for more than MAX_COMPRESSION_LOAD of the shot duration
+    the next shot uses the next lower level, when it was mostly idle the next
+    higher one.
+    """
+
+    _level = (
+        DEFAULT_SHOT_COMPRESSION_LEVEL
+        if DEFAULT_SHOT_COMPRESSION_LEVEL in SHOT_COMPRESSION_LEVELS
+        else 9
+    )
+    _dictionary: zstd.ZstdCompressionDict = None
+    _dictionaries = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def init():
+        DICTIONARY_PATH.mkdir(parents=True, exist_ok=True)
+        newest = ShotCompression._newest_dictionary_file()
+        if newest is not None:
+            ShotCompression._dictionary = ShotCompression.dictionary(int(newest.stem))
+            logger.info(f"Compressing shots with dictionary {newest.stem}")
+
+    @staticmethod
+    def level() -> int:
+        return ShotCompression._level
+
+    @staticmethod
+    def compressor(level=None) -> zstd.ZstdCompressor:
+        params = zstd.ZstdCompressionParameters.from_level(
+            level or ShotCompression._level,
+            source_size=EXPECTED_SHOT_SIZE,
+            # read() picks the dictionary by this id
+            write_dict_id=True,
+        )
+        if ShotCompression._dictionary is None:
+            return zstd.ZstdCompressor(compression_params=params)
+        return zstd.ZstdCompressor(
+            compression_params=params, dict_data=ShotCompression._dictionary
+        )
+
+    @staticmethod
+    def record_shot(level, compression_seconds, shot_seconds) -> None:
+        """Picks the level of the next shot"""
+        if shot_seconds <= 0 or level not in SHOT_COMPRESSION_LEVELS:
+            return
+        load = compression_seconds / shot_seconds
+        index = SHOT_COMPRESSION_LEVELS.index(level)
+        if load > MAX_COMPRESSION_LOAD and index > 0:
+            index -= 1
+        elif (
+            load < MAX_COMPRESSION_LOAD / 4 and index < len(SHOT_COMPRESSION_LEVELS) - 1
+        ):
+            index += 1
+        if SHOT_COMPRESSION_LEVELS[index] != ShotCompression._level:
+            logger.info(
+                f"Compressing the shot took {load * 100:.1f}% of its duration, "
+                f"next shots use level {SHOT_COMPRESSION_LEVELS[index]}"
+            )
+        ShotCompression._level = SHOT_COMPRESSION_LEVELS[index]
+
+    @staticmethod
+    def dictionary(dict_id) -> zstd.ZstdCompressionDict:
+        with ShotCompression._lock:
+            if dict_id not in ShotCompression._dictionaries:
+                path = DICTIONARY_PATH.joinpath(f"{dict_id}.zdict")
+                ShotCompression._dictionaries[dict_id] = zstd.ZstdCompressionDict(
+                    path.read_bytes()
+                )
+            return ShotCompression._dictionaries[dict_id]
+
+    @staticmethod
+    def decompressor(compressed: bytes) -> zstd.ZstdDecompressor:
+        """Decompressor for a file starting with `compressed`"""
+        dict_id = zstd.get_frame_parameters(compressed).dict_id
+        if dict_id == 0:
+            return zstd.ZstdDecompressor()
+        return zstd.ZstdDecompressor(dict_data=ShotCompression.dictionary(dict_id))
+
+    @staticmethod
+    def read(path) -> bytes:
+        """Decompresses a shot (or any other zstd) file"""
+        with open(path, "rb") as file:
+            compressed = file.read()
+        decompressor = ShotCompression.decompressor(compressed)
+        return decompressor.stream_reader(io.BytesIO(compressed)).read()
+
+    @staticmethod
+    def _dictionary_files():
+        return sorted(DICTIONARY_PATH.glob("*.zdict"), key=lambda path: int(path.stem))
+
+    @staticmethod
+    def _newest_dictionary_file():
+        files = ShotCompression._dictionary_files()
+        return files[-1] if files else None
+
+    @staticmethod
+    def refresh_dictionary(shot_path) -> None:
+        """Trains a new dictionary if there is none or it got old"""
+        shot_files = sorted(
+            Path(shot_path).glob("*/*.shot.json.zst"),
+            key=lambda path: path.stat().st_mtime,
+        )
+        newest = ShotCompression._newest_dictionary_file()
+        if newest is None:
+            if len(shot_files) < MIN_TRAINING_SHOTS:
+                return
+        else:
+            trained = newest.stat().st_mtime
+            if sum(path.stat().st_mtime > trained for path in shot_files) < (
+                RETRAIN_AFTER_SHOTS
+            ):
+                return
+        ShotCompression.train_dictionary(shot_files[-TRAINING_SHOTS:])
+
+    @staticmethod
+    def train_dictionary(shot_files) -> int:
+        """Trains a dictionary on `shot_files` and compresses new shots with it"""
+        samples = []
+        for path in shot_files:
+            try:
+                shot = json.loads(ShotCompression.read(path))
+            except Exception as e:
+                logger.warning(f"Not training on {path}: {e}")
+                continue
+            data = shot.pop("data", [])
+            samples.append(json.dumps(shot, ensure_ascii=False).encode("utf-8"))
+            lines = [json.dumps(sample, ensure_ascii=False) for sample in data]
+            for start in range(0, len(lines), TRAINING_CHUNK_SAMPLES):
+                chunk = ",\n".join(lines[start : start + TRAINING_CHUNK_SAMPLES])
+                samples.append(chunk.encode("utf-8"))
+
+        known_ids = [int(path.stem) for path in ShotCompression._dictionary_files()]
+        dict_id = max(known_ids + [FIRST_DICTIONARY_ID - 1]) + 1
+        dictionary = zstd.train_dictionary(DICTIONARY_SIZE, samples, dict_id=dict_id)
+
+        DICTIONARY_PATH.mkdir(parents=True, exist_ok=True)
+        path = DICTIONARY_PATH.joinpath(f"{dict_id}.zdict")
+        temp_path = path.with_suffix(".tmp")
+        temp_path.write_bytes(dictionary.as_bytes())
+        os.replace(temp_path, path)
+
+        with ShotCompression._lock:
+            ShotCompression._dictionaries[dict_id] = dictionary
+        ShotCompression._dictionary = dictionary
+        logger.info(
+            f"Trained dictionary {dict_id} on {len(shot_files)} shots "
+            f"({len(samples)} samples)"
+        )
+        return dict_id
@@ -8,7 +8,6 @@ from pathlib import Path
 from typing import List, Optional
 
 import pytz
-import zstandard as zstd
 from pydantic import BaseModel, Field
 from sqlalchemy import (
     asc,
@@ -27,9 +26,11 @@ from sqlalchemy import event as sqlEvent
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import update
 from database_models import metadata, profile as profile_table, history as history_table
+from database_models import HISTORY_SUMMARY_COLUMNS
 from database_models import shot_annotation, shot_rating
 
 from log import MeticulousLogger
+from shot_compression import ShotCompression
 
 HISTORY_PATH = os.getenv("HISTORY_PATH", "/meticulous-user/history")
 DATABASE_FILE = "history.sqlite"
@@ -58,6 +59,8 @@ class SearchParams(BaseModel):
     sort: SearchOrder = SearchOrder.descending
     max_results: int = 20
     dump_data: bool = True
+    # Only the previews of the graphs instead of the data
+    preview: bool = False
 
 
 class ShotDataBase:
@@ -260,6 +263,7 @@ class ShotDataBase:
 
         profile_data = entry.get("profile")
         profile_key = ShotDataBase.insert_profile(profile_data)
+        summary = entry.get("summary") or {}
         with ShotDataBase.engine.connect() as connection:
             with connection.begin():
 
@@ -274,9 +278,47 @@ class ShotDataBase:
                     profile_name=entry["profile_name"],
                     profile_id=profile_data["id"],
                     profile_key=profile_key,
+                    **{
+                        column: summary.get(column)
+                        for column in HISTORY_SUMMARY_COLUMNS
+                    },
+                    preview=entry.get("preview"),
                 )
                 connection.execute(ins_stmt)
 
+    @staticmethod
+    def history_without_summary(after_id, limit):
+        """(id, file) of the shots after `after_id` the backfill did not process.
+
+        Every processed shot has a preview, an empty one if its file could not
+        be read. The summary stays empty for shots without samples.
+        """
+        stmt = (
+            select(history_table.c.id, history_table.c.file)
+            .where(history_table.c.id > after_id)
+            .where(history_table.c.preview.is_(None))
+            .order_by(asc(history_table.c.id))
+            .limit(limit)
+        )
+        with ShotDataBase.engine.connect() as connection:
+            return [tuple(row) for row in connection.execute(stmt)]
+
+    @staticmethod
+    def store_summary(history_id, summary, preview):
+        with ShotDataBase.engine.connect() as connection:
+            with connection.begin():
+                connection.execute(
+                    update(history_table)
+                    .where(history_table.c.id == history_id)
+                    .values(
+                        **{
+                            column: summary.get(column)
+                            for column in HISTORY_SUMMARY_COLUMNS
+                        },
+                        preview=preview,
+                    )
+                )
+
     @staticmethod
     def delete_shot(shot_id):
         with ShotDataBase.engine.connect() as connection:
@@ -394,17 +436,13 @@ class ShotDataBase:
                 data = None
                 file_entry = row_dict.pop("history_file")
 
-                if params.dump_data:
+                shot_preview = row_dict.pop("history_preview")
+                if params.dump_data and not params.preview:
                     from shot_manager import SHOT_PATH
 
                     data_file = Path(SHOT_PATH).joinpath(file_entry)
-                    with open(data_file, "rb") as compressed_file:
-                        decompressor = zstd.ZstdDecompressor()
-                        decompressed_content = decompressor.stream_reader(
-                            compressed_file
-                        )
-                        file_contents = json.loads(decompressed_content.read())
-                        data = file_contents.get("data")
+                    file_contents = json.loads(ShotCompression.read(data_file))
+                    data = file_contents.get("data")
 
                 profile = {
                     "id": row_dict.pop("profile_id"),
@@ -420,6 +458,10 @@ class ShotDataBase:
                     "variables": row_dict.pop("profile_variables"),
                     "previous_authors": row_dict.pop("profile_previous_authors"),
                 }
+                summary = {
+                    column: row_dict.pop(f"history_{column}")
+                    for column in HISTORY_SUMMARY_COLUMNS
+                }
                 history = {
                     "id": row_dict.pop("history_uuid"),
                     "db_key": row_dict.pop("history_id"),
@@ -427,8 +469,17 @@ class ShotDataBase:
                     "file": file_entry,
                     "name": row_dict.pop("history_profile_name"),
                     "data": data,
+                    # None until computed for shots recorded before summaries
+                    "summary": (
+                        summary
+                        if any(value is not None for value in summary.values())
+                        else None
+                    ),
                     "profile": profile,
                 }
+                if params.preview:
+                    # Empty for shots whose file could not be read
+                    history["preview"] = shot_preview or None
 
                 parsed_results.append(history)
 
@@ -1,7 +1,6 @@
 import csv
 import io
 import os
-from named_thread import NamedThread
 import time
 import sentry_sdk
 from datetime import datetime
@@ -9,8 +8,11 @@ from datetime import datetime
 import zstandard as zstd
 
 from config import CONFIG_USER, DEBUG_SHOT_DATA, MACHINE_DEBUG_SENDING, MeticulousConfig
-from esp_serial.data import SensorData, ShotData
+from esp_serial.data import SensorData, ShotData, sensorDataFields, shotDataFields
+from esp_serial.dispatcher import MessageType
+from history_writer import HistoryWriter, WritePriority
 from log import MeticulousLogger
+from telemetry_bus import MachineEvent
 
 logger = MeticulousLogger.getLogger(__name__)
 
@@ -18,18 +20,44 @@ DEBUG_HISTORY_PATH = os.getenv("DEBUG_HISTORY_PATH", "/meticulous-user/history/d
 
 
 class DebugData:
+    """The debug CSV of a shot, compressed while the shot is running.
+
+    The Sensors message following a Data message still completes its row, so
+    a row is written once the next Data message arrived or in finish().
+    """
+
+    COMPRESSION_LEVEL = 8
+    # The compressor is held for the whole shot, a source size hint keeps its
+    # window and tables around 1 MiB. The rows repeat within a few samples.
+    COMPRESSION_SOURCE_SIZE = 64 * 1024
+    FIELDS = list(shotDataFields) + list(sensorDataFields)
+
     def __init__(self) -> None:
-        self.shotData = []
         self.startTime = time.time()
+        self.samples = 0
+        self._sample = None
+        self._output = io.BytesIO()
+        parameters = zstd.ZstdCompressionParameters.from_level(
+            DebugData.COMPRESSION_LEVEL, source_size=DebugData.COMPRESSION_SOURCE_SIZE
+        )
+        self._compressor = zstd.ZstdCompressor(
+            compression_params=parameters
+        ).stream_writer(self._output, closefd=False)
+        self._text = io.TextIOWrapper(self._compressor, encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(
+            self._text, fieldnames=DebugData.FIELDS + ["startTime", "profile_ms"]
+        )
+        self._writer.writeheader()
 
     def addSensorData(self, sensorData: SensorData):
-        if len(self.shotData) > 0:
+        if self._sample is not None:
             # Append onto the last shotData
-            self.shotData[-1].update(dict(sensorData.__dict__))
+            self._sample.update(sensorData.as_dict())
 
     def addShotData(self, shotData: ShotData):
+        self._writeSample()
         # Shotdata is not json serialziable and we dont need the profile entry multiple times
-        formated_data = {
+        self._sample = {
             "pressure": shotData.pressure,
             "flow": shotData.flow,
             "weight": shotData.weight,
@@ -45,44 +73,69 @@ class DebugData:
             "aux_setpoint": shotData.aux_setpoint,
             "is_aux_controller_active": shotData.is_aux_controller_active,
         }
-        self.shotData.append(formated_data)
-
-    def to_csv(self, file_path=None):
-        emptyShot = ShotData()
-        emptySensors = SensorData()
-
-        shotFields = list(emptyShot.__dict__.keys())
-        sensorFields = list(emptySensors.__dict__.keys())
-        classFields = ["startTime", "profile_ms"]
+        self.samples += 1
+
+    def _writeSample(self):
+        if self._sample is None:
+            return
+        row = {
+            "startTime": self.startTime,
+            "profile_ms": round(self._sample["profile_time"] * 1000),
+        }
+        for field in DebugData.FIELDS:
+            row[field] = self._sample.get(field, "")
+        self._writer.writerow(row)
+        self._sample = None
 
-        allFields = shotFields + sensorFields + classFields
+    def finish(self) -> bytes:
+        """Writes the last row and returns the compressed CSV"""
+        self._writeSample()
+        # Ends the zstd frame, the BytesIO stays open
+        self._text.close()
+        return self._output.getvalue()
 
-        output = io.StringIO()
-        writer = csv.DictWriter(output, fieldnames=allFields)
-        writer.writeheader()
 
-        for shotSample in self.shotData:
-            row = {
-                "startTime": self.startTime,
-                "profile_ms": round(shotSample["profile_time"] * 1000),
-            }
-            for sensor_field in shotFields + sensorFields:
-                row[sensor_field] = shotSample.get(sensor_field, "")
-            writer.writerow(row)
-        result = output.getvalue()
-        output.close()
+class ShotDebugManager:
+    _current_data: DebugData = None
+    WRITE_RETRIES = 1
 
-        return result
+    TELEMETRY = (
+        MessageType.DATA,
+        MessageType.SENSORS,
+        MachineEvent.ACTIVE,
+        MachineEvent.IDLE,
+    )
 
+    @staticmethod
+    def on_telemetry(kind, message):
+        """Consumes the TelemetryBus, records everything while the machine is active"""
+        if kind is MessageType.DATA:
+            ShotDebugManager.handleShotData(message)
+        elif kind is MessageType.SENSORS:
+            ShotDebugManager.handleSensorData(message)
+        elif kind is MachineEvent.ACTIVE:
+            ShotDebugManager.start()
+        elif kind is MachineEvent.IDLE:
+            ShotDebugManager.stop()
 
-class ShotDebugManager:
-    _current_data: DebugData = None
+    @staticmethod
+    def captureEnabled() -> bool:
+        """Whether the debug CSV would be saved or sent"""
+        return (
+            MeticulousConfig[CONFIG_USER][DEBUG_SHOT_DATA]
+            or MeticulousConfig[CONFIG_USER][MACHINE_DEBUG_SENDING] is True
+        )
 
     @staticmethod
     def start():
-        if ShotDebugManager._current_data is None:
-            ShotDebugManager._current_data = DebugData()
-            logger.info("Starting debug shot")
+        if ShotDebugManager._current_data is not None:
+            return
+        # The settings are only checked here, a change applies to the next shot
+        if not ShotDebugManager.captureEnabled():
+            logger.debug("Debug shot data is neither saved nor sent, not recording")
+            return
+        ShotDebugManager._current_data = DebugData()
+        logger.info("Starting debug shot")
 
     @staticmethod
     def handleSensorData(sensoData: SensorData):
@@ -111,16 +164,13 @@ class ShotDebugManager:
             file_name = f"{formatted_time}.debug.csv.zst"
             file_path = os.path.join(folder_path, file_name)
 
-            csv_data = ShotDebugManager._current_data.to_csv()
-
-            def compress_current_data(data_json):
+            def compress_current_data(debug_data):
                 # Compress and write the shot to disk
                 logger.info("Writing and compressing debug file")
                 start = time.time()
 
-                # Compress to a byte array first
-                cctx = zstd.ZstdCompressor(level=8)
-                compressed_data = cctx.compress(data_json.encode("utf-8"))
+                # Most of the CSV was compressed while the shot was running
+                compressed_data = debug_data.finish()
 
                 # Only write to file if enabled
                 if MeticulousConfig[CONFIG_USER][DEBUG_SHOT_DATA]:
@@ -129,7 +179,6 @@ class ShotDebugManager:
                         file.write(compressed_data)
                     time_ms = (time.time() - start) * 1000
                     logger.info(f"Writing debug csv to disc took {time_ms} ms")
-                    data_json = None
                 else:
                     logger.info("Debug shot data is disabled, skipping writing to disk")
 
@@ -139,10 +188,13 @@ class ShotDebugManager:
                     scope.set_context("config", MeticulousConfig.copy())
                     scope.capture_message("Debug shot data", level="info", scope=scope)
 
-            compresson_thread = NamedThread(
-                "DebugShotCompr", target=compress_current_data, args=(csv_data,)
+            HistoryWriter.submit(
+                "debug_file",
+                compress_current_data,
+                ShotDebugManager._current_data,
+                priority=WritePriority.DEBUG,
+                retries=ShotDebugManager.WRITE_RETRIES,
             )
-            compresson_thread.start()
 
             # Clear tracking data after saving
             ShotDebugManager._current_data = None
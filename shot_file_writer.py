@@ -0,0 +1,198 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import zstandard as zstd
+
+from history_writer import HistoryWriter
+from log import MeticulousLogger
+from shot_compression import ShotCompression
+
+logger = MeticulousLogger.getLogger(__name__)
+
+# Everything in front of the samples goes on the first line of the file
+DATA_KEY = ', "data": ['
+DATA_END = "\n]}"
+
+
+class ShotFileWriter:
+    """Compresses a shot file while the shot is still being recorded.
+
+    The file is written to `partial_path` in the format of the shot files:
+    The first line holds every key but "data", followed by one sample per
+    line. The compressor is flushed after every write so the file can be
+    decompressed up to the last written samples at any time, see
+    read_partial_shot(). finish() completes the JSON and renames the file.
+    All the work happens in HistoryWriter jobs, at most one is queued per
+    file and writes everything which piled up until it runs. They are
+    required jobs, a dropped job would leave the shot in INCOMPLETE_SHOT_PATH
+    until the next start.
+    """
+
+    def __init__(self, partial_path, level=None) -> None:
+        self.partial_path = partial_path
+        self.header = None
+        self.samples = 0
+        self.raw_bytes = 0
+
+        # Picked when the shot starts, the level of a frame can not change
+        self.level = level or ShotCompression.level()
+        self.compression_seconds = 0.0
+        self._started = time.monotonic()
+        self._queue = deque()
+        self._wakeup = threading.Condition()
+        self._scheduled = False
+        self._in_flight = False
+        self._failed = False
+        self._file = None
+        self._compressor = None
+
+    def write_header(self, header) -> None:
+        """`header` is every entry of the shot file but "data", sent first"""
+        self.header = header
+        self._put(json.dumps(header, ensure_ascii=False)[:-1] + DATA_KEY)
+
+    def write_samples(self, samples) -> None:
+        if not samples:
+            return
+        self._put(samples)
+
+    def finish(self, path, on_finished=None) -> None:
+        """Completes the file and moves it to `path`, then calls on_finished()"""
+        self._put((path, on_finished))
+
+    def flush(self, timeout=None) -> bool:
+        """Waits until everything queued so far has been written"""
+        with self._wakeup:
+            return self._wakeup.wait_for(
+                lambda: len(self._queue) == 0 and not self._in_flight, timeout
+            )
+
+    def _put(self, item) -> None:
+        with self._wakeup:
+            if self._failed:
+                return
+            self._queue.append(item)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        HistoryWriter.submit("shot_file", self._drain, required=True)
+
+    def _open(self) -> None:
+        os.makedirs(os.path.dirname(self.partial_path), exist_ok=True)
+        cctx = ShotCompression.compressor(self.level)
+        self._file = open(self.partial_path, "wb")
+        self._compressor = cctx.stream_writer(self._file, closefd=False)
+
+    def _write(self, text) -> None:
+        encoded = text.encode("utf-8")
+        self.raw_bytes += len(encoded)
+        start = time.thread_time()
+        self._compressor.write(encoded)
+        self._compressor.flush(zstd.FLUSH_BLOCK)
+        self.compression_seconds += time.thread_time() - start
+        self._file.flush()
+
+    def _write_samples(self, samples) -> None:
+        lines = [json.dumps(sample, ensure_ascii=False) for sample in samples]
+        separator = ",\n" if self.samples > 0 else "\n"
+        self._write(separator + ",\n".join(lines))
+        self.samples += len(samples)
+
+    def _finish(self, path, on_finished) -> None:
+        start = time.time()
+        self._write(DATA_END)
+        self._compressor.flush(zstd.FLUSH_FRAME)
+        self._compressor.close()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(self.partial_path, path)
+
+        compressed = os.path.getsize(path)
+        logger.info(
+            f"Wrote {self.samples} samples to {path}, {self.raw_bytes} bytes "
+            f"compressed to {compressed} bytes at level {self.level} in "
+            f"{self.compression_seconds * 1000:.0f} ms, finishing took "
+            f"{(time.time() - start) * 1000:.0f} ms"
+        )
+        ShotCompression.record_shot(
+            self.level, self.compression_seconds, time.monotonic() - self._started
+        )
+        if on_finished is not None:
+            on_finished()
+
+    def _drain(self) -> None:
+        while True:
+            with self._wakeup:
+                if not self._queue:
+                    self._scheduled = False
+                    self._wakeup.notify_all()
+                    return
+                item = self._queue.popleft()
+                self._in_flight = True
+
+            try:
+                if self._file is None:
+                    self._open()
+                if isinstance(item, str):
+                    self._write(item)
+                elif isinstance(item, list):
+                    self._write_samples(item)
+                else:
+                    self._finish(*item)
+            except Exception:
+                # Nothing after this is written, the partial file stays behind
+                # and is recovered on restart
+                with self._wakeup:
+                    self._failed = True
+                    self._queue.clear()
+                    self._scheduled = False
+                    self._in_flight = False
+                    self._wakeup.notify_all()
+                raise
+
+            with self._wakeup:
+                self._in_flight = False
+
+
+def read_partial_shot(partial_path):
+    """The shot stored in a file written by ShotFileWriter.
+
+    Reads as many samples as can be decompressed and parsed from a file which
+    was never finished. Returns None if not even the header can be read.
+    """
+    with open(partial_path, "rb") as file:
+        try:
+            decompressor = ShotCompression.decompressor(file.read(18)).decompressobj()
+        except Exception as e:
+            logger.warning(f"Can not decompress {partial_path}: {e}")
+            return None
+        file.seek(0)
+        chunks = []
+        for chunk in iter(lambda: file.read(64 * 1024), b""):
+            try:
+                chunks.append(decompressor.decompress(chunk))
+            except zstd.ZstdError as e:
+                logger.warning(f"{partial_path} is damaged after this point: {e}")
+                break
+
+    lines = b"".join(chunks).decode("utf-8", errors="ignore").split("\n")
+    if not lines[0].endswith(DATA_KEY):
+        return None
+    try:
+        shot = json.loads(lines[0][: -len(DATA_KEY)] + "}")
+    except json.JSONDecodeError:
+        return None
+
+    data = []
+    for line in lines[1:]:
+        try:
+            data.append(json.loads(line.rstrip(",")))
+        except json.JSONDecodeError:
+            # Either the end of the samples or a sample cut off by the crash
+            break
+    shot["data"] = data
+    return shot
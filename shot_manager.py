@@ -1,88 +1,307 @@
 import json
 import os
-from named_thread import NamedThread
 import time
-import traceback
 import uuid
+from array import array
+from dataclasses import fields
+from itertools import repeat
 from datetime import datetime
 from pathlib import Path
 
-import zstandard as zstd
-
 from esp_serial.connection.emulation_data import EmulationData
-from esp_serial.data import SensorData, ShotData
+from esp_serial.data import (
+    SensorData,
+    ShotData,
+    controller_setpoints,
+    sensorDataFields,
+)
+from esp_serial.dispatcher import MessageType
+from history_writer import HistoryWriter, WritePriority
 from log import MeticulousLogger
 from shot_database import ShotDataBase, SearchParams, SearchOrder
+from shot_compression import ShotCompression
+from shot_file_writer import ShotFileWriter, read_partial_shot
+from shot_summary import (
+    PREVIEW_CHANNELS,
+    ShotSummaryBackfill,
+    preview,
+    preview_shot,
+    summarize,
+    summarize_shot,
+)
+from telemetry_bus import MachineEvent
 
 logger = MeticulousLogger.getLogger(__name__)
 
 HISTORY_PATH = os.getenv("HISTORY_PATH", "/meticulous-user/history")
 SHOT_FOLDER = "shots"
 SHOT_PATH = Path(HISTORY_PATH).joinpath(SHOT_FOLDER)
+# Shots are written here while they are brewing and moved to SHOT_PATH at the end
+INCOMPLETE_SHOT_PATH = Path(HISTORY_PATH).joinpath("incomplete")
+
+
+# The ESP reports its values in hundredths (see BINARY_FIXED_POINT_SCALE), the
+# float32 columns reproduce them exactly once rounded back to this precision
+SHOT_COLUMN_DECIMALS = 2
+# String table index standing for None
+NO_STRING = 0xFFFF
+
+sensorColumnTypes = tuple(
+    "b" if field.type in (bool, "bool") else "f" for field in fields(SensorData)
+)
+
+
+def rounded(column):
+    """The values of a float32 column as the parser reported them"""
+    # NaN is the only value not equal to itself, the parser reports it as "NaN"
+    return [
+        value if value == value else "NaN"
+        for value in map(round, column, repeat(SHOT_COLUMN_DECIMALS))
+    ]
 
 
 class Shot:
+    """A shot being recorded, kept as one typed column per value.
+
+    Every Data message appends one row. The Sensors message following it is
+    stored in the sensor columns and referenced from `sensor_row`. Strings
+    (status and controller kinds) are interned into a per shot table and
+    stored as their index. The dicts of the shot files are only built by
+    to_json().
+    """
+
     def __init__(self) -> None:
-        self.shotData = []
         self.profile = None
         self.profile_name = None
         self.startTime = time.time()
         self.id = str(uuid.uuid4())
 
-    def addSensorData(self, sensorData: SensorData):
-        if len(self.shotData) > 0:
-            # Append onto the last shotData
-            self.shotData[-1]["sensors"] = dict(sensorData.__dict__)
+        self.time = array("l")
+        self.pressure = array("f")
+        self.flow = array("f")
+        self.weight = array("f")
+        self.gravimetric_flow = array("f")
+        self.status = array("H")
+        self.main_controller = array("H")
+        self.main_setpoint = array("f")
+        self.aux_controller = array("H")
+        self.aux_setpoint = array("f")
+        self.aux_active = array("b")
+        # Row in the sensor columns or -1 if no Sensors message followed yet
+        self.sensor_row = array("l")
+        self.sensors = tuple(array(typecode) for typecode in sensorColumnTypes)
+
+        self._strings = []
+        self._string_indices = {}
+
+        # In the order of the rows addShotData() appends
+        self._columns = (
+            self.time,
+            self.pressure,
+            self.flow,
+            self.weight,
+            self.gravimetric_flow,
+            self.status,
+            self.main_controller,
+            self.main_setpoint,
+            self.aux_controller,
+            self.aux_setpoint,
+            self.aux_active,
+        )
 
-    def addShotData(self, shotData: ShotData):
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def _intern(self, string) -> int:
+        if string is None:
+            return NO_STRING
+        index = self._string_indices.get(string)
+        if index is None:
+            index = len(self._strings)
+            self._strings.append(string)
+            self._string_indices[string] = index
+        return index
+
+    def _string(self, index):
+        return None if index == NO_STRING else self._strings[index]
+
+    def addSensorData(self, sensorData: SensorData):
+        if len(self.time) == 0:
+            return
+
+        # Converted first for the same reason as in addShotData()
+        values = [
+            bool(value) if typecode == "b" else float(value)
+            for value, typecode in zip(sensorData.as_tuple(), sensorColumnTypes)
+        ]
+        row = self.sensor_row[-1]
+        if row < 0:
+            self.sensor_row[-1] = len(self.sensors[0])
+            for column, value in zip(self.sensors, values):
+                column.append(value)
+        else:
+            # Only the latest Sensors message after a Data message is kept
+            for column, value in zip(self.sensors, values):
+                column[row] = value
+
+    def _resolveProfile(self, shotData: ShotData):
         from profiles import ProfileManager
 
         from machine import Machine
 
-        if self.profile_name is None and shotData.profile is not None:
+        # Special case the emulation case
+        if (
+            Machine.emulated
+            and shotData.profile == EmulationData.PROFILE_PLACEHOLDER
+            and ProfileManager.get_last_profile() is not None
+        ):
+            self.profile_name = ProfileManager.get_last_profile()["profile"]["name"]
+        else:
+            self.profile_name = shotData.profile
+
+        if self.profile is None:
+
+            last_profile = ProfileManager.get_last_profile()
 
-            # Special case the emulation case
             if (
-                Machine.emulated
-                and shotData.profile == EmulationData.PROFILE_PLACEHOLDER
-                and ProfileManager.get_last_profile() is not None
+                last_profile is not None
+                and last_profile.get("profile", None) is not None
+                and last_profile["profile"]["name"] == self.profile_name
             ):
-                self.profile_name = ProfileManager.get_last_profile()["profile"]["name"]
+                self.profile = last_profile["profile"]
             else:
-                self.profile_name = shotData.profile
+                self.profile = {}
 
-            if self.profile is None:
+    def addShotData(self, shotData: ShotData):
+        if self.profile_name is None and shotData.profile is not None:
+            self._resolveProfile(shotData)
+
+        # Everything is converted before the first append, a value failing to
+        # convert must not leave the columns with different lengths. The
+        # parser reports unparseable values as "NaN".
+        row = (
+            int(shotData.time),
+            float(shotData.pressure),
+            float(shotData.flow),
+            float(shotData.weight),
+            float(shotData.gravimetric_flow),
+            self._intern(shotData.status),
+            self._intern(shotData.main_controller_kind),
+            float(shotData.main_setpoint),
+            self._intern(shotData.aux_controller_kind),
+            float(shotData.aux_setpoint),
+            bool(shotData.is_aux_controller_active),
+        )
+        for column, value in zip(self._columns, row):
+            column.append(value)
+        self.sensor_row.append(-1)
+
+    def _sensorSamples(self, start, end):
+        columns = []
+        for column, typecode in zip(self.sensors, sensorColumnTypes):
+            if typecode == "b":
+                columns.append([bool(value) for value in column[start:end]])
+            else:
+                columns.append(rounded(column[start:end]))
+        return [dict(zip(sensorDataFields, values)) for values in zip(*columns)]
+
+    def _setpoints(self, start, end):
+        # Setpoints rarely change, samples with the same ones share their dict
+        known = {}
+        setpoints = []
+        for key in zip(
+            self.main_controller[start:end],
+            self.main_setpoint[start:end],
+            self.aux_controller[start:end],
+            self.aux_setpoint[start:end],
+            self.aux_active[start:end],
+        ):
+            entry = known.get(key)
+            if entry is None:
+                main, main_setpoint, aux, aux_setpoint, aux_active = key
+                entry = known[key] = controller_setpoints(
+                    self._string(main),
+                    round(main_setpoint, SHOT_COLUMN_DECIMALS),
+                    self._string(aux),
+                    round(aux_setpoint, SHOT_COLUMN_DECIMALS),
+                    bool(aux_active),
+                )
+            setpoints.append(entry)
+        return setpoints
+
+    def data(self, start=0, end=None):
+        """The samples [start:end] in the format of the shot files"""
+        end = len(self.time) if end is None else end
+        sensor_rows = [row for row in self.sensor_row[start:end] if row >= 0]
+        first_sensor_row = sensor_rows[0] if sensor_rows else 0
+        sensors = self._sensorSamples(
+            first_sensor_row, sensor_rows[-1] + 1 if sensor_rows else 0
+        )
+        strings = {**dict(enumerate(self._strings)), NO_STRING: None}
+        samples = []
+        for (
+            pressure,
+            flow,
+            weight,
+            gravimetric_flow,
+            setpoints,
+            sample_time,
+            status,
+            sensor_row,
+        ) in zip(
+            rounded(self.pressure[start:end]),
+            rounded(self.flow[start:end]),
+            rounded(self.weight[start:end]),
+            rounded(self.gravimetric_flow[start:end]),
+            self._setpoints(start, end),
+            self.time[start:end],
+            self.status[start:end],
+            self.sensor_row[start:end],
+        ):
+            sample = {
+                "shot": {
+                    "pressure": pressure,
+                    "flow": flow,
+                    "weight": weight,
+                    "gravimetric_flow": gravimetric_flow,
+                    "setpoints": setpoints,
+                },
+                "time": sample_time,
+                "status": strings[status],
+            }
+            if sensor_row >= 0:
+                sample["sensors"] = sensors[sensor_row - first_sensor_row]
+            samples.append(sample)
+        return samples
+
+    def summary(self, target_weight=None):
+        """The summary metrics stored with the shot in the history table"""
+        return summarize(
+            self.time, self.pressure, self.flow, self.weight, target_weight
+        )
 
-                last_profile = ProfileManager.get_last_profile()
+    def preview(self):
+        """The downsampled graphs stored with the shot in the history table"""
+        return preview(
+            self.time, {name: getattr(self, name) for name in PREVIEW_CHANNELS}
+        )
 
-                if (
-                    last_profile is not None
-                    and last_profile.get("profile", None) is not None
-                    and last_profile["profile"]["name"] == self.profile_name
-                ):
-                    self.profile = last_profile["profile"]
-                else:
-                    self.profile = {}
-
-        # Shotdata is not json serialziable and we dont need the profile entry multiple times
-        formated_data = {
-            "shot": {
-                "pressure": shotData.pressure,
-                "flow": shotData.flow,
-                "weight": shotData.weight,
-                "gravimetric_flow": shotData.gravimetric_flow,
-                "setpoints": shotData.to_sio().get("setPoints", {}),
-            },
-            "time": shotData.time,
-            "status": shotData.status,
+    def header(self):
+        """Every entry of to_json() but the samples"""
+        shot_dict = {
+            "time": self.startTime,
+            "profile_name": self.profile_name,
+            "id": self.id,
         }
-        self.shotData.append(formated_data)
+        if bool(self.profile):
+            shot_dict["profile"] = self.profile
+        return shot_dict
 
     def to_json(self):
         shot_dict = {
             "time": self.startTime,
             "profile_name": self.profile_name,
-            "data": self.shotData,
+            "data": self.data(),
             "id": self.id,
         }
         # empty dictionary evaluate to false
@@ -94,18 +313,64 @@ class Shot:
 class ShotManager:
     _last_shot: Shot = None
     _current_shot: Shot = None
+    _current_writer: ShotFileWriter = None
+    # Samples of the current shot handed to _current_writer
+    _written_samples = 0
+
+    # Samples are compressed in chunks of this size while brewing
+    WRITE_CHUNK_SAMPLES = 25
+    DATABASE_RETRIES = 2
+
+    TELEMETRY = (
+        MessageType.DATA,
+        MessageType.SENSORS,
+        MachineEvent.BREWING_START,
+        MachineEvent.BREWING_END,
+    )
 
     # The ShotDatabase is required to work once we use the ShotManager.
     # We therefore initialize it here
     @staticmethod
     def init():
         ShotDataBase.init()
+        ShotCompression.init()
         logger = MeticulousLogger.getLogger(__name__)
         logger.info("ShotManager initialized successfully")
 
+    @staticmethod
+    def maintainHistory():
+        """Queues the history upkeep, needs the database migrations to be done"""
+        HistoryWriter.submit(
+            "shot_recovery",
+            ShotManager.recoverIncompleteShots,
+            priority=WritePriority.MAINTENANCE,
+        )
+        HistoryWriter.submit(
+            "shot_dictionary",
+            ShotCompression.refresh_dictionary,
+            SHOT_PATH,
+            priority=WritePriority.MAINTENANCE,
+        )
+        ShotSummaryBackfill.start()
+
     @staticmethod
     def start():
         ShotManager._current_shot = Shot()
+        ShotManager._current_writer = None
+        ShotManager._written_samples = 0
+
+    @staticmethod
+    def on_telemetry(kind, message):
+        """Consumes the TelemetryBus, a shot is recorded while Machine is brewing"""
+        if kind is MessageType.DATA:
+            if message.is_extracting:
+                ShotManager.handleShotData(message)
+        elif kind is MessageType.SENSORS:
+            ShotManager.handleSensorData(message)
+        elif kind is MachineEvent.BREWING_START:
+            ShotManager.start()
+        elif kind is MachineEvent.BREWING_END:
+            ShotManager.stop()
 
     @staticmethod
     def handleSensorData(sensoData: SensorData):
@@ -116,6 +381,33 @@ class ShotManager:
     def handleShotData(shotData: ShotData):
         if shotData is not None and ShotManager._current_shot is not None:
             ShotManager._current_shot.addShotData(shotData)
+            ShotManager._writeSamples()
+
+    @staticmethod
+    def _writeSamples(final=False):
+        """Hands the samples recorded since the last call to the file writer"""
+        shot = ShotManager._current_shot
+        # The latest sample still changes if a Sensors message follows
+        end = len(shot) if final else len(shot) - 1
+        start = ShotManager._written_samples
+        if not final and end - start < ShotManager.WRITE_CHUNK_SAMPLES:
+            return
+
+        if ShotManager._current_writer is None:
+            ShotManager._current_writer = ShotFileWriter(
+                INCOMPLETE_SHOT_PATH.joinpath(f"{shot.id}.shot.json.zst")
+            )
+            header = shot.header()
+            if header.get("profile") is None:
+                from profiles import ProfileManager
+
+                last_profile = ProfileManager.get_last_profile()
+                if last_profile is not None:
+                    header["profile"] = last_profile.get("profile")
+            ShotManager._current_writer.write_header(header)
+
+        ShotManager._current_writer.write_samples(shot.data(start, end))
+        ShotManager._written_samples = end
 
     @staticmethod
     def _timestampToFilePaths(timestamp: float):
@@ -130,16 +422,18 @@ class ShotManager:
         return (folder_name, file_path)
 
     @staticmethod
-    def getCurrentShot():
-        if not ShotManager._current_shot:
-            return None
-
+    def _formatedProfile(shot):
         formated_profile = {
             "db_key": None,
         }
-        if ShotManager._current_shot.profile:
-            profile = ShotManager._current_shot.profile
-            formated_profile = {**formated_profile, **profile}
+        if shot.profile:
+            formated_profile = {**formated_profile, **shot.profile}
+        return formated_profile
+
+    @staticmethod
+    def getCurrentShot():
+        if not ShotManager._current_shot:
+            return None
 
         (_folder_name, file_path) = ShotManager._timestampToFilePaths(
             ShotManager._current_shot.startTime
@@ -149,8 +443,53 @@ class ShotManager:
             "db_key": None,
             "file": str(file_path),
             **ShotManager._current_shot.to_json(),
-            "profile": formated_profile,
+            "profile": ShotManager._formatedProfile(ShotManager._current_shot),
+        }
+
+        return current_formated_shot
+
+    @staticmethod
+    def currentShotCursor(since: int):
+        """(shot id, since, next) of a poll of the current shot from `since`.
+
+        The latest sample still changes if a Sensors message follows, it is
+        left for the next poll. `next` is the index to continue from. A
+        cursor past the end of the shot, such as one kept from the previous
+        shot, starts over from 0. Cheap enough to be compared as ETag before
+        any sample is built.
+        """
+        shot = ShotManager._current_shot
+        if not shot:
+            return None
+        if since > len(shot):
+            since = 0
+        return (shot.id, since, max(len(shot) - 1, since))
+
+    @staticmethod
+    def getCurrentShotSince(cursor):
+        """getCurrentShot() with only the samples of a currentShotCursor().
+
+        The profile is only included when polling from the start. None if
+        the shot of the cursor is no longer recorded.
+        """
+        (shot_id, since, end) = cursor
+        shot = ShotManager._current_shot
+        if not shot or shot.id != shot_id:
+            return None
+
+        (_folder_name, file_path) = ShotManager._timestampToFilePaths(shot.startTime)
+        current_formated_shot = {
+            "db_key": None,
+            "file": str(file_path),
+            **shot.header(),
+            "since": since,
+            "next": end,
+            "data": shot.data(since, end),
         }
+        if since == 0:
+            current_formated_shot["profile"] = ShotManager._formatedProfile(shot)
+        else:
+            current_formated_shot.pop("profile", None)
 
         return current_formated_shot
 
@@ -164,75 +503,102 @@ class ShotManager:
                 ShotManager._last_shot = results[0]
         return ShotManager._last_shot
 
+    @staticmethod
+    def _addToDatabase(entry):
+        # Runs as HistoryWriter job, which logs and retries failures
+        logger.info("Adding shot to sqlite database")
+        start = time.time()
+        ShotDataBase.insert_history(entry)
+        ShotManager._last_shot = None
+        ShotManager.getLastShot()
+        time_ms = (time.time() - start) * 1000
+        logger.info(f"Ingesting shot into sqlite took {time_ms} ms")
+
+    @staticmethod
+    def _queueDatabaseInsert(entry):
+        HistoryWriter.submit(
+            "shot_database",
+            ShotManager._addToDatabase,
+            entry,
+            retries=ShotManager.DATABASE_RETRIES,
+        )
+
+    @staticmethod
+    def _finishShot(shot, entry):
+        # Runs in the HistoryWriter job finishing the file, the shot is no
+        # longer recorded into so the IOLoop does not wait for this
+        entry["summary"] = shot.summary(
+            (entry.get("profile") or {}).get("final_weight")
+        )
+        entry["preview"] = shot.preview()
+        ShotManager._queueDatabaseInsert(entry)
+
     @staticmethod
     def stop():
         if ShotManager._current_shot is not None:
+            ShotManager._writeSamples(final=True)
+            writer = ShotManager._current_writer
 
-            shot_data = ShotManager._current_shot.to_json()
-            if shot_data.get("profile") is None:
-                from profiles import ProfileManager
+            # Determine the paths based on the shot start
+            (_folder_name, file_path) = ShotManager._timestampToFilePaths(
+                ShotManager._current_shot.startTime
+            )
+            entry = {**writer.header, "file": str(file_path)}
+            shot = ShotManager._current_shot
+
+            # The writer completes and renames the file in its own thread
+            logger.info("Finishing shot file")
+            writer.finish(
+                SHOT_PATH.joinpath(file_path),
+                on_finished=lambda: ShotManager._finishShot(shot, entry),
+            )
 
-                last_profile = ProfileManager.get_last_profile()
-                if last_profile is not None:
-                    shot_data["profile"] = last_profile.get("profile")
+            # Shift and clear shot handles after saving
+            ShotManager._current_shot = None
+            ShotManager._current_writer = None
+
+    @staticmethod
+    def recoverIncompleteShots():
+        """Completes the shot files left behind by a crash while brewing"""
+        if not INCOMPLETE_SHOT_PATH.is_dir():
+            return
+
+        for partial_path in sorted(INCOMPLETE_SHOT_PATH.glob("*.shot.json.zst")):
+            try:
+                shot_data = read_partial_shot(partial_path)
+                if shot_data is None:
+                    logger.warning(f"Could not read incomplete shot {partial_path}")
+                    partial_path.rename(partial_path.with_suffix(".unreadable"))
+                    continue
 
-            def write_current_shot(shot_data):
-                # Determine the paths based on the shot start
                 (folder_name, file_path) = ShotManager._timestampToFilePaths(
                     shot_data["time"]
                 )
-
-                # Compress and write the shot to disk
-                logger.info("Writing and compressing shot file")
-                start = time.time()
-
-                try:
-                    # Create the folder if it does not exist
-                    os.makedirs(SHOT_PATH.joinpath(folder_name), exist_ok=True)
-                    data_json = json.dumps(shot_data, ensure_ascii=False)
-                    with open(SHOT_PATH.joinpath(file_path), "wb") as file:
-                        cctx = zstd.ZstdCompressor(level=22)
-                        with cctx.stream_writer(file) as compressor:
-                            compressor.write(data_json.encode("utf-8"))
-                    data_json = None
-
-                except Exception as e:
-                    logger.error(f"Failed to write shotfile to disk: {e}")
-                    logger.error(traceback.format_exc())
-                    shot_data = None
-                    return
-                else:
-                    time_ms = (time.time() - start) * 1000
-                    logger.info(f"Writing json to disc took {time_ms} ms")
-
-                # Add to SQLite database, it will compress automatically
-                logger.info("Adding shot to sqlite database")
-                start = time.time()
-
-                try:
-                    dbEntry = shot_data
-                    dbEntry["file"] = str(file_path)
-                    ShotDataBase.insert_history(shot_data)
-                    ShotManager._last_shot = None
-                    ShotManager.getLastShot()
-                except Exception as e:
-                    logger.error(f"Failed to insert shot into sqlite: {e}")
-                    logger.error(traceback.format_exc())
-                else:
-                    time_ms = (time.time() - start) * 1000
-                    logger.info(f"Ingesting shot into sqlite took {time_ms} ms")
-                shot_data = None
-
-            compresson_thread = NamedThread(
-                "ShotCompr",
-                target=write_current_shot,
-                args=(shot_data,),
+                os.makedirs(SHOT_PATH.joinpath(folder_name), exist_ok=True)
+                data_json = json.dumps(shot_data, ensure_ascii=False)
+                cctx = ShotCompression.compressor()
+                with open(SHOT_PATH.joinpath(file_path), "wb") as file:
+                    file.write(cctx.compress(data_json.encode("utf-8")))
+                partial_path.unlink()
+                logger.info(
+                    f"Recovered {len(shot_data['data'])} samples of an incomplete "
+                    f"shot into {file_path}"
+                )
+            except Exception as e:
+                logger.error(f"Failed to recover incomplete shot {partial_path}: {e}")
+                continue
+
+            summary = summarize_shot(shot_data)
+            shot_preview = preview_shot(shot_data)
+            shot_data.pop("data")
+            ShotManager._queueDatabaseInsert(
+                {
+                    **shot_data,
+                    "file": str(file_path),
+                    "summary": summary,
+                    "preview": shot_preview,
+                }
             )
-            compresson_thread.start()
-
-            # Shift and clear shot handles after saving
-            ShotManager._current_shot.profile = None
-            ShotManager._current_shot = None
 
 
 def test():
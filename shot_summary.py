@@ -0,0 +1,228 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from history_writer import HistoryWriter, WritePriority
+from log import MeticulousLogger
+from shot_compression import ShotCompression
+from shot_database import ShotDataBase
+
+logger = MeticulousLogger.getLogger(__name__)
+
+SUMMARY_DECIMALS = 2
+# Points per channel of the graph previews in the history list
+PREVIEW_POINTS = 100
+PREVIEW_CHANNELS = ("pressure", "flow", "weight", "gravimetric_flow")
+
+
+def numeric(column):
+    """The numbers of a sample column, without NaN or the "NaN" strings"""
+    return [
+        value for value in column if isinstance(value, (int, float)) and value == value
+    ]
+
+
+def summarize(times, pressures, flows, weights, target_weight=None):
+    """The summary metrics of a shot from its sample columns.
+
+    The shot files hold no dose, `ratio` is the final weight relative to the
+    final weight of the profile.
+    """
+    pressures = numeric(pressures)
+    flows = numeric(flows)
+    weights = numeric(weights)
+    times = numeric(times)
+
+    final_weight = weights[-1] if weights else None
+    summary = {
+        "peak_pressure": max(pressures) if pressures else None,
+        # Milliseconds since the start of the shot
+        "total_time": times[-1] / 1000 if times else None,
+        "final_weight": final_weight,
+        "average_flow": sum(flows) / len(flows) if flows else None,
+        "ratio": (
+            final_weight / target_weight
+            if final_weight is not None and target_weight
+            else None
+        ),
+    }
+    return {
+        key: round(value, SUMMARY_DECIMALS) if value is not None else None
+        for key, value in summary.items()
+    }
+
+
+def summarize_shot(shot):
+    """summarize() for a shot in the format of the shot files"""
+    data = shot.get("data") or []
+    profile = shot.get("profile") or {}
+    return summarize(
+        [sample.get("time") for sample in data],
+        [sample["shot"].get("pressure") for sample in data],
+        [sample["shot"].get("flow") for sample in data],
+        [sample["shot"].get("weight") for sample in data],
+        profile.get("final_weight"),
+    )
+
+
+def downsample(times, values, points=PREVIEW_POINTS):
+    """[[time, value], ...] of at most `points` samples keeping the shape.
+
+    Largest-Triangle-Three-Buckets: the first and last samples are kept and
+    the others are split into points - 2 buckets. Of every bucket the sample
+    forming the largest triangle with the sample picked from the previous
+    bucket and the average of the next bucket is picked.
+    """
+    series = [
+        [time, value]
+        for time, value in zip(times, values)
+        if isinstance(value, (int, float)) and value == value
+    ]
+    if points < 3 or len(series) <= points:
+        return series
+
+    picked = [series[0]]
+    bucket_size = (len(series) - 2) / (points - 2)
+    for bucket in range(points - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, len(series))
+        next_bucket = series[end:next_end] or series[-1:]
+        average_time = sum(time for time, _ in next_bucket) / len(next_bucket)
+        average_value = sum(value for _, value in next_bucket) / len(next_bucket)
+
+        (picked_time, picked_value) = picked[-1]
+        largest_area = -1
+        for time, value in series[start:end]:
+            # Twice the area of the triangle, only compared
+            area = abs(
+                (picked_time - average_time) * (value - picked_value)
+                - (picked_time - time) * (average_value - picked_value)
+            )
+            if area > largest_area:
+                largest_area = area
+                candidate = [time, value]
+        picked.append(candidate)
+    picked.append(series[-1])
+    return picked
+
+
+def preview(times, channels):
+    """The downsampled graph of every channel in PREVIEW_CHANNELS"""
+    return {
+        name: [
+            [time, round(value, SUMMARY_DECIMALS)]
+            for time, value in downsample(times, channels[name])
+        ]
+        for name in PREVIEW_CHANNELS
+    }
+
+
+def preview_shot(shot):
+    """preview() for a shot in the format of the shot files"""
+    data = shot.get("data") or []
+    return preview(
+        [sample.get("time") for sample in data],
+        {
+            name: [sample["shot"].get(name) for sample in data]
+            for name in PREVIEW_CHANNELS
+        },
+    )
+
+
+def _summarize_shot_file(path):
+    # Runs in the backfill processes
+    try:
+        shot = json.loads(ShotCompression.read(path))
+        return (summarize_shot(shot), preview_shot(shot))
+    except Exception as e:
+        logger.warning(f"Could not summarize {path}: {e}")
+        return None
+
+
+class ShotSummaryBackfill:
+    """Computes the summaries and previews of the shots recorded before they
+    were stored.
+
+    The shot files are parsed by a pool of processes, BATCH_SIZE at a time in
+    the order of their history id. Every batch runs as its own HistoryWriter
+    job so new shots are written in between.
+    """
+
+    BATCH_SIZE = 32
+    WORKERS = min(4, os.cpu_count() or 1)
+
+    _pool: ProcessPoolExecutor = None
+    # History id of the last shot looked at
+    _cursor = 0
+    summarized = 0
+    failed = 0
+
+    @staticmethod
+    def start() -> None:
+        ShotSummaryBackfill._cursor = 0
+        ShotSummaryBackfill._submit_batch()
+
+    @staticmethod
+    def _submit_batch() -> None:
+        HistoryWriter.submit(
+            "shot_summary_backfill",
+            ShotSummaryBackfill.run_batch,
+            priority=WritePriority.MAINTENANCE,
+            retries=1,
+        )
+
+    @staticmethod
+    def run_batch() -> None:
+        from shot_manager import SHOT_PATH
+
+        pending = ShotDataBase.history_without_summary(
+            ShotSummaryBackfill._cursor, ShotSummaryBackfill.BATCH_SIZE
+        )
+        if not pending:
+            ShotSummaryBackfill._stop()
+            return
+
+        if ShotSummaryBackfill._pool is None:
+            logger.info("Computing the summaries of older shots")
+            # Forking the threaded backend is not safe, the workers start fresh
+            ShotSummaryBackfill._pool = ProcessPoolExecutor(
+                ShotSummaryBackfill.WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+        paths = [SHOT_PATH.joinpath(file) for (_key, file) in pending]
+        try:
+            summaries = list(ShotSummaryBackfill._pool.map(_summarize_shot_file, paths))
+        except Exception:
+            # A crashed worker breaks the whole pool
+            ShotSummaryBackfill._pool.shutdown(cancel_futures=True)
+            ShotSummaryBackfill._pool = None
+            raise
+
+        for (key, _file), result in zip(pending, summaries):
+            ShotSummaryBackfill._cursor = key
+            if result is None:
+                # The empty preview marks the shot as processed
+                ShotDataBase.store_summary(key, {}, {})
+                ShotSummaryBackfill.failed += 1
+                continue
+            (summary, shot_preview) = result
+            ShotDataBase.store_summary(key, summary, shot_preview)
+            ShotSummaryBackfill.summarized += 1
+
+        if len(pending) < ShotSummaryBackfill.BATCH_SIZE:
+            ShotSummaryBackfill._stop()
+        else:
+            ShotSummaryBackfill._submit_batch()
+
+    @staticmethod
+    def _stop() -> None:
+        if ShotSummaryBackfill._pool is not None:
+            ShotSummaryBackfill._pool.shutdown()
+            ShotSummaryBackfill._pool = None
+            logger.info(
+                f"Summarized {ShotSummaryBackfill.summarized} older shots, "
+                f"{ShotSummaryBackfill.failed} could not be read"
+            )
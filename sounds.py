@@ -5,6 +5,7 @@ from play_sound import playsound
 import subprocess
 
 from log import MeticulousLogger
+from telemetry_bus import MachineEvent
 from config import (
     MeticulousConfig,
     CONFIG_USER,
@@ -30,6 +31,15 @@ class Sounds(Enum):
     NOTIFICATION = auto()
 
 
+MACHINE_EVENT_SOUNDS = {
+    MachineEvent.BREWING_START: Sounds.BREWING_START,
+    MachineEvent.BREWING_END: Sounds.BREWING_END,
+    MachineEvent.IDLE: Sounds.IDLE,
+    MachineEvent.HEATING_START: Sounds.HEATING_START,
+    MachineEvent.HEATING_END: Sounds.HEATING_END,
+}
+
+
 class SoundPlayer:
     SUPPORTED_FORMATS = [".mp3", ".wav", ".ogg", ".flac"]
     DEFAULT_THEME_NAME = "default"
@@ -141,6 +151,13 @@ class SoundPlayer:
         except Exception:
             return {}
 
+    @staticmethod
+    def on_telemetry(kind, message):
+        """Consumes the MachineEvents of the TelemetryBus"""
+        sound_event = MACHINE_EVENT_SOUNDS.get(kind)
+        if sound_event is not None:
+            SoundPlayer.play_event_sound(sound_event)
+
     @staticmethod
     def play_event_sound(sound_event: Sounds):
         return SoundPlayer.play_sound(sound_event.name.lower())
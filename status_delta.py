@@ -0,0 +1,70 @@
+_MISSING = object()
+
+
+class StatusDeltaEncoder:
+    """Turns the `status` dicts emitted by live() into a delta stream.
+
+    Every frame carries a sequence number. A keyframe holds the complete
+    status, all other frames only the top level keys which changed since the
+    previous frame (and the keys which disappeared, in `removed`). Clients
+    apply the frames in order and wait for the next keyframe if they notice a
+    gap in the sequence numbers. A keyframe is sent every KEYFRAME_INTERVAL
+    encoded statuses and whenever request_keyframe() was called, e.g. for a
+    new client.
+    """
+
+    KEYFRAME_INTERVAL = 50
+
+    def __init__(self, keyframe_interval=None) -> None:
+        self.keyframe_interval = (
+            keyframe_interval or StatusDeltaEncoder.KEYFRAME_INTERVAL
+        )
+        self.seq = 0
+        self._previous = None
+        self._since_keyframe = 0
+        self._keyframe_requested = True
+
+    def request_keyframe(self) -> None:
+        self._keyframe_requested = True
+
+    def encode(self, status):
+        """Returns the frame for `status` or None if nothing changed"""
+        keyframe = (
+            self._keyframe_requested
+            or self._previous is None
+            or self._since_keyframe >= self.keyframe_interval - 1
+        )
+
+        if keyframe:
+            frame = {"seq": self.seq, "keyframe": True, "data": status}
+            self._keyframe_requested = False
+            self._since_keyframe = 0
+        else:
+            previous = self._previous
+            changed = {
+                key: value
+                for key, value in status.items()
+                if previous.get(key, _MISSING) != value
+            }
+            removed = [key for key in previous if key not in status]
+            if not changed and not removed:
+                self._since_keyframe += 1
+                return None
+            frame = {"seq": self.seq, "keyframe": False, "data": changed}
+            if removed:
+                frame["removed"] = removed
+            self._since_keyframe += 1
+
+        self._previous = status
+        self.seq += 1
+        return frame
+
+
+def apply_status_delta(status, frame):
+    """Client side of StatusDeltaEncoder, returns the updated status"""
+    if frame["keyframe"]:
+        return dict(frame["data"])
+    status = {**status, **frame["data"]}
+    for key in frame.get("removed", ()):
+        status.pop(key, None)
+    return status
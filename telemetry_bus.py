@@ -0,0 +1,210 @@
+from enum import Enum, auto, unique
+
+import tornado.ioloop
+
+from log import MeticulousLogger
+
+logger = MeticulousLogger.getLogger(__name__)
+
+
+@unique
+class MachineEvent(Enum):
+    # State changes Machine derives from the Data messages, published next to them
+    BREWING_START = auto()
+    BREWING_END = auto()
+    ACTIVE = auto()
+    IDLE = auto()
+    HEATING_START = auto()
+    HEATING_END = auto()
+
+
+class TelemetrySubscription:
+    """A consumers view onto the TelemetryBus.
+
+    Every subscription keeps its own cursor (the sequence number of the next
+    message it will see), so consumers progress independently of each other.
+    A consumer which falls more than TelemetryBus.SIZE messages behind loses
+    the oldest ones, which is counted in `dropped`.
+    """
+
+    def __init__(self, name, callback=None, kinds=None, timestamps=False) -> None:
+        self.name = name
+        self.callback = callback
+        self.kinds = frozenset(kinds) if kinds is not None else None
+        self.timestamps = timestamps
+        self.cursor = TelemetryBus._next_seq
+        self.delivered = 0
+        self.dropped = 0
+        self.max_lag = 0
+        self._loop = None
+        self._scheduled = False
+
+    @property
+    def lag(self) -> int:
+        """Number of messages published but not yet consumed"""
+        return TelemetryBus._next_seq - self.cursor
+
+    def poll(self):
+        """Returns the (seq, kind, message, timestamp) published since the last poll"""
+        ring = TelemetryBus._ring
+        messages = []
+        head = TelemetryBus._next_seq
+        self.max_lag = max(self.max_lag, head - self.cursor)
+        while self.cursor < head:
+            oldest = TelemetryBus._next_seq - TelemetryBus.SIZE
+            if self.cursor < oldest:
+                self.dropped += oldest - self.cursor
+                self.cursor = oldest
+                continue
+
+            entry = ring[self.cursor & TelemetryBus.MASK]
+            # The producer never waits for us. A newer sequence number means the
+            # slot got reused while we were reading, the check above skips it
+            if entry[0] > self.cursor:
+                continue
+            if entry[0] < self.cursor:
+                break
+            self.cursor += 1
+            if self.kinds is None or entry[1] in self.kinds:
+                messages.append(entry)
+        self.delivered += len(messages)
+        return messages
+
+    def drain(self) -> None:
+        """Hands every pending message to the callback"""
+        self._scheduled = False
+        for _seq, kind, message, timestamp in self.poll():
+            try:
+                if self.timestamps:
+                    self.callback(kind, message, timestamp)
+                else:
+                    self.callback(kind, message)
+            except Exception as e:
+                logger.error(f"Telemetry consumer {self.name} failed", exc_info=e)
+
+    def stats(self):
+        return {
+            "cursor": self.cursor,
+            "lag": self.lag,
+            "max_lag": self.max_lag,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+class LatencyCounter:
+    """Debug counter for the time telemetry takes through the backend"""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.last = 0.0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds) -> None:
+        self.count += 1
+        self.last = seconds
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def stats(self):
+        return {
+            "count": self.count,
+            "last_ms": self.last * 1000,
+            "avg_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "max_ms": self.max * 1000,
+        }
+
+
+class TelemetryBus:
+    """Single producer, multi consumer ring of the parsed ESP messages.
+
+    Machine publishes every message it parsed (and the MachineEvents derived
+    from them) together with a sequence number and, for the messages, the
+    time.monotonic() they were read at. Publishing never blocks or takes a
+    lock: the message is written into its slot of a fixed size ring and the
+    sequence number is bumped afterwards, slow consumers simply lose the
+    oldest messages.
+
+    Consumers subscribe with a callback, which is scheduled on the IOLoop of
+    the subscribing thread after new messages arrived, or poll their
+    subscription whenever it suits them.
+    """
+
+    SIZE = 1024
+    MASK = SIZE - 1
+
+    _ring = [(-1, None, None, None)] * SIZE
+    _next_seq = 0
+    _subscriptions = {}
+    _latency = {}
+    _counters = {}
+
+    @staticmethod
+    def publish(kind, message=None, timestamp=None) -> int:
+        seq = TelemetryBus._next_seq
+        TelemetryBus._ring[seq & TelemetryBus.MASK] = (seq, kind, message, timestamp)
+        TelemetryBus._next_seq = seq + 1
+
+        for subscription in TelemetryBus._subscriptions.values():
+            if (
+                subscription._loop is not None
+                and not subscription._scheduled
+                and (subscription.kinds is None or kind in subscription.kinds)
+            ):
+                subscription._scheduled = True
+                subscription._loop.add_callback(subscription.drain)
+        return seq
+
+    @staticmethod
+    def subscribe(
+        name, callback=None, kinds=None, timestamps=False
+    ) -> TelemetrySubscription:
+        """Subscribes to all messages published from now on.
+
+        With a callback, callback(kind, message) is invoked for every message on
+        the callers IOLoop, callback(kind, message, timestamp) with `timestamps`.
+        Without one the subscription has to be polled. Subscribing again under
+        the same name replaces the previous subscription.
+        """
+        subscription = TelemetrySubscription(name, callback, kinds, timestamps)
+        if callback is not None:
+            subscription._loop = tornado.ioloop.IOLoop.current()
+        # Copy on write, publish() iterates the dict without taking a lock
+        TelemetryBus._subscriptions = {
+            **TelemetryBus._subscriptions,
+            name: subscription,
+        }
+        return subscription
+
+    @staticmethod
+    def unsubscribe(name) -> None:
+        subscriptions = dict(TelemetryBus._subscriptions)
+        subscriptions.pop(name, None)
+        TelemetryBus._subscriptions = subscriptions
+
+    @staticmethod
+    def latency(name) -> LatencyCounter:
+        """The latency counter `name`, reported in stats()"""
+        if name not in TelemetryBus._latency:
+            TelemetryBus._latency[name] = LatencyCounter()
+        return TelemetryBus._latency[name]
+
+    @staticmethod
+    def count(name, amount=1) -> None:
+        """Adds to the debug counter `name`, reported in stats()"""
+        TelemetryBus._counters[name] = TelemetryBus._counters.get(name, 0) + amount
+
+    @staticmethod
+    def stats():
+        return {
+            "published": TelemetryBus._next_seq,
+            "subscriptions": {
+                name: subscription.stats()
+                for name, subscription in TelemetryBus._subscriptions.items()
+            },
+            "latency": {
+                name: counter.stats() for name, counter in TelemetryBus._latency.items()
+            },
+            "counters": dict(TelemetryBus._counters),
+        }
@@ -0,0 +1,108 @@
+import math
+import unittest
+
+from config import CONFIG_USER, GET_ACCESSORY_DATA, MeticulousConfig
+from esp_serial.connection.emulation_data import EmulationData
+from esp_serial.connection.emulator_serial_connection import EmulatorSerialConnection
+from esp_serial.data import BINARY_NAN, SensorData, ShotData, sensorDataStruct
+from esp_serial.dispatcher import FRAME_TYPE_SENSORS, MessageDispatcher, MessageType
+from esp_serial.framer import SerialFramer, encode_frame
+
+
+class TestBinaryTelemetry(unittest.TestCase):
+
+    def setUp(self):
+        self.accessory_data = MeticulousConfig[CONFIG_USER][GET_ACCESSORY_DATA]
+        MeticulousConfig[CONFIG_USER][GET_ACCESSORY_DATA] = False
+
+        self.lines = [
+            line.strip(" \t\r\n")
+            for source in [
+                EmulationData.IDLE_DATA,
+                EmulationData.PURGE_DATA,
+                EmulationData.ESPRESSO_DATA,
+            ]
+            for line in source
+            if line.startswith(("Data,", "Sensors,"))
+        ]
+
+    def tearDown(self):
+        MeticulousConfig[CONFIG_USER][GET_ACCESSORY_DATA] = self.accessory_data
+
+    def test_frames_decode_like_text(self):
+        self.assertGreater(len(self.lines), 0)
+        for line in self.lines:
+            frame = EmulatorSerialConnection.to_binary_frame(line)
+            self.assertIsNotNone(frame, line)
+            self.assertEqual(
+                MessageDispatcher.parse_frame(memoryview(frame)),
+                MessageDispatcher.parse(line),
+                line,
+            )
+
+    def test_mixed_stream(self):
+        stream = bytearray()
+        for line in self.lines[:50]:
+            stream += EmulatorSerialConnection.to_binary_frame(line)
+            stream += b"ESPInfo,1.2.3,1,24.0\r\n"
+
+        framer = SerialFramer(size=256)
+        messages = []
+        for offset in range(0, len(stream), 7):
+            framer.feed(stream[offset : offset + 7])
+            for line in framer.lines():
+                if line[0] == 0x02:
+                    messages.append(MessageDispatcher.parse_frame(line)[0])
+                else:
+                    messages.append(
+                        MessageDispatcher.parse(str(line, "utf-8").strip())[0]
+                    )
+
+        self.assertEqual(len(messages), 100)
+        self.assertEqual(messages[1::2], [MessageType.ESP_INFO] * 50)
+        self.assertNotIn(MessageType.UNKNOWN, messages)
+        self.assertEqual(framer.corrupt_frames, 0)
+
+    def test_corrupt_frame_is_skipped(self):
+        frame = bytearray(EmulatorSerialConnection.to_binary_frame(self.lines[0]))
+        frame[-1] ^= 0xFF
+        framer = SerialFramer()
+        framer.feed(bytes(frame) + b"\nESPInfo,1.2.3,1,24.0\r\n")
+        lines = [bytes(line) for line in framer.lines()]
+        self.assertEqual(lines[-1], b"ESPInfo,1.2.3,1,24.0\r\n")
+        self.assertEqual(framer.corrupt_frames, 1)
+
+    def test_nan_values(self):
+        values = [BINARY_NAN] + [150] * 19 + [True, 0]
+        frame = encode_frame(FRAME_TYPE_SENSORS, sensorDataStruct.pack(*values))
+        (_, sensor) = MessageDispatcher.parse_frame(memoryview(frame))
+        self.assertEqual(sensor.external_1, 0)
+        self.assertEqual(sensor.external_2, 1.5)
+        self.assertTrue(sensor.water_status)
+
+        shot = ShotData(float("nan"), 1.0, 2.0, 3.0, "idle", "idle")
+        decoded = ShotData.from_binary(shot.to_binary())
+        self.assertEqual(decoded.pressure, "NaN")
+        self.assertEqual(decoded.state, "idle")
+
+    def test_nan_setpoints_decode_like_text(self):
+        line = "Data,NaN,2.5,36.1,92.4,infusion,Italian limbus,Pressure,nan,Flow,nan,true,1.2"
+        frame = EmulatorSerialConnection.to_binary_frame(line)
+        (_, text) = MessageDispatcher.parse(line)
+        (_, binary) = MessageDispatcher.parse_frame(memoryview(frame))
+        for decoded in (text, binary):
+            self.assertIsInstance(decoded.main_setpoint, float)
+            self.assertTrue(math.isnan(decoded.main_setpoint))
+            self.assertTrue(math.isnan(decoded.aux_setpoint))
+        # NaN is not equal to itself, the setpoints are compared above
+        text.main_setpoint = binary.main_setpoint = 0.0
+        text.aux_setpoint = binary.aux_setpoint = 0.0
+        self.assertEqual(binary, text)
+
+    def test_truncated_payload(self):
+        self.assertIsNone(SensorData.from_binary(b"\x00" * 10))
+        self.assertIsNone(ShotData.from_binary(ShotData().to_binary()[:-1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
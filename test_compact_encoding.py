@@ -0,0 +1,41 @@
+import json
+import unittest
+
+from profile_converter.compact_encoding import (
+    decode_compact,
+    dumps_minified,
+    encode_compact,
+)
+from profile_converter.profile_converter import ComplexProfileConverter
+from profile_preprocessor import ProfilePreprocessor
+
+
+class TestCompactEncoding(unittest.TestCase):
+    def setUp(self):
+        with open("profile_converter/simplified_json_example.json") as f:
+            data = ProfilePreprocessor.processVariables(json.load(f))
+        self.profile = ComplexProfileConverter(
+            True, True, 1000, 7000, data
+        ).get_profile()
+
+    def test_roundtrip(self):
+        encoded = json.loads(dumps_minified(encode_compact(self.profile)))
+        self.assertEqual(decode_compact(encoded), self.profile)
+
+    def test_unknown_values_are_kept(self):
+        node = {"kind": "some_new_controller", "extra": [1, {"id": 2}]}
+        encoded = encode_compact(node)
+        self.assertEqual(encoded["a"], "some_new_controller")
+        self.assertEqual(encoded["extra"], [1, {"b": 2}])
+        self.assertEqual(decode_compact(encoded), node)
+
+    def test_smaller_than_minified(self):
+        minified = dumps_minified(self.profile)
+        self.assertLess(
+            len(dumps_minified(encode_compact(self.profile))), len(minified)
+        )
+        self.assertLess(len(minified), len(json.dumps(self.profile)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import threading
+import unittest
+from unittest import mock
+
+from history_writer import HistoryWriter, WritePriority
+
+
+class TestHistoryWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.assertTrue(HistoryWriter.flush(timeout=5))
+        self.ran = []
+        # Keeps the worker busy until release is set
+        self.release = threading.Event()
+        started = threading.Event()
+
+        def block():
+            started.set()
+            self.release.wait(5)
+
+        HistoryWriter.submit("block", block)
+        self.assertTrue(started.wait(5))
+
+    def tearDown(self):
+        self.release.set()
+        self.assertTrue(HistoryWriter.flush(timeout=5))
+
+    def job(self, name):
+        return lambda: self.ran.append(name)
+
+    def test_shot_jobs_run_before_debug_jobs(self):
+        HistoryWriter.submit("debug", self.job("debug"), priority=WritePriority.DEBUG)
+        HistoryWriter.submit("shot 1", self.job("shot 1"))
+        HistoryWriter.submit("shot 2", self.job("shot 2"))
+        self.release.set()
+        self.assertTrue(HistoryWriter.flush(timeout=5))
+        self.assertEqual(self.ran, ["shot 1", "shot 2", "debug"])
+
+    def test_failed_jobs_are_retried(self):
+        attempts = {"flaky": 0, "broken": 0}
+
+        def failing(name, failures):
+            attempts[name] += 1
+            if attempts[name] <= failures:
+                raise OSError("disk busy")
+
+        failed = HistoryWriter.stats()["failed"]
+        with mock.patch.object(HistoryWriter, "RETRY_DELAY", 0.01):
+            HistoryWriter.submit("flaky", failing, "flaky", 2, retries=2)
+            HistoryWriter.submit("broken", failing, "broken", 2, retries=1)
+            self.release.set()
+            self.assertTrue(HistoryWriter.flush(timeout=5))
+        self.assertEqual(attempts, {"flaky": 3, "broken": 2})
+        self.assertEqual(HistoryWriter.stats()["failed"], failed + 1)
+
+    def test_full_queue_drops_the_lowest_priority(self):
+        with mock.patch.object(HistoryWriter, "MAX_JOBS", 2):
+            self.assertTrue(
+                HistoryWriter.submit(
+                    "debug", self.job("debug"), priority=WritePriority.DEBUG
+                )
+            )
+            self.assertTrue(HistoryWriter.submit("shot 1", self.job("shot 1")))
+            self.assertTrue(HistoryWriter.submit("shot 2", self.job("shot 2")))
+            self.assertFalse(
+                HistoryWriter.submit(
+                    "debug 2", self.job("debug 2"), priority=WritePriority.DEBUG
+                )
+            )
+            self.release.set()
+            self.assertTrue(HistoryWriter.flush(timeout=5))
+        self.assertEqual(self.ran, ["shot 1", "shot 2"])
+        self.assertIn("shot 1", HistoryWriter.stats()["duration"])
+
+    def test_required_jobs_are_never_dropped(self):
+        with mock.patch.object(HistoryWriter, "MAX_JOBS", 1):
+            self.assertTrue(
+                HistoryWriter.submit("file 1", self.job("file 1"), required=True)
+            )
+            self.assertTrue(
+                HistoryWriter.submit("file 2", self.job("file 2"), required=True)
+            )
+            self.assertFalse(HistoryWriter.submit("shot", self.job("shot")))
+            self.release.set()
+            self.assertTrue(HistoryWriter.flush(timeout=5))
+        self.assertEqual(self.ran, ["file 1", "file 2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
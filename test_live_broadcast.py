@@ -0,0 +1,57 @@
+import asyncio
+import types
+import unittest
+
+import socketio
+
+from live_broadcast import (
+    LIVE_MAX_PENDING_BYTES,
+    ClientBackpressure,
+    OrjsonSerializer,
+    broadcast,
+)
+
+
+class TestLiveBroadcast(unittest.TestCase):
+    def setUp(self):
+        self.sio = socketio.AsyncServer(async_mode="tornado", json=OrjsonSerializer)
+        self.sent = []
+
+        async def send_packet(eio_sid, pkt):
+            self.sent.append((eio_sid, pkt.encode()))
+
+        self.sio.eio.send_packet = send_packet
+        ClientBackpressure.init(self.sio)
+
+    def tearDown(self):
+        ClientBackpressure._handlers.clear()
+        ClientBackpressure.drops.clear()
+
+    async def connect(self, eio_sid):
+        sid = await self.sio.manager.connect(eio_sid, "/")
+        await self.sio.manager.enter_room(sid, "/", "status")
+        ClientBackpressure.on_connect(sid, {})
+        return sid
+
+    def test_congested_clients_are_skipped(self):
+        async def run():
+            fast = await self.connect("fast")
+            slow = await self.connect("slow")
+            handler = types.SimpleNamespace(pending_bytes=LIVE_MAX_PENDING_BYTES + 1)
+            ClientBackpressure.register("slow", handler)
+
+            dropped = await broadcast(self.sio, "status", {"time": 1}, "status")
+            self.assertEqual(dropped, [slow])
+            self.assertEqual([eio_sid for eio_sid, _ in self.sent], ["fast"])
+            self.assertEqual(self.sent[0][1], '42["status",{"time":1}]')
+
+            handler.pending_bytes = 0
+            dropped = await broadcast(self.sio, "status", {"time": 2}, "status")
+            self.assertEqual(dropped, [])
+            self.assertEqual(ClientBackpressure.drops, {fast: 0, slow: 1})
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
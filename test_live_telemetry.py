@@ -0,0 +1,214 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+import socketio
+
+from esp_serial.connection.emulation_data import EmulationData
+from esp_serial.data import SensorData
+from live_broadcast import ClientBackpressure, OrjsonSerializer
+from live_telemetry import CHANNELS, LiveRateLimiter, LiveRooms
+from telemetry_bus import TelemetryBus
+
+STATUS = {"name": "idle", "sensors": {"p": 0.1, "f": 0.0}, "profile": "Italian"}
+
+
+def emulated_sensors():
+    for line in EmulationData.ESPRESSO_DATA:
+        prefix, _, rest = line.strip("\r\n").partition(",")
+        if prefix == "Sensors":
+            return SensorData.from_color_coded_args(rest)
+
+
+class TestLiveRateLimiter(unittest.TestCase):
+    def test_burst_is_coalesced(self):
+        limiter = LiveRateLimiter(max_rate=50, heartbeat=1.0)
+        emits = []
+
+        async def produce():
+            for _ in range(100):
+                limiter.notify()
+                await asyncio.sleep(0.002)
+
+        async def run():
+            producer = asyncio.ensure_future(produce())
+            while not producer.done():
+                await limiter.wait()
+                limiter.emitted()
+                emits.append(limiter.last_emit)
+
+        asyncio.run(run())
+        gaps = [later - earlier for earlier, later in zip(emits, emits[1:])]
+        self.assertLess(len(emits), 30)
+        self.assertGreaterEqual(min(gaps), limiter.min_interval - 0.001)
+
+    def test_idle_emits_only_the_heartbeat(self):
+        limiter = LiveRateLimiter(max_rate=50, heartbeat=0.1)
+        limiter.emitted()
+        wakeups = []
+
+        async def run():
+            for _ in range(3):
+                heartbeat = await limiter.wait()
+                self.assertTrue(heartbeat)
+                limiter.emitted()
+                wakeups.append(limiter.last_emit)
+
+        start = time.monotonic()
+        asyncio.run(run())
+        gaps = [later - earlier for earlier, later in zip([start] + wakeups, wakeups)]
+        self.assertGreaterEqual(min(gaps), 0.099)
+
+    def test_new_frame_wakes_up_early(self):
+        limiter = LiveRateLimiter(max_rate=20, heartbeat=1.0)
+        limiter.last_emit = time.monotonic() - limiter.min_interval
+
+        async def run():
+            asyncio.get_running_loop().call_later(0.01, limiter.notify)
+            start = time.monotonic()
+            heartbeat = await limiter.wait()
+            return heartbeat, time.monotonic() - start
+
+        heartbeat, waited = asyncio.run(run())
+        self.assertFalse(heartbeat)
+        # live() used to poll every 100 ms
+        self.assertLess(waited, 0.05)
+
+    def test_rate_limit_delay(self):
+        now = [10.0]
+        limiter = LiveRateLimiter(max_rate=20, heartbeat=1.0, clock=lambda: now[0])
+        self.assertEqual(limiter.delay(), 0.0)
+        self.assertTrue(limiter.heartbeat_due())
+        limiter.emitted()
+        now[0] += 0.02
+        self.assertAlmostEqual(limiter.delay(), 0.03)
+        self.assertFalse(limiter.heartbeat_due())
+        now[0] += 1.0
+        self.assertEqual(limiter.delay(), 0.0)
+        self.assertTrue(limiter.heartbeat_due())
+
+
+class TestLiveRooms(unittest.TestCase):
+    def setUp(self):
+        self.sio = socketio.AsyncServer(async_mode="tornado", json=OrjsonSerializer)
+        self.sent = []
+
+        async def send_packet(eio_sid, pkt):
+            event, data = OrjsonSerializer.loads(pkt.encode()[2:])
+            self.sent.append((eio_sid, event, data))
+
+        self.sio.eio.send_packet = send_packet
+        ClientBackpressure.init(self.sio)
+        self.rooms = LiveRooms(self.sio, legacy_events=True)
+        self.sensors = emulated_sensors()
+
+    def tearDown(self):
+        ClientBackpressure._handlers.clear()
+        ClientBackpressure.drops.clear()
+
+    async def connect(self, eio_sid, auth=None):
+        sid = await self.sio.manager.connect(eio_sid, "/")
+        ClientBackpressure.on_connect(sid, {})
+        await self.rooms.connect(sid, {}, auth)
+        return sid
+
+    async def tick(self):
+        legacy_channels, packed_channels = self.rooms.build_channels(self.sensors)
+        await self.rooms.emit(STATUS, legacy_channels, packed_channels)
+
+    def received(self, eio_sid):
+        return [
+            (event, data) for sent_to, event, data in self.sent if sent_to == eio_sid
+        ]
+
+    def channel(self, channel):
+        # What the client sees after the round trip through JSON
+        return OrjsonSerializer.loads(
+            OrjsonSerializer.dumps(CHANNELS[channel](self.sensors))
+        )
+
+    def test_packed_and_legacy_events(self):
+        async def run():
+            await self.connect("legacy")
+            packed = await self.connect("packed", {"telemetry": True})
+            await self.rooms.subscribe(packed, ["sensors"])
+            await self.tick()
+            await self.tick()
+
+        asyncio.run(run())
+        packed_tick = (
+            "telemetry",
+            {"status": STATUS, "sensors": self.channel("sensors")},
+        )
+        self.assertEqual(self.received("packed"), [packed_tick, packed_tick])
+
+        legacy_tick = [("status", STATUS)]
+        legacy_tick += [(channel, self.channel(channel)) for channel in CHANNELS]
+        self.assertEqual(self.received("legacy"), legacy_tick + legacy_tick)
+
+    def test_packed_by_default_without_legacy_events(self):
+        self.assertEqual(self.rooms.room_for({}, None), "status")
+        self.assertEqual(
+            self.rooms.room_for({"QUERY_STRING": "telemetry=1"}, None), "telemetry"
+        )
+        self.rooms.legacy_events = False
+        self.assertEqual(self.rooms.room_for({}, None), "telemetry")
+        self.assertEqual(
+            self.rooms.room_for({}, {"status_delta": True}), "telemetry_delta"
+        )
+
+    def test_unsubscribed_legacy_client_gets_every_channel(self):
+        async def run():
+            await self.connect("legacy")
+            await self.tick()
+
+        asyncio.run(run())
+        events = [event for event, _data in self.received("legacy")]
+        self.assertEqual(events, ["status", *CHANNELS])
+
+    def test_channels_without_subscribers_are_skipped(self):
+        builders = {channel: mock.Mock(return_value={}) for channel in CHANNELS}
+        skipped = TelemetryBus._counters.get("skipped_channel_builds", 0)
+
+        async def run():
+            packed = await self.connect("packed", {"telemetry": True})
+            await self.tick()
+            await self.rooms.subscribe(packed, "actuators")
+            await self.tick()
+
+        with mock.patch.dict(CHANNELS, builders):
+            asyncio.run(run())
+        self.assertEqual(builders["actuators"].call_count, 1)
+        for channel in ("sensors", "comunication", "accessories"):
+            builders[channel].assert_not_called()
+        self.assertEqual(
+            TelemetryBus._counters["skipped_channel_builds"], skipped + 4 + 3
+        )
+        self.assertEqual(
+            self.received("packed"),
+            [
+                ("telemetry", {"status": STATUS}),
+                ("telemetry", {"status": STATUS, "actuators": {}}),
+            ],
+        )
+
+    def test_unsubscribe_leaves_the_room(self):
+        async def run():
+            legacy = await self.connect("legacy")
+            await self.rooms.unsubscribe(legacy, ["sensors", "actuators"])
+            participants = [
+                sid
+                for sid, _eio_sid in self.sio.manager.get_participants("/", "sensors")
+            ]
+            self.assertNotIn(legacy, participants)
+            self.assertNotIn(legacy, self.rooms.channel_members["sensors"])
+            await self.tick()
+
+        asyncio.run(run())
+        events = [event for event, _data in self.received("legacy")]
+        self.assertEqual(events, ["status", "comunication", "accessories"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from esp_serial.data import ButtonEventEnum
+from esp_serial.dispatcher import MessageDispatcher, MessageType
+
+
+class TestMessageDispatcher(unittest.TestCase):
+
+    def test_bare_lines(self):
+        (message_type, message) = MessageDispatcher.parse("CW")
+        self.assertIs(message_type, MessageType.BUTTON)
+        self.assertIs(message.event, ButtonEventEnum.ENCODER_CLOCKWISE)
+
+        self.assertEqual(
+            MessageDispatcher.parse("hash: e8afb6c570303b5f7e20104e4ee875e5"),
+            (MessageType.PROFILE_HASH, "e8afb6c570303b5f7e20104e4ee875e5"),
+        )
+        # Only acknowledges the upload, the profile is not loaded yet
+        self.assertEqual(
+            MessageDispatcher.parse("RECEIVED HASH: e8afb6c570303b5f7e20104e4ee875e5"),
+            (MessageType.UNKNOWN, None),
+        )
+        self.assertEqual(
+            MessageDispatcher.parse("JSON cargado"), (MessageType.PROFILE_LOADED, None)
+        )
+        self.assertEqual(
+            MessageDispatcher.parse("Error parsing JSON: IncompleteInput"),
+            (MessageType.ESP_ERROR, None),
+        )
+        self.assertEqual(
+            MessageDispatcher.parse("E (1234) profile: no stages"),
+            (MessageType.ESP_ERROR, None),
+        )
+
+    def test_prefixed_lines(self):
+        (message_type, message) = MessageDispatcher.parse(
+            "Notify,warning,first line;second, line"
+        )
+        self.assertIs(message_type, MessageType.NOTIFY)
+        self.assertEqual(message.notificationType, "warning")
+        self.assertEqual(message.message, "first line\nsecond, line")
+
+        (message_type, message) = MessageDispatcher.parse(
+            "Data,1.00,0.00,247.48,36.51,heating,mimoja"
+        )
+        self.assertIs(message_type, MessageType.DATA)
+        self.assertEqual(message.weight, 247.48)
+        self.assertEqual(message.state, "brewing")
+
+
+if __name__ == "__main__":
+    unittest.main()
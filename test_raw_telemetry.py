@@ -0,0 +1,84 @@
+import asyncio
+import math
+import struct
+import unittest
+
+from api.raw_telemetry import (
+    BATCH_KIND_DATA,
+    DATA_COLUMNS,
+    ColumnBatch,
+    RawTelemetryStream,
+    batchHeaderStruct,
+    data_row,
+)
+from esp_serial.dispatcher import MessageDispatcher, MessageType
+from telemetry_bus import TelemetryBus
+
+DATA_LINES = (
+    "Data,nan,2.0,36.1,92.4,infusion,Italian limbus,Pressure,NaN,Flow,2.5,true,1.2",
+    "Data,9.0,2.0,36.1,92.4,infusion,Italian limbus,Pressure,9.0,Flow,nan,true,nan",
+)
+
+
+def unpack(packed):
+    (kind, columns, samples, base_time) = batchHeaderStruct.unpack_from(packed)
+    values = struct.unpack_from(
+        f"<{(columns + 1) * samples}f", packed, batchHeaderStruct.size
+    )
+    return kind, [
+        values[column * samples : (column + 1) * samples]
+        for column in range(columns + 1)
+    ]
+
+
+class TestRawTelemetry(unittest.TestCase):
+
+    def test_nan_values_keep_the_columns_aligned(self):
+        batch = ColumnBatch(BATCH_KIND_DATA, DATA_COLUMNS)
+        for timestamp, line in enumerate(DATA_LINES):
+            (_, data) = MessageDispatcher.parse(line)
+            batch.append(100.0 + timestamp, data_row(data))
+        batch.append(102.0, [None, "not a number"] + [0] * (len(DATA_COLUMNS) - 2))
+
+        self.assertEqual(len(batch), 3)
+        self.assertEqual({len(column) for column in batch.values}, {3})
+
+        (kind, columns) = unpack(batch.pack())
+        self.assertEqual(kind, BATCH_KIND_DATA)
+        (times, pressure, flow) = columns[:3]
+        self.assertEqual(times, (0.0, 1.0, 2.0))
+        self.assertTrue(math.isnan(pressure[0]))
+        self.assertEqual(pressure[1], 9.0)
+        self.assertTrue(math.isnan(pressure[2]))
+        self.assertTrue(math.isnan(flow[2]))
+        main_setpoint = columns[1 + DATA_COLUMNS.index("main_setpoint")]
+        self.assertTrue(math.isnan(main_setpoint[0]))
+        main_controller = columns[1 + DATA_COLUMNS.index("main_controller")]
+        self.assertEqual(main_controller[:2], (2.0, 2.0))
+
+    def test_samples_keep_their_read_time(self):
+        async def run():
+            RawTelemetryStream._new_batches()
+            TelemetryBus.subscribe(
+                "raw_telemetry",
+                RawTelemetryStream.on_telemetry,
+                kinds=(MessageType.DATA,),
+                timestamps=True,
+            )
+            for index, line in enumerate(DATA_LINES * 2):
+                (_, data) = MessageDispatcher.parse(line)
+                TelemetryBus.publish(MessageType.DATA, data, 100.0 + index * 0.25)
+            # All of them are drained by the same callback
+            await asyncio.sleep(0)
+
+        try:
+            asyncio.run(run())
+        finally:
+            TelemetryBus.unsubscribe("raw_telemetry")
+        batch = RawTelemetryStream._batches[MessageType.DATA]
+        self.assertEqual(batch.base_time, 100.0)
+        self.assertEqual(list(batch.times), [0.0, 0.25, 0.5, 0.75])
+
+
+if __name__ == "__main__":
+    unittest.main()
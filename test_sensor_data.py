@@ -0,0 +1,78 @@
+import unittest
+
+from config import CONFIG_USER, GET_ACCESSORY_DATA, MeticulousConfig
+from esp_serial.connection.emulation_data import EmulationData
+from esp_serial.data import SensorData
+
+
+def color_coded(values):
+    labels = ["ex1", "ex2", "up", "mup", "mdn", "dn", "tube", "valv", "pos", "speed"]
+    labels += ["m_pow", "current", "bh_pow", "p_r", "0_r", "1_r", "2_r", "3_r"]
+    labels += ["x_1", "x_2", "x_3"]
+    return "".join(
+        f"\033[1;3{1 + i % 6}m {labels[i]}\033[0m{value}"
+        for i, value in enumerate(values)
+    )
+
+
+class TestColorCodedSensorData(unittest.TestCase):
+
+    def setUp(self):
+        self.accessory_data = MeticulousConfig[CONFIG_USER][GET_ACCESSORY_DATA]
+        MeticulousConfig[CONFIG_USER][GET_ACCESSORY_DATA] = False
+
+        self.lines = []
+        for source in [
+            EmulationData.IDLE_DATA,
+            EmulationData.PURGE_DATA,
+            EmulationData.ESPRESSO_DATA,
+        ]:
+            for line in source:
+                prefix, _, rest = line.strip("\r\n").partition(",")
+                if prefix == "Sensors":
+                    self.lines.append(rest)
+
+    def tearDown(self):
+        MeticulousConfig[CONFIG_USER][GET_ACCESSORY_DATA] = self.accessory_data
+
+    def assertSameAsSlowPath(self, line):
+        fast = SensorData.from_color_coded_args(line)
+        slow = SensorData._from_color_coded_args_slow(line)
+        self.assertEqual(fast, slow, line)
+        if fast is not None:
+            for field, value in fast.as_dict().items():
+                self.assertIs(type(value), type(getattr(slow, field)), field)
+
+    def test_emulation_data_uses_fast_path(self):
+        self.assertGreater(len(self.lines), 0)
+        for line in self.lines:
+            self.assertIsNotNone(SensorData._from_color_coded_values(line))
+            self.assertSameAsSlowPath(line)
+
+    def test_long_layout(self):
+        values = [f"{i}.25" for i in range(20)]
+        line = color_coded(values)
+        self.assertIsNotNone(SensorData._from_color_coded_values(line))
+        self.assertSameAsSlowPath(line)
+
+    def test_unusual_lines_agree(self):
+        values = [f"{i}.5" for i in range(18)]
+        for line in [
+            color_coded(values[:-1] + ["nan"]),
+            color_coded(values[:-1] + ["true"]),
+            color_coded(values[:-1] + [""]),
+            color_coded(values + ["1.0", "true"]),
+            color_coded(values[:12]),
+            "garbage" + color_coded(values),
+            color_coded(values).replace("\033[1;31m ex1", "\033[1;37m ex1"),
+        ]:
+            self.assertSameAsSlowPath(line)
+
+    def test_accessory_data_uses_slow_path(self):
+        MeticulousConfig[CONFIG_USER][GET_ACCESSORY_DATA] = True
+        for line in self.lines[:10]:
+            self.assertIsNone(SensorData._from_color_coded_values(line))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import unittest
+
+from esp_serial.framer import SerialFramer
+
+
+class FakePort:
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    @property
+    def in_waiting(self):
+        return len(self.chunks[0]) if self.chunks else 0
+
+    def readinto(self, buffer):
+        if not self.chunks:
+            return 0
+        chunk = self.chunks[0]
+        size = min(len(buffer), len(chunk))
+        buffer[:size] = chunk[:size]
+        if size == len(chunk):
+            self.chunks.pop(0)
+        else:
+            self.chunks[0] = chunk[size:]
+        return size
+
+
+def collect(framer):
+    return [bytes(line) for line in framer.lines()]
+
+
+class TestSerialFramer(unittest.TestCase):
+
+    def test_multiple_lines_per_read(self):
+        framer = SerialFramer()
+        framer.read_from(FakePort([b"Data,1,2\r\nSensors,3\r\nESPInfo,"]))
+        self.assertEqual(collect(framer), [b"Data,1,2\r\n", b"Sensors,3\r\n"])
+        self.assertEqual(framer.pending(), len(b"ESPInfo,"))
+
+    def test_line_split_over_reads(self):
+        port = FakePort([b"Da", b"ta,1", b",2\r", b"\n"])
+        framer = SerialFramer()
+        lines = []
+        while port.chunks:
+            framer.read_from(port)
+            lines.extend(collect(framer))
+        self.assertEqual(lines, [b"Data,1,2\r\n"])
+        self.assertEqual(framer.pending(), 0)
+
+    def test_wraps_around_without_losing_data(self):
+        framer = SerialFramer(size=16)
+        lines = []
+        for i in range(50):
+            framer.feed(f"line{i}\n".encode())
+            lines.extend(collect(framer))
+        self.assertEqual(lines, [f"line{i}\n".encode() for i in range(50)])
+
+    def test_partial_line_is_moved_to_the_front(self):
+        framer = SerialFramer(size=16)
+        framer.feed(b"0123456789\nabcd")
+        self.assertEqual(collect(framer), [b"0123456789\n"])
+        framer.feed(b"efgh\n")
+        self.assertEqual(collect(framer), [b"abcdefgh\n"])
+
+    def test_overlong_line_is_flushed(self):
+        framer = SerialFramer(size=8)
+        framer.feed(b"0123456789\n")
+        self.assertEqual(collect(framer), [b"01234567"])
+        framer.feed(b"89\n")
+        self.assertEqual(collect(framer), [b"89\n"])
+
+    def test_read_fd_tells_eof_from_no_data(self):
+        read_end, write_end = os.pipe()
+        os.set_blocking(read_end, False)
+        framer = SerialFramer()
+        try:
+            self.assertEqual(framer.read_fd(read_end), 0)
+            os.write(write_end, b"Data,1\n")
+            self.assertEqual(framer.read_fd(read_end), 7)
+            os.close(write_end)
+            self.assertIsNone(framer.read_fd(read_end))
+            self.assertEqual(collect(framer), [b"Data,1\n"])
+        finally:
+            os.close(read_end)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import threading
+import unittest
+
+from esp_serial.writer import SerialWriter
+
+
+class SlowPort:
+    """Blocks every write until released, so that writes pile up meanwhile"""
+
+    def __init__(self):
+        self.writes = []
+        self.release = threading.Event()
+
+    def write(self, data):
+        self.release.wait()
+        self.writes.append(data)
+        return len(data)
+
+
+class TestSerialWriter(unittest.TestCase):
+
+    def test_batches_in_order(self):
+        port = SlowPort()
+        writer = SerialWriter(port)
+        writer.write(b"first\x03")
+        # Wait for the first write to be in flight
+        while writer.depth() > 0:
+            pass
+        for i in range(10):
+            writer.write(f"action,{i}\x03".encode())
+        self.assertEqual(writer.depth(), 10)
+
+        port.release.set()
+        self.assertTrue(writer.flush(timeout=5))
+        self.assertEqual(port.writes[0], b"first\x03")
+        self.assertEqual(
+            port.writes[1], b"".join(f"action,{i}\x03".encode() for i in range(10))
+        )
+        stats = writer.stats()
+        self.assertEqual(stats["writes"], 2)
+        self.assertEqual(stats["messages"], 11)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertEqual(stats["queued_bytes"], 0)
+        self.assertEqual(stats["bytes_per_second"], sum(map(len, port.writes)))
+
+    def test_large_buffers_are_not_split(self):
+        port = SlowPort()
+        port.release.set()
+        writer = SerialWriter(port)
+        written = []
+        profile = b"x" * (SerialWriter.MAX_BATCH * 3)
+        writer.write(b"hash,abc\x03" + profile, on_written=written.append)
+        writer.write(b"action,start\x03")
+        self.assertTrue(writer.flush(timeout=5))
+        self.assertIn(b"hash,abc\x03" + profile, port.writes)
+        self.assertEqual(b"".join(port.writes)[-13:], b"action,start\x03")
+        self.assertEqual(len(written), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
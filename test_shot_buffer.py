@@ -0,0 +1,161 @@
+import unittest
+from unittest import mock
+
+from esp_serial.data import SensorData, ShotData
+from shot_manager import Shot, ShotManager
+
+
+def shot_data(time, pressure=9.12, status="infusion", **kwargs):
+    return ShotData(
+        pressure=pressure,
+        flow=2.34,
+        weight=18.56,
+        gravimetric_flow=1.78,
+        status=status,
+        profile="Italian limbus",
+        time=time,
+        is_extracting=True,
+        **kwargs,
+    )
+
+
+class TestShotBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.shot = Shot()
+        # Skips the ProfileManager lookup
+        self.shot.profile_name = "Italian limbus"
+        self.shot.profile = {}
+
+    def test_samples_in_shot_file_format(self):
+        self.shot.addShotData(
+            shot_data(
+                100,
+                main_controller_kind="Pressure",
+                main_setpoint=9.0,
+                aux_controller_kind="Flow",
+                aux_setpoint=3.5,
+                is_aux_controller_active=True,
+            )
+        )
+        self.shot.addSensorData(SensorData(external_1=21.5, motor_temp=40.25))
+        self.shot.addShotData(shot_data(200, pressure="NaN", status=None))
+
+        data = self.shot.to_json()["data"]
+        self.assertEqual(len(data), 2)
+        self.assertEqual(
+            data[0]["shot"],
+            {
+                "pressure": 9.12,
+                "flow": 2.34,
+                "weight": 18.56,
+                "gravimetric_flow": 1.78,
+                "setpoints": {"active": "flow", "pressure": 9.0, "flow": 3.5},
+            },
+        )
+        self.assertEqual(data[0]["time"], 100)
+        self.assertEqual(data[0]["status"], "infusion")
+        self.assertEqual(data[0]["sensors"]["external_1"], 21.5)
+        self.assertEqual(data[0]["sensors"]["motor_temp"], 40.25)
+
+        self.assertEqual(data[1]["shot"]["pressure"], "NaN")
+        self.assertEqual(data[1]["shot"]["setpoints"], {"active": None})
+        self.assertIsNone(data[1]["status"])
+        self.assertNotIn("sensors", data[1])
+
+    def test_latest_sensors_message_wins(self):
+        self.shot.addSensorData(SensorData(external_1=1.0))
+        self.shot.addShotData(shot_data(100))
+        self.shot.addSensorData(SensorData(external_1=2.0))
+        self.shot.addSensorData(SensorData(external_1=3.0))
+
+        data = self.shot.to_json()["data"]
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]["sensors"]["external_1"], 3.0)
+        self.assertEqual(len(self.shot.sensors[0]), 1)
+
+    def test_bad_values_do_not_misalign_the_columns(self):
+        self.shot.addShotData(shot_data(100, main_setpoint="NaN", aux_setpoint="NaN"))
+        with self.assertRaises(ValueError):
+            self.shot.addShotData(shot_data(200, pressure="garbage"))
+        self.shot.addShotData(shot_data(300))
+
+        self.assertEqual(
+            {len(column) for column in self.shot._columns + (self.shot.sensor_row,)},
+            {2},
+        )
+        data = self.shot.to_json()["data"]
+        self.assertEqual([sample["time"] for sample in data], [100, 300])
+        self.assertEqual(data[0]["shot"]["pressure"], 9.12)
+
+    def test_summary_and_preview_are_computed_when_the_file_is_finished(self):
+        for time in range(100, 600, 100):
+            self.shot.addShotData(shot_data(time))
+        writer = mock.Mock(header={"id": self.shot.id, "profile": {"final_weight": 36}})
+
+        recording = mock.patch.multiple(
+            ShotManager,
+            _current_shot=self.shot,
+            _current_writer=writer,
+            _written_samples=0,
+            _queueDatabaseInsert=mock.DEFAULT,
+        )
+        spy = mock.patch.object(
+            Shot, "preview", autospec=True, side_effect=Shot.preview
+        )
+        with recording as patched, spy as preview:
+            ShotManager.stop()
+            preview.assert_not_called()
+
+            (_path,) = writer.finish.call_args.args
+            writer.finish.call_args.kwargs["on_finished"]()
+            (entry,) = patched["_queueDatabaseInsert"].call_args.args
+        self.assertEqual(entry["summary"]["total_time"], 0.5)
+        self.assertEqual(entry["summary"]["ratio"], 0.52)
+        self.assertEqual(len(entry["preview"]["pressure"]), 5)
+
+    def test_polling_the_current_shot_from_a_cursor(self):
+        self.shot.profile = {"name": "Italian limbus"}
+        for time in range(100, 600, 100):
+            self.shot.addShotData(shot_data(time))
+
+        with mock.patch.object(ShotManager, "_current_shot", self.shot):
+            cursor = ShotManager.currentShotCursor(0)
+            self.assertEqual(cursor, (self.shot.id, 0, 4))
+            first = ShotManager.getCurrentShotSince(cursor)
+            self.assertEqual(
+                [sample["time"] for sample in first["data"]], [100, 200, 300, 400]
+            )
+            self.assertEqual(first["next"], 4)
+            self.assertEqual(first["profile"]["name"], "Italian limbus")
+
+            self.shot.addShotData(shot_data(600))
+            update = ShotManager.getCurrentShotSince(
+                ShotManager.currentShotCursor(first["next"])
+            )
+            self.assertEqual([sample["time"] for sample in update["data"]], [500])
+            self.assertNotIn("profile", update)
+            self.assertEqual(update["data"], self.shot.to_json()["data"][4:5])
+
+            # Nothing new, the cursor and so the ETag stay the same
+            self.assertEqual(ShotManager.currentShotCursor(5), (self.shot.id, 5, 5))
+
+            # A cursor of the previous shot
+            self.assertIsNone(ShotManager.getCurrentShotSince(("previous", 0, 4)))
+
+    def test_cursor_past_the_end_starts_over(self):
+        self.shot.profile = {"name": "Italian limbus"}
+        for time in range(100, 400, 100):
+            self.shot.addShotData(shot_data(time))
+
+        with mock.patch.object(ShotManager, "_current_shot", self.shot):
+            cursor = ShotManager.currentShotCursor(250)
+            self.assertEqual(cursor, (self.shot.id, 0, 2))
+            restarted = ShotManager.getCurrentShotSince(cursor)
+        self.assertEqual(restarted["since"], 0)
+        self.assertEqual([sample["time"] for sample in restarted["data"]], [100, 200])
+        self.assertIn("profile", restarted)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import zstandard as zstd
+
+import shot_compression
+from shot_compression import SHOT_COMPRESSION_LEVELS, ShotCompression
+
+
+def shot(index):
+    return {
+        "time": 1700000000.0 + index,
+        "profile_name": "Italian limbus",
+        "id": f"shot-{index}",
+        "data": [
+            {
+                "shot": {
+                    "pressure": round((sample * 7 + index) % 900 / 100, 2),
+                    "flow": round((sample * 3 + index) % 400 / 100, 2),
+                    "weight": round(sample * 0.04, 2),
+                    "setpoints": {"active": "pressure", "pressure": 9.0},
+                },
+                "time": sample * 40,
+                "status": ("preinfusion", "infusion", "decline")[sample // 300],
+            }
+            for sample in range(900)
+        ],
+    }
+
+
+class TestShotCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = Path(tempfile.mkdtemp())
+        patcher = mock.patch.object(
+            shot_compression, "DICTIONARY_PATH", self.folder.joinpath("dictionaries")
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.addCleanup(setattr, ShotCompression, "_dictionary", None)
+        self.addCleanup(setattr, ShotCompression, "_level", ShotCompression._level)
+
+        self.shot_files = []
+        for index in range(20):
+            path = self.folder.joinpath("shots", f"{index}.shot.json.zst")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(
+                zstd.ZstdCompressor().compress(json.dumps(shot(index)).encode())
+            )
+            self.shot_files.append(path)
+
+    def test_dictionary_id_is_stored_in_the_file(self):
+        dict_id = ShotCompression.train_dictionary(self.shot_files)
+        self.assertEqual(ShotCompression.train_dictionary(self.shot_files), dict_id + 1)
+
+        raw = json.dumps(shot(100)).encode()
+        compressed = ShotCompression.compressor(level=3).compress(raw)
+        self.assertEqual(zstd.get_frame_parameters(compressed).dict_id, dict_id + 1)
+
+        # A fresh process only knows the dictionaries on disk
+        ShotCompression._dictionaries.clear()
+        path = self.folder.joinpath("new.shot.json.zst")
+        path.write_bytes(compressed)
+        self.assertEqual(ShotCompression.read(path), raw)
+        # Older shots without dictionary
+        self.assertEqual(
+            ShotCompression.read(self.shot_files[0]), json.dumps(shot(0)).encode()
+        )
+
+    def test_level_follows_compression_load(self):
+        level = SHOT_COMPRESSION_LEVELS[3]
+        ShotCompression.record_shot(level, compression_seconds=10, shot_seconds=60)
+        self.assertEqual(ShotCompression.level(), SHOT_COMPRESSION_LEVELS[2])
+        ShotCompression.record_shot(level, compression_seconds=0.01, shot_seconds=60)
+        self.assertEqual(ShotCompression.level(), SHOT_COMPRESSION_LEVELS[4])
+        ShotCompression.record_shot(
+            SHOT_COMPRESSION_LEVELS[0], compression_seconds=10, shot_seconds=60
+        )
+        self.assertEqual(ShotCompression.level(), SHOT_COMPRESSION_LEVELS[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from sqlalchemy import delete
+
+import shot_database
+from database_models import history as history_table
+from shot_database import SearchParams, ShotDataBase
+
+PROFILE = {
+    "id": "05051ed3-9996-43e8-9da6-963f2b31d481",
+    "name": "Italian limbus",
+    "author": "meticulous",
+    "author_id": "d9123a0a-d3d7-40fd-a548-b81376e43f23",
+    "final_weight": 36.0,
+    "temperature": 90.0,
+    "stages": [],
+    "variables": [],
+    "previous_authors": [],
+    "display": {},
+    "last_changed": 0,
+}
+SUMMARY = {
+    "peak_pressure": 9.0,
+    "total_time": 30.0,
+    "final_weight": 36.0,
+    "average_flow": 1.2,
+    "ratio": 1.0,
+}
+
+
+class TestShotDataBase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        database_file = Path(cls.folder).joinpath(shot_database.DATABASE_FILE)
+        cls.patches = [
+            mock.patch.object(shot_database, "HISTORY_PATH", cls.folder),
+            mock.patch.object(
+                shot_database, "DATABASE_URL", f"sqlite:///{database_file}"
+            ),
+            mock.patch.multiple(
+                ShotDataBase,
+                engine=None,
+                session=None,
+                profile_fts_table=None,
+                stage_fts_table=None,
+            ),
+        ]
+        for patch in cls.patches:
+            patch.start()
+        # Registers the FTS tables in the metadata, only done once per process
+        ShotDataBase.init()
+
+    @classmethod
+    def tearDownClass(cls):
+        ShotDataBase.engine.dispose()
+        for patch in reversed(cls.patches):
+            patch.stop()
+        shutil.rmtree(cls.folder)
+
+    def tearDown(self):
+        with ShotDataBase.engine.connect() as connection:
+            with connection.begin():
+                connection.execute(delete(history_table))
+
+    def insert(self, index, **entry):
+        ShotDataBase.insert_history(
+            {
+                "id": f"shot-{index}",
+                "time": 1700000000.0 + index,
+                "file": f"2023-11-14/{index}.shot.json.zst",
+                "profile_name": PROFILE["name"],
+                "profile": PROFILE,
+                **entry,
+            }
+        )
+
+    def test_backfill_skips_processed_shots(self):
+        self.insert(1, summary=SUMMARY, preview={"pressure": [[0, 9.0]]})
+        self.insert(2)
+        self.insert(3)
+        self.insert(4)
+        pending = ShotDataBase.history_without_summary(0, 10)
+        self.assertEqual(
+            [file for (_id, file) in pending][0], "2023-11-14/2.shot.json.zst"
+        )
+        self.assertEqual(len(pending), 3)
+
+        # A summarized shot, a shot without samples and an unreadable file
+        (second, third, fourth) = [key for (key, _file) in pending]
+        ShotDataBase.store_summary(second, SUMMARY, {"pressure": [[0, 9.0]]})
+        ShotDataBase.store_summary(third, {}, {"pressure": []})
+        ShotDataBase.store_summary(fourth, {}, {})
+        self.assertEqual(ShotDataBase.history_without_summary(0, 10), [])
+
+        results = ShotDataBase.search_history(SearchParams(dump_data=False))
+        summaries = {result["id"]: result["summary"] for result in results}
+        self.assertEqual(summaries["shot-2"], SUMMARY)
+        self.assertIsNone(summaries["shot-3"])
+
+    def test_history_without_summary_pages_by_id(self):
+        for index in range(5):
+            self.insert(index)
+        keys = [key for (key, _file) in ShotDataBase.history_without_summary(0, 10)]
+        self.assertEqual(
+            ShotDataBase.history_without_summary(keys[1], 2),
+            [
+                (keys[2], "2023-11-14/2.shot.json.zst"),
+                (keys[3], "2023-11-14/3.shot.json.zst"),
+            ],
+        )
+
+    def test_preview_search_does_not_read_the_shot_files(self):
+        preview = {"pressure": [[0, 1.0], [30000, 9.0]]}
+        self.insert(1, summary=SUMMARY, preview=preview)
+        self.insert(2, preview={})
+
+        # The shot files do not exist, reading them would raise
+        results = ShotDataBase.search_history(SearchParams(preview=True))
+        self.assertEqual(
+            [(result["id"], result["preview"]) for result in results],
+            [("shot-2", None), ("shot-1", preview)],
+        )
+        self.assertEqual({result["data"] for result in results}, {None})
+
+        results = ShotDataBase.search_history(SearchParams(dump_data=False))
+        self.assertNotIn("preview", results[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import csv
+import io
+import unittest
+from unittest import mock
+
+import zstandard as zstd
+
+from config import CONFIG_USER, DEBUG_SHOT_DATA, MACHINE_DEBUG_SENDING
+from esp_serial.data import SensorData, ShotData
+from shot_debug_manager import ShotDebugManager
+
+
+def shot_data(time):
+    return ShotData(pressure=9.0, flow=2.0, weight=36.0, status="infusion", time=time)
+
+
+class TestShotDebugManager(unittest.TestCase):
+
+    def settings(self, save, send):
+        config = {CONFIG_USER: {DEBUG_SHOT_DATA: save, MACHINE_DEBUG_SENDING: send}}
+        return mock.patch("shot_debug_manager.MeticulousConfig", config)
+
+    def tearDown(self):
+        ShotDebugManager._current_data = None
+
+    def test_nothing_is_recorded_without_consumer(self):
+        with self.settings(False, None):
+            ShotDebugManager.start()
+            ShotDebugManager.handleShotData(shot_data(100))
+        self.assertIsNone(ShotDebugManager._current_data)
+
+    def test_rows_are_compressed_while_recording(self):
+        with self.settings(False, True):
+            ShotDebugManager.start()
+        debug_data = ShotDebugManager._current_data
+        ShotDebugManager.handleSensorData(SensorData(external_1=1.0))
+        ShotDebugManager.handleShotData(shot_data(100))
+        ShotDebugManager.handleSensorData(SensorData(external_1=21.5))
+        ShotDebugManager.handleShotData(shot_data(200))
+
+        compressed = debug_data.finish()
+        text = zstd.ZstdDecompressor().stream_reader(io.BytesIO(compressed)).read()
+        rows = list(csv.DictReader(io.StringIO(text.decode("utf-8"))))
+        self.assertEqual([row["time"] for row in rows], ["100", "200"])
+        self.assertEqual(rows[0]["external_1"], "21.5")
+        self.assertEqual(rows[1]["external_1"], "")
+        # A retried write job finishes again
+        self.assertEqual(debug_data.finish(), compressed)
+
+
+if __name__ == "__main__":
+    unittest.main()
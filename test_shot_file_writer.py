@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import zstandard as zstd
+
+from history_writer import HistoryWriter
+from shot_file_writer import ShotFileWriter, read_partial_shot
+
+HEADER = {
+    "time": 1700000000.5,
+    "profile_name": "Italian limbus",
+    "id": "05051ed3-9996-43e8-9da6-963f2b31d481",
+    "profile": {"id": "profile", "name": "Italian limbus"},
+}
+
+
+def sample(time):
+    return {
+        "shot": {"pressure": 9.12, "flow": 2.34, "setpoints": {"active": None}},
+        "time": time,
+        "status": "infusion",
+    }
+
+
+class TestShotFileWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.partial_path = os.path.join(self.folder, "incomplete", "shot.json.zst")
+        self.writer = ShotFileWriter(self.partial_path, level=3)
+        self.writer.write_header(HEADER)
+        self.writer.write_samples([sample(0), sample(100)])
+        self.writer.write_samples([sample(200)])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_finished_file_is_a_shot_file(self):
+        path = os.path.join(self.folder, "2024-01-01", "12:00:00.shot.json.zst")
+        finished = []
+        self.writer.finish(path, on_finished=lambda: finished.append(True))
+        self.assertTrue(self.writer.flush(timeout=5))
+
+        self.assertEqual(finished, [True])
+        self.assertFalse(os.path.exists(self.partial_path))
+        with open(path, "rb") as file:
+            decompressed = zstd.ZstdDecompressor().stream_reader(file).read()
+        self.assertEqual(
+            json.loads(decompressed),
+            {**HEADER, "data": [sample(0), sample(100), sample(200)]},
+        )
+
+    def test_full_history_queue_still_finishes_the_file(self):
+        self.assertTrue(self.writer.flush(timeout=5))
+        path = os.path.join(self.folder, "2024-01-01", "12:00:00.shot.json.zst")
+        with mock.patch.object(HistoryWriter, "MAX_JOBS", 0):
+            self.writer.finish(path)
+            self.assertTrue(self.writer.flush(timeout=5))
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(self.partial_path))
+
+    def test_unfinished_file_is_readable(self):
+        self.assertTrue(self.writer.flush(timeout=5))
+        self.assertEqual(
+            read_partial_shot(self.partial_path),
+            {**HEADER, "data": [sample(0), sample(100), sample(200)]},
+        )
+
+    def test_cut_off_file_keeps_complete_samples(self):
+        self.assertTrue(self.writer.flush(timeout=5))
+        with open(self.partial_path, "rb") as file:
+            compressed = file.read()
+        with open(self.partial_path, "wb") as file:
+            file.write(compressed[:-4])
+
+        shot = read_partial_shot(self.partial_path)
+        self.assertEqual(shot["id"], HEADER["id"])
+        self.assertEqual(shot["data"], [sample(0), sample(100)])
+
+
+if __name__ == "__main__":
+    unittest.main()
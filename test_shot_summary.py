@@ -0,0 +1,76 @@
+import unittest
+
+import math
+
+from shot_summary import downsample, preview_shot, summarize, summarize_shot
+
+
+class TestShotSummary(unittest.TestCase):
+
+    def test_summary_skips_missing_values(self):
+        summary = summarize(
+            [0, 500, 25125],
+            [0.5, "NaN", 9.004],
+            [float("nan"), 1.0, 2.5],
+            [0.0, 10.0, 36.123],
+            target_weight=36,
+        )
+        self.assertEqual(
+            summary,
+            {
+                "peak_pressure": 9.0,
+                "total_time": 25.12,
+                "final_weight": 36.12,
+                "average_flow": 1.75,
+                "ratio": 1.0,
+            },
+        )
+
+    def test_summary_without_target_or_samples(self):
+        self.assertIsNone(summarize([0], [1], [1], [40])["ratio"])
+        self.assertEqual(
+            set(summarize([], [], [], [], target_weight=36).values()), {None}
+        )
+
+    def test_summary_of_a_shot_file(self):
+        shot = {
+            "profile": {"final_weight": 40},
+            "data": [
+                {"time": 0, "shot": {"pressure": 1, "flow": 0, "weight": 0}},
+                {"time": 30000, "shot": {"pressure": 8, "flow": 2, "weight": 42}},
+            ],
+        }
+        summary = summarize_shot(shot)
+        self.assertEqual(summary["total_time"], 30.0)
+        self.assertEqual(summary["ratio"], 1.05)
+
+    def test_downsample_keeps_the_ends_and_the_peak(self):
+        times = list(range(0, 60000, 25))
+        values = [math.sin(time / 5000) for time in times]
+        values[1234] = 12.0
+        points = downsample(times, values, 100)
+        self.assertEqual(len(points), 100)
+        self.assertEqual(points[0], [0, values[0]])
+        self.assertEqual(points[-1], [times[-1], values[-1]])
+        self.assertIn([times[1234], 12.0], points)
+        self.assertEqual(points, sorted(points))
+
+    def test_short_series_are_not_downsampled(self):
+        self.assertEqual(
+            downsample([0, 1, 2], [1.0, "NaN", 3.0], 100), [[0, 1.0], [2, 3.0]]
+        )
+
+    def test_preview_of_a_shot_file(self):
+        shot = {
+            "data": [
+                {"time": 0, "shot": {"pressure": 1.234, "flow": 0, "weight": 0}},
+                {"time": 40, "shot": {"pressure": 2, "flow": 1, "weight": 0.5}},
+            ],
+        }
+        shot_preview = preview_shot(shot)
+        self.assertEqual(shot_preview["pressure"], [[0, 1.23], [40, 2]])
+        self.assertEqual(shot_preview["gravimetric_flow"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
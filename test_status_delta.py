@@ -0,0 +1,41 @@
+import unittest
+
+from status_delta import StatusDeltaEncoder, apply_status_delta
+
+
+class TestStatusDelta(unittest.TestCase):
+    def test_keyframe_then_changed_keys(self):
+        encoder = StatusDeltaEncoder()
+        first = encoder.encode({"name": "idle", "profile": "a", "time": 0})
+        self.assertEqual(first["seq"], 0)
+        self.assertTrue(first["keyframe"])
+
+        second = encoder.encode({"name": "idle", "profile": "a", "time": 1})
+        self.assertEqual(second, {"seq": 1, "keyframe": False, "data": {"time": 1}})
+
+        self.assertIsNone(encoder.encode({"name": "idle", "profile": "a", "time": 1}))
+
+        third = encoder.encode({"name": "brewing", "time": 1})
+        self.assertEqual(third["seq"], 2)
+        self.assertEqual(third["data"], {"name": "brewing"})
+        self.assertEqual(third["removed"], ["profile"])
+
+        status = None
+        for frame in (first, second, third):
+            status = apply_status_delta(status, frame)
+        self.assertEqual(status, {"name": "brewing", "time": 1})
+
+    def test_periodic_and_requested_keyframes(self):
+        encoder = StatusDeltaEncoder(keyframe_interval=3)
+        frames = [encoder.encode({"time": t}) for t in range(6)]
+        self.assertEqual(
+            [frame["keyframe"] for frame in frames],
+            [True, False, False, True, False, False],
+        )
+
+        encoder.request_keyframe()
+        self.assertTrue(encoder.encode({"time": 6})["keyframe"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+
+import tornado.ioloop
+
+from esp_serial.dispatcher import MessageType
+from telemetry_bus import MachineEvent, TelemetryBus
+
+
+class TestTelemetryBus(unittest.TestCase):
+
+    def tearDown(self):
+        for name in list(TelemetryBus._subscriptions):
+            TelemetryBus.unsubscribe(name)
+
+    def test_independent_cursors(self):
+        first = TelemetryBus.subscribe("first")
+        TelemetryBus.publish(MessageType.DATA, 1)
+        second = TelemetryBus.subscribe("second")
+        TelemetryBus.publish(MessageType.DATA, 2)
+
+        self.assertEqual([m for _, _, m, _ in first.poll()], [1, 2])
+        self.assertEqual([m for _, _, m, _ in second.poll()], [2])
+        self.assertEqual(first.poll(), [])
+        self.assertEqual(first.lag, 0)
+
+        TelemetryBus.publish(MessageType.DATA, 3, 12.5)
+        self.assertEqual(second.lag, 1)
+        (seq, kind, message, timestamp) = second.poll()[0]
+        self.assertEqual(seq, TelemetryBus._next_seq - 1)
+        self.assertIs(kind, MessageType.DATA)
+        self.assertEqual(message, 3)
+        self.assertEqual(timestamp, 12.5)
+
+    def test_kinds_filter(self):
+        subscription = TelemetryBus.subscribe("events", kinds=MachineEvent)
+        TelemetryBus.publish(MessageType.SENSORS, None)
+        TelemetryBus.publish(MachineEvent.IDLE)
+        self.assertEqual([k for _, k, _, _ in subscription.poll()], [MachineEvent.IDLE])
+        self.assertEqual(subscription.lag, 0)
+
+    def test_slow_consumer_drops_oldest(self):
+        subscription = TelemetryBus.subscribe("slow")
+        for i in range(TelemetryBus.SIZE + 10):
+            TelemetryBus.publish(MessageType.DATA, i)
+
+        messages = [m for _, _, m, _ in subscription.poll()]
+        self.assertEqual(subscription.dropped, 10)
+        self.assertEqual(len(messages), TelemetryBus.SIZE)
+        self.assertEqual(messages[0], 10)
+        self.assertEqual(subscription.stats()["max_lag"], TelemetryBus.SIZE + 10)
+
+    def test_callback_runs_on_ioloop(self):
+        loop = tornado.ioloop.IOLoop(make_current=False)
+        received = []
+
+        def subscribe():
+            TelemetryBus.subscribe(
+                "callback", lambda kind, message: received.append(message)
+            )
+            for i in range(3):
+                TelemetryBus.publish(MessageType.DATA, i)
+            # Nothing is delivered from within publish()
+            self.assertEqual(received, [])
+            loop.add_callback(loop.stop)
+
+        loop.add_callback(subscribe)
+        loop.start()
+        loop.close()
+        self.assertEqual(received, [0, 1, 2])
+
+    def test_latency_counter(self):
+        counter = TelemetryBus.latency("test")
+        self.assertIs(TelemetryBus.latency("test"), counter)
+        counter.record(0.010)
+        counter.record(0.030)
+
+        stats = TelemetryBus.stats()["latency"]["test"]
+        self.assertEqual(stats["count"], 2)
+        self.assertAlmostEqual(stats["last_ms"], 30)
+        self.assertAlmostEqual(stats["avg_ms"], 20)
+        self.assertAlmostEqual(stats["max_ms"], 30)
+
+    def test_counters(self):
+        TelemetryBus.count("test_counter")
+        TelemetryBus.count("test_counter", 4)
+        self.assertEqual(TelemetryBus.stats()["counters"]["test_counter"], 5)
+
+
+if __name__ == "__main__":
+    unittest.main()